@@ -19,6 +19,15 @@ at the University of Michigan.
 
 import pandas as pd
 import facebook as fb
+import friend_store as fs
+import centrality as cn
+import clustering as cl
+import crosstab as ct
+import homophily as hm
+import significance as sg
+import snapshot as sn
+import d3
+import crawler as cr
 import networkx as nx
 import random
 import IPython as ip
@@ -33,6 +42,11 @@ def clear_screen():
             ip.core.display.clear_output()
 
 
+def show_progress(done, total):
+        clear_screen()
+        print str(done)+" of "+str(total)
+
+
 
 
 class FBgraph(object):
@@ -137,6 +151,10 @@ class FBgraph(object):
     
         print "\n\nHi "+ me['name'] +"! Welcome to the Facebook Lab\n"
     
+        # Keeping what Facebook sends in a file, so asking again (after a crash, or in the
+        # next session) doesn't have to fetch it all again
+        mygraph.cache = fb.ResponseCache("./"+str(me["id"])+"_graph_cache.sqlite")
+
         # This sets this links as the active one for the rest of the run
         self.facebook_link = mygraph
     
@@ -306,11 +324,9 @@ class FBgraph(object):
         full_dictionary["undefined2"] = "nan"
         full_dictionary["undefined3"] = "nan"
             
-        # This converts the python dictionary to a Pandas series object with the name my_ID (user's facebook ID)
-        series = pd.Series(full_dictionary, name=self.my_ID)
-    
-        # This creates a Pandas DataFrame object with series as the first entry.
-        self.friend_db = pd.DataFrame(series)
+        # This creates the friend database (one row per friend) with the user's Facebook ID as the first entry.
+        self.friend_db = fs.FriendStore(sorted(full_dictionary.keys()))
+        self.friend_db[self.my_ID] = full_dictionary
         
         clear_screen()
 
@@ -385,7 +401,7 @@ class FBgraph(object):
         try:
             # Checking to see if the database has friends loaded already    
             cont=True
-            if self.friend_db.shape[1] > 1:    
+            if len(self.friend_db) > 1:    
                 if self.check_answer(raw_input("\nYou already have friends saved. Would you like to overwrite them? [y/n]")):
                     cont = True
                 else:
@@ -394,14 +410,11 @@ class FBgraph(object):
             
             if cont:
                 if self.facebook_link != False:
-                    friends = self.facebook_link.get_connections("me","friends")["data"]
-                    count = 1
-                    for person in friends:
-                        their_id = person["id"]
-                        info = self.facebook_link.get_object(str(their_id))
-                        clear_screen()
-                        print count
-                        count +=1
+                    # The friends are fetched a few at a time and kept in a checkpoint file, so
+                    # if anything goes wrong running this again picks up where it left off
+                    crawler = self._crawler()
+                    infos = crawler.profiles(crawler.friends(), show_progress)
+                    for their_id, info in infos.items():
                         # This loop removes non-ascii characters
                         for i in info.keys():
                             try:
@@ -412,55 +425,64 @@ class FBgraph(object):
                                 except:
                                     info[i] = their_id[-10:] # trimming some leading zeros
                               
-                        self.friend_db[int(info["id"])] = pd.Series(info)
+                        self.friend_db[int(info["id"])] = info
                     
                         # adding the friend to the network
                         self.mynet.add_node(int(their_id))
                         self.mynet.add_edge(self.my_ID,int(their_id))
 
+                    if crawler.failed["profiles"]:
+                        print ("Couldn't get "+str(len(crawler.failed["profiles"]))
+                               +" friends. Run get_friends() again to try them again.")
                     print "Your friend data are now loaded."
            
                 else:
                     print "Sorry, you must first get access to your graph using the get_access() function"
         except:
-            print "Sorry. Please get a new Facebook connection and try again."
+            print "Sorry. Please get a new Facebook connection and try again. The friends already fetched are saved."
     
     
     def get_mutual_friends(self):
-        """ This method uses the Facebook.py SDK to get mutual friends for all of the ego's friends."""
+        """ This method uses the Facebook.py SDK to get mutual friends for all of the ego's friends.
+        Like get_friends, it keeps what it has fetched in a checkpoint file and picks up where it
+        left off if it's run again."""
     
         if self.facebook_link !=False:
-            count = 1
+            crawler = self._crawler()
+            friends = [i for i in list(self.friend_db) if i != self.my_ID]
+            found = crawler.mutual_friends(friends, show_progress)
             # Iterating over the list of all friends
-            for i in list(self.friend_db.columns.values):
-                if (i != self.my_ID):
-                    mutuals = self.facebook_link.get_connections(str(i), "mutualfriends")["data"]
-                    my_list = []
-                    for mfrnd in mutuals:
-                        my_list.append(int(mfrnd["id"]))
-                        
+            for i in friends:
+                if str(i) in found:
+                    my_list = [int(mfrnd) for mfrnd in found[str(i)]]
+                    for mfrnd in my_list:
                         # adding to the network
-                        self.mynet.add_edge(int(i),int(mfrnd["id"]))
+                        self.mynet.add_edge(int(i),mfrnd)
  
                     # Adding the list of mutual friends to the database                
                     self.friend_db[i]["mutuals"] = my_list
-                    try:     
-                        ip.core.display.clear_output(other=False) # This clears the Notebook input cell
-                    except:
-                        ip.core.display.clear_output()
-                    print count
-                    count +=1
   
-            print "Mutual friend data successfully retrieved."
+            if crawler.failed["mutuals"]:
+                print ("Couldn't get the mutual friends of "+str(len(crawler.failed["mutuals"]))
+                       +" friends. Run get_mutual_friends() again to try them again.")
+            else:
+                # everything is fetched, so there's nothing to pick up again
+                crawler.remove()
+                print "Mutual friend data successfully retrieved."
         else:
             print "You must first get a Facebook connection."
     
+
+    def _crawler(self):
+        """ A Crawler on the Facebook connection, checkpointing to graph_name_crawl.json. """
+        return cr.Crawler(self.facebook_link, "./"+str(self.graph_name)+"_crawl.json")
+    
     def random_sample(self,count=200):
         """ Creating a random sampling of the whole network to make adding personal knowledge more
         tractable. The only way this can be undone is to reload your data from Facebook. """
  
-        total = len(list(self.friend_db.columns.values))
-        for sap in random.sample(list(self.friend_db.columns.values),(total-count)):
+        total = len(self.friend_db)
+        for sap in random.sample(list(self.friend_db),(total-count)):
             if sap != self.my_ID:
                 del self.friend_db[int(sap)]
                 self.mynet.remove_node(int(sap))
@@ -478,7 +500,7 @@ class FBgraph(object):
         print "\nThis loop lets you define which ties with your facebook friends are strong"
         count = 0
         clear_screen()
-        for person in list(self.friend_db.columns.values):
+        for person in list(self.friend_db):
             info = self.friend_db[int(person)]
             if (info["strong tie"] != info["strong tie"] or overwrite) and person !=self.my_ID: #funky NaN check
                 
@@ -553,7 +575,7 @@ class FBgraph(object):
         saved in case the user needs to take a break! """
     
         count = 0
-        for person in list(self.friend_db.columns.values):
+        for person in list(self.friend_db):
             clear_screen()
             
             if (self.friend_db[int(person)]["known from"] != self.friend_db[int(person)]["known from"] or overwrite) and person != self.my_ID: # funky NaN check
@@ -582,7 +604,7 @@ class FBgraph(object):
         """ This method allows the user to define an attribute and code friends according to it."""
         
         # Because adding can be slow, the dataframe is created with empty rows. This checks to see if one is available
-        indices = list(self.friend_db.index.values)
+        indices = list(self.friend_db.attributes)
         if 'undefined1' in indices or 'undefined2' in indices or 'undefined3' in indices: 
             asking = True
             while asking:
@@ -591,8 +613,7 @@ class FBgraph(object):
                 if self.check_answer(raw_input("Is "+attribute+ " correct? (y/n)")):
                     for name in indices:  
                         if "undefined" in name and asking:
-                            indices[indices.index(name)] = attribute
-                            self.friend_db.index=indices
+                            self.friend_db.rename_attribute(name, attribute)
                             asking = False
             
             clear_screen()
@@ -619,7 +640,7 @@ class FBgraph(object):
             count = 0
             clear_screen()
             print "Please code your friends using the following prompts."
-            for person in list(self.friend_db.columns.values):
+            for person in list(self.friend_db):
                 if (self.friend_db[int(person)][attribute] != self.friend_db[int(person)][attribute]) or overwrite and person!=self.my_ID: # funky NaN check
                     clear_screen()
                     print "What category is " + str(self.friend_db[int(person)]["name"]) + " in? (Enter a number)"
@@ -684,17 +705,15 @@ class FBgraph(object):
     
     def count_components(self, withme=True):
         """ This method returns the number of components in the network without the ego.
-        It does this by removing the ego in a copy of the network."""
+        Friends only tied to the ego are components on their own."""
     
         if withme:
             print "If you're in the network, it has to have a single component!"
         else:
-            bu = nx.Graph()
-            bu.add_nodes_from(self.mynet.nodes())
-            bu.add_edges_from(self.mynet.edges())
-            bu.remove_node(self.my_ID)
+            others = cn.without(cn.adjacency(self.mynet), self.my_ID)
+            alone = len(self.mynet) - 1 - len(others[0])
             
-            print "Your network has "+ str(nx.number_connected_components(bu)) +" components"
+            print "Your network has "+ str(cn.components(others) + alone) +" components"
             
             
             
@@ -704,161 +723,54 @@ class FBgraph(object):
         """ This function writes the network to a .json file to be read using the
         the fb_net.html page so that users can explore the network move thoroughly.
         """
-        my_file = open("./fbgraph.json", "w+")
-        my_file.write("{\"nodes\":[\n")
-        
+        # Without the ego, the ego and its ties are just skipped over rather than taken out of
+        # the network
         if not withme:
             strong=False
             weight=False
-            
-            if colors == []:
-                colors = self.defined_colors
-                if colors != []:
-                    backup_colors = {}
-                    nodes = list(self.mynet.nodes())
-                    for i in range(len(nodes)):
-                        backup_colors[nodes[i]] = self.defined_colors[i]
-                    index = list(self.mynet.nodes()).index(self.my_ID)
-                    self.defined_colors.pop(index)
-                else:
-                    backup_colors = []
-            else:
-                backup_colors = {}
-                nodes = list(self.mynet.nodes())
-                for i in range(len(nodes)):
-                    backup_colors[nodes[i]] = self.defined_colors[i]
-                index = list(self.mynet.nodes()).index(self.my_ID)
-                self.defined_colors.pop(index)
-                
-                
-            backup_net = nx.Graph(self.mynet)
-            self.mynet.remove_node(self.my_ID)
-            
+        nodes = [i for i in self.mynet.nodes() if withme or i != self.my_ID]
     
         # This defaults the coloring scheme to what the user has previously defined (if anything)
         # if no color argument is passed in
         if colors == []:
-            colors = list(self.defined_colors)
-            if colors == []:
-                for i in self.mynet.nodes():
+            if self.defined_colors != []:
+                colors = [c for i, c in zip(self.mynet.nodes(), self.defined_colors)
+                          if withme or i != self.my_ID]
+            else:
+                colors = []
+                for i in nodes:
                     if i == self.my_ID:
                         colors.append("blue")   
                     else:
                         colors.append("aqua")
     
     
-        rewrite = {} # A dictionary for renumbering the node ids
-        count = 0    # also for the renumbering operation.
-        mutuals = {} # We use the count of mutual friends as data
-        nodes = self.mynet.nodes() # We use the member list from the network instead of the database
-                                # because it colors nodes in the order of this list and the imported
-                                # color list is in that order
-    
-        # In both the loop for nodes and links, we do n-1 first and the last one manually because of the
-        # the need to insert the right characters for the .json format.
-        for j in range(len(nodes)-1):
-            i = nodes[j]            # i is the usual id number
-            rewrite[i]=count        # renumbering business
-            my_dct = dict(self.friend_db[int(i)]) # A Pandas series object is just like a python dictionary, but isn't...Cast it!
-            #print my_dct
-            mutuals[i]=len(my_dct["mutuals"])
-            # The next 3 lines create the bulk of the text
-            newdct ="{\"color\":"+"\""+str(colors[count])+"\""
-            newdct +=",\"id\":"+"\""+str(rewrite[i])+"\""
-            newdct +=",\"name\":"+"\""+str(my_dct["name"])+"\", \"value\":"+str(mutuals[i])+"},\n" #\"x\":50, \"y\":50"+",\
-            count +=1
-            my_file.write(newdct)
-    
-        # The next 5 lines write the info for the last node and the end-list characters
-        mutuals[nodes[count]] = len(self.friend_db[nodes[count]]["mutuals"])
-        rewrite[nodes[count]]=count
-        my_dct = dict(self.friend_db[int(nodes[-1])])      
-        st = "{\"color\":"+"\""+str(colors[count])+"\",\"id\":"+"\""+str(rewrite[nodes[-1]])+"\",\"name\":"
-        st += "\""+str(my_dct["name"])+"\", \"value\":"+str(mutuals[nodes[-1]])+" }],\n\"links\":["       #\"x\":50, \"y\":50
-        my_file.write(st)
-    
-    
-        # Part 2: adding the nodes
-        count = 0
-        edges = self.mynet.edges() # 
-    
-        for i in range(len(edges)-1):
-            j = edges[i] # this is a tuple of source and target pairs
-            my_file.write("\n{\"source\":"+str(rewrite[j[0]])+", \"target\":"+str(rewrite[j[1]])+", \"n1\":\""
-                              +str(self.friend_db[j[0]]["name"])+"\", \"n2\":\""+str(self.friend_db[j[1]]["name"])+"\"")
-                              
-            end = ""             
-            if strong:
-                try:
-                    strg = self.mynet[j[0]][j[1]]["strong"]
-                    if not (strg==strg) or strg==-1:
-                        end +=",\"strong\":"+str(0)
-                    else:
-                        end +=",\"strong\":"+str(strg)
-                except:
-                    end +=",\"strong\":"+str(0)
-            else:
-                end +=",\"strong\":"+str(0)
-            if weight:
-                try:
-                    strength = self.mynet[j[0]][j[1]]["weight"]
-                    if not (strength==strength) or strength==-1:
-                        end +=",\"weight\":"+str(0)
-                    else:
-                        end +=",\"weight\":"+str(strength)
-                except:
-                    end +=",\"weight\":"+str(0)
-            else:
-                end +=",\"weight\":"+str(0)
-            end+="},"
-            my_file.write(end)
-
-            count +=1
-
-        # The last edge and end-list characters again
-        j = edges[-1]
-        
-        
-        my_file.write("\n{\"source\":"+str(rewrite[j[0]])+", \"target\":"+str(rewrite[j[1]])+", \"n1\":\""
-                          +str(self.friend_db[j[0]]["name"])+"\", \"n2\":\""+str(self.friend_db[j[1]]["name"])+"\"")
-        end = ""             
-        if strong:
-            try:
-                strg = self.mynet[j[0]][j[1]]["strong"]
-                if not (strg==strg) or strg==-1:
-                    end +=",\"strong\":"+str(0)
-                else:
-                    end +=",\"strong\":"+str(strg)
-            except:
-                end +=",\"strong\":"+str(0)
-        else:
-            end +=",\"strong\":"+str(0)
-        if weight:
-            try:
-                strength = self.mynet[j[0]][j[1]]["weight"]
-                if not (strength==strength) or strength==-1:
-                    end +=",\"weight\":"+str(0)
-                else:
-                    end +=",\"weight\":"+str(strength)
-            except:
-                end +=",\"weight\":"+str(0)
-        else:
-            end +=",\"weight\":"+str(0)
-        end+="}]}"
-        my_file.write(end)
-    
-        # OK, file is complete
-        my_file.close()
-        
-        if not withme:
-            self.mynet = nx.Graph(backup_net)
-            if backup_colors == []:
-                self.defined_colors = []
-            else:
-                clrs = []
-                for i in self.mynet.nodes():
-                    clrs.append(backup_colors[i])
-                self.defined_colors = clrs
+        # We use the member list from the network instead of the database because it colors
+        # nodes in the order of this list and the imported color list is in that order.
+        # The nodes are renumbered 0, 1, 2... in the same order.
+        rewrite = dict((i, count) for count, i in enumerate(nodes))
+
+        # The names and counts of mutual friends (the data for each node) are read a whole
+        # column at a time and looked up by each friend's row
+        row = dict((i, r) for r, i in enumerate(self.friend_db.ids.tolist()))
+        names = self.friend_db.column("name").tolist()
+        indptr = self.friend_db.mutuals_csr()[0]
+        mutuals = (indptr[1:] - indptr[:-1]).tolist()
+
+        def node_list():
+            for count, i in enumerate(nodes):
+                yield d3.node(colors[count], count, names[row[i]], mutuals[row[i]])
+
+        def link_list():
+            quoted = dict((i, d3.quote(names[row[i]])) for i in nodes)
+            for u, v, data in self.mynet.edges_iter(data=True):
+                if not withme and self.my_ID in (u, v):
+                    continue
+                yield d3.link(rewrite[u], rewrite[v], quoted[u], quoted[v],
+                    data.get("strong", 0) if strong else 0,
+                    data.get("weight", 0) if weight else 0)
+
+        d3.write_json("./fbgraph.json", node_list(), link_list())
   
     ## I/O functions to save progress  
     def save(self):
@@ -880,15 +792,44 @@ class FBgraph(object):
         other_data.close()
         
         
+    def save_snapshot(self, file_name=None):
+        """ Saves everything (friends, network, contexts and colors) as one
+        binary file, file_name_snapshot.npz, which load_snapshot reads back
+        far quicker than load_data reads the CSV files. The file name
+        defaults to the graph's name.
+        """
+
+        if file_name is None:
+            file_name = self.graph_name
+        sn.save("./"+str(file_name)+sn.SUFFIX, self.friend_db, self.mynet,
+            self.my_ID, self.contexts_list, self.defined_colors)
+        print "Snapshot saved"
+
+
+    def load_snapshot(self, file_name="1"):
+        """ Loads data saved with save_snapshot, just as it was saved. """
+
+        if self.friend_db != False:
+            print "You already have data loaded. Would you like to delete it? (y/n)"
+            if not self.check_answer(raw_input()):
+                print "OK, data load aborted"
+                return
+            print "Ok, data deleted."
+
+        (self.friend_db, self.mynet, self.my_ID, self.contexts_list,
+            self.defined_colors) = sn.load("./"+str(file_name)+sn.SUFFIX)
+        print "Data successfully loaded"
+
+
     def change_friend_values(self, name):
         id = 0
-        for i in list(self.friend_db.columns.values):
-            if self.friend_db[i]["name"] == str(name):
-                id = i
+        ids = self.friend_db.find(str(name))
+        if ids:
+            id = ids[-1]
         if id == 0:
             print "Name not found. Please try again."
         else:
-            for attr in list(self.friend_db.index.values):
+            for attr in list(self.friend_db.attributes):
                 val = self.friend_db[id][attr]
                 if self.check_answer(raw_input(str(name)+ " has value "+ str(val)+ " for attribute "+str(attr)+". Would you like to change it? (y/n)")):
                     asking = True
@@ -980,75 +921,35 @@ class FBgraph(object):
                     self.defined_colors = [i for i in data[1].split(",")]
     
 
-            # loading in the database          
-            self.friend_db = pd.read_csv("./"+str(file_name)+"_friend_data.csv", header=0, index_col=0)    
-            new_names = []
-            for i in list(self.friend_db.columns.values):
-                new_names.append(int(i))
-                if self.my_ID != i:
-                    # adding network ties
-                    self.mynet.add_node(int(i))
-                    self.mynet.add_edge(int(i), self.my_ID)
-    
-            self.friend_db.columns = new_names
+            # loading in the database (saved with one column per friend)
+            self.friend_db = fs.read_friend_csv("./"+str(file_name)+"_friend_data.csv")
+            ids = self.friend_db.ids.tolist()
     
-            attrs=list(self.friend_db.index.values)
-            # adding the mutual ties connections (and converting to ints from strings)
-            for i in list(self.friend_db.columns.values):
-        
-                q = self.friend_db[int(i)]["known from"]
-                if q==q:
-                    self.friend_db[int(i)]["known from"] = int(q)
+            attrs = list(self.friend_db.attributes)
+            # converting the coded attributes to ints from strings
+            for i in ids:
                 
-                r = self.friend_db[int(i)][attrs[6]]
+                r = self.friend_db[i][attrs[6]]
                 if r==r:
-                    self.friend_db[int(i)][attrs[6]] = int(r)
+                    self.friend_db[i][attrs[6]] = int(r)
                 
-                p = self.friend_db[int(i)][attrs[7]]
+                p = self.friend_db[i][attrs[7]]
                 if p==p:
-                    self.friend_db[int(i)][attrs[7]] = int(p)
+                    self.friend_db[i][attrs[7]] = int(p)
                 
-                s = self.friend_db[int(i)][attrs[8]]
+                s = self.friend_db[i][attrs[8]]
                 if s==s:
-                    self.friend_db[int(i)][attrs[8]] = int(s)
-                
-                if type(self.friend_db[int(i)]["mutuals"]) == str:
-                    mut_str = self.friend_db[int(i)]["mutuals"][1:-1].split(",")
-                    mutuals = []
-                    for j in mut_str:
-                        try:
-                            mutuals.append(int(j))
-                        except:
-                            if j != "":
-                                mutuals.append(long(j))
-                            else:
-                                pass
-                
-                self.friend_db[int(i)]["mutuals"] = mutuals
-                for j in mutuals:
-                    if int(j) in new_names:
-                        try:
-                            edge = self.mynet[int(j)][int(i)]
-                        except:
-                            self.mynet.add_edge(int(j), int(i))
+                    self.friend_db[i][attrs[8]] = int(s)
             
-                val = self.friend_db[int(i)]["tie strength"]
-                if val != "" and (val==val):
-                    self.mynet[int(i)][self.my_ID]["weight"] = float(val)
+            # adding the mutual ties connections in one go
+            sources, targets = self.friend_db.mutual_edges()
+            self.mynet.add_nodes_from(ids)
+            self.mynet.add_edges_from(zip(sources.tolist(), targets.tolist()), strong=0, weight=0.)
             
-                val2 = self.friend_db[int(i)]["strong tie"]
-                if val2 != "" and (val2==val2):
-                    self.mynet[int(i)][self.my_ID]["strong"] = int(val2)
-                
-            for edge in self.mynet.edges():
-                try:
-                    self.mynet[int(edge[0])][int(edge[1])]["strong"]
-                except:
-                    self.mynet[int(edge[0])][int(edge[1])]["strong"]=0
-                try:
-                    self.mynet[int(edge[0])][int(edge[1])]["weight"]
-                except:
-                    self.mynet[int(edge[0])][int(edge[1])]["weight"]=0.
+            # adding the ties to the ego (the ego's own entry gives it a self-loop)
+            strong = pd.to_numeric(pd.Series(self.friend_db.column("strong tie")), errors="coerce").fillna(0).astype(int).tolist()
+            weight = pd.Series(self.friend_db.column("tie strength")).fillna(0.).tolist()
+            self.mynet.add_edges_from([(i, self.my_ID, {"strong": s, "weight": w}) for i, s, w in zip(ids, strong, weight)])
     
     
             print "Data successfully loaded"
@@ -1167,8 +1068,6 @@ class FBgraph(object):
                     print "Invalid node name"
 
     def eigenvector_centrality(self, iterations, withme=True, node=True):
-        my_dict = nx.eigenvector_centrality(self.mynet,max_iter = iterations)
-
         if node:
             if withme:
                 my_dict =nx.eigenvector_centrality(self.mynet,max_iter = iterations)
@@ -1228,7 +1127,8 @@ class FBgraph(object):
                 if self.friend_db[int(i)]["known from"] == group:
                     node_list.append(i)
         
-        clustering = nx.clustering(self.mynet, node_list)
+        coefficients = self._clustering()
+        clustering = dict((i, coefficients[i]) for i in node_list)
         
         try:
             g_name = self.contexts_list[group]
@@ -1243,6 +1143,12 @@ class FBgraph(object):
         
         
         return clustering
+
+    def _clustering(self):
+        """ {ID: clustering coefficient} for everyone in the network, from one count of the
+        triangles (see the clustering module). """
+        adj = cn.adjacency(self.mynet)
+        return dict(zip(adj[0], cl.coefficients(adj).tolist()))
         
     def clustering_by_attribute_summary(self, attribute):
         """ This allows the user to group people by an attribute and look at clustering within those 
@@ -1251,17 +1157,18 @@ class FBgraph(object):
             print "Sorry, "+attribute+ " is not a sortable attribute"
         else:    
             node_dict = {}
-            for i in list(self.friend_db.columns.values):
+            for i in list(self.friend_db):
                 val  = self.friend_db[int(i)][attribute]
                 try:
                     node_dict[val].append(int(i))
                 except:
                     node_dict[val] = [int(i)]
         
+            coefficients = self._clustering()
             cluster_dict = {}
             for i in node_dict:
                 nodes = node_dict[i]
-                cluster_coef = nx.clustering(self.mynet, nodes)
+                cluster_coef = dict((n, coefficients[n]) for n in nodes if n in coefficients)
                 rewrite = {}
                 for r in cluster_coef:
                     rewrite[self.id_to_name(r)] = cluster_coef[r]
@@ -1278,17 +1185,18 @@ class FBgraph(object):
             print "Sorry, "+attribute+ " is not a sortable attribute"
         else:    
             node_dict = {}
-            for i in list(self.friend_db.columns.values):
+            for i in list(self.friend_db):
                 val  = self.friend_db[int(i)][attribute]
                 try:
                     node_dict[val].append(int(i))
                 except:
                     node_dict[val] = [int(i)]
         
+            coefficients = self._clustering()
             cluster_dict = {}
             for i in node_dict:
                 nodes = node_dict[i]
-                cluster_coef = nx.clustering(self.mynet, nodes)
+                cluster_coef = dict((n, coefficients[n]) for n in nodes if n in coefficients)
                 rewrite = {}
                 for r in cluster_coef:
                     rewrite[self.id_to_name(r)] = cluster_coef[r]
@@ -1304,40 +1212,27 @@ class FBgraph(object):
             print "Sorry, "+ attribute+ " is not a sortable attribute."
         
         else:
-            trans_dict = {}
-            for i in list(self.friend_db.columns.values):
-                val = self.friend_db[i][attribute]
-                mutuals = list(self.friend_db[i]["mutuals"])
-                hit = 0
-                total = 0
-                for j in mutuals:
-                    if self.friend_db[int(j)][attribute] == val:
-                        hit +=1
-                    total +=1
-                if (i != self.my_ID):
-                    if (self.friend_db[self.my_ID][attribute] == val):
-                        hit +=1
-                    total += 1
-            
-                if total != 0:
-                    coef = hit/float(total)
-                else:
-                    coef = 0
-                
-                try:
-                    trans_dict[val].append(coef)
-                except:
-                    trans_dict[val] = [coef]
-            
+            table = hm.edges(self.friend_db)
+            averages = hm.associativity(self.friend_db, table, attribute, self.my_ID)
             avg_dict = {}
-            for i in trans_dict:
-                val = trans_dict[i]
-                avg = sum(val)/float(len(val))
+            for i, avg in averages.iteritems():
                 avg_dict[i] = avg
                 print "Associativity avg for people with value "+str(i) + " is: " +str(avg)
         
             return avg_dict
                 
+    def mixing_matrix(self, attribute, withme=False):
+        """ Counts the ties between your friends with each pair of values of attribute. A tie
+        between two friends with the same value is counted twice, once for each of them. With
+        withme=True your own ties are counted too."""
+        pairs = hm.ties(self.friend_db, hm.edges(self.friend_db), self.my_ID if withme else None)
+        return hm.mixing(self.friend_db, pairs, attribute)
+        
+    def homophily(self, attributes=None, withme=False):
+        """ The assortativity (1 when friends are only tied to friends with the same value, 0 when
+        the attribute makes no difference) and E-I index (-1 when all ties are inside groups, 1 when
+        all are between them) of each of attributes, by default all the categorical ones."""
+        return hm.summary(self.friend_db, attributes, self.my_ID if withme else None)
                 
             
     def get_average_clustering(self, a_dictionary):
@@ -1364,94 +1259,89 @@ class FBgraph(object):
                 
         
         
+    def crosstab(self, attributes, share=False, within=None):
+        """ Counts your friends by one or more attributes at once, for example
+        network.crosstab(["known from", "gender"]). With share=True you get the share of your
+        friends instead, and with within set to some of the attributes, the share of the friends
+        with the same values of those. Friends with no value are counted as "missing". """
+        return ct.crosstab(self.friend_db, attributes, share, within)
+        
     def attribute_by_attribute(self, attribute_one, group_number, attribute_two):
         """ This method allows the user to see the prevalences of a particular
-        attribute within a group. This is no doubt a way to do this using Pandas functionality,
-        but that is for a later iteration."""
+        attribute within a group (the friends with the value group_number for attribute_one)."""
         
-        indices = list(self.friend_db.index.values)
+        indices = list(self.friend_db.attributes)
         if (attribute_one not in indices or attribute_two not in indices):
             print "Invalid inputs. Make sure the dictionary and spelling are correct."
         
         
         else:
-            vals = {}
-            count = 0
-            for i in list(self.friend_db.columns.values):
-                if (self.friend_db[i][str(attribute_one)] == group_number):
-                    which = self.friend_db[i][str(attribute_two)]
-                    try:
-                        vals[which] += 1
-                        count +=1
-                    except:
-                        vals[which] = 1
-                        count +=1
+            table = ct.crosstab(self.friend_db, [attribute_one, attribute_two])
+            vals = [(j, n) for (i, j), n in table.iteritems() if i == group_number]
+            count = sum(n for j, n in vals)
             
             print "For friends in group "+str(group_number)+" for attribute "+str(attribute_one)+","
             print "they breakdown into the following percentages for attribute "+str(attribute_two)
             print "(Sample size = "+str(count)+")"
             
-            for j in vals:
-                try:
-                    number = vals[j]/float(count)    
-                except:
-                    number = 0
-                    
-                print str(j)+" : "+str(number)
+            for j, n in vals:
+                print str(j)+" : "+str(n/float(count))
     
     
     def attribute_breakdown(self, attribute):
             """ This method finds the percentage within categories of an attribute"""
             
-            if attribute not in list(self.friend_db.index.values):
+            if attribute not in list(self.friend_db.attributes):
                 print "Not a valid attribute"
+                return
                 
-            vals = {}
-            count = 0
-            for i in list(self.friend_db.columns.values):
-                which = self.friend_db[i][str(attribute)]
-                try:
-                    vals[which] += 1
-                    count +=1
-                except:
-                    vals[which] = 1
-                    count +=1
+            table = ct.crosstab(self.friend_db, attribute)
+            count = table.sum()
 
             print "Your friend breakdown into the following percentages for attribute "+str(attribute)
             print "(Sample size = "+str(count)+")"
             
-            for j in vals:
-                try:
-                    number = vals[j]/float(count)    
-                except:
-                    number = 0
-                    
-                print str(j)+" : "+str(number)
+            for j, n in table.iteritems():
+                print str(j)+" : "+str(n/float(count))
             
         
     def ids_to_names(self):
         """ Returns a dictionary links IDs to names. """
         my_dict = {}
-        for i in list(self.friend_db.columns.values):
+        for i in list(self.friend_db):
             my_dict[int(i)] = self.friend_db[int(i)]["name"]
         
         return my_dict
         
      
     def name_to_id(self, name):
-        """Returns the ID number associated with the name ."""
+        """Returns the ID number associated with the name. Case doesn't
+        matter and the start of a name will do. If more than one friend
+        fits, you get the first and a list of the others.
+        """
 
-        for id in self.friend_db:
-                    name1 = str(self.friend_db[int(id)]["name"])
-                    if name1 == name:
-                        return id
+        ids = self._find_friends(name)
+        if ids:
+            if len(ids) > 1:
+                print (str(len(ids))+" friends match "+str(name)+": "
+                    +", ".join(self.id_to_name(i)+" ("+str(i)+")" for i in ids)
+                    +". Using the first.")
+            return ids[0]
         print "Not a valid name"
 
 
+    def _find_friends(self, name):
+        """ The IDs of the friends called name or, failing that, with a
+        name like it (see FriendStore.find).
+        """
+        return (self.friend_db.find(str(name))
+            or self.friend_db.find(str(name), exact=False))
+
+
     def id_to_name(self, id):
         """Returns the name associated with the ID number."""
         try:
-            name = str(self.friend_db[int(id)]["name"])
+            name = str(self.friend_db.get_value(id, "name"))
             return name
         except:
             print "Not a valid ID"
@@ -1460,31 +1350,30 @@ class FBgraph(object):
     
     def view_mutual_friends(self, name):
         """ This allows the user to see mutual friends of the specified friend """
-        id = 0
-        for i in list(self.friend_db.columns.values):
-            if self.friend_db[i]["name"] == str(name):
-                id = i
-        if id == 0:
+        ids = self.friend_db.find(str(name))
+        if ids == []:
             print "Name not found. Please try again."
-        else:
+        for id in ids:
+            if len(ids) > 1:
+                print "ID#: "+str(id)
             print "You have the follow mutual friends:"
             mutuals = self.friend_db[id]["mutuals"]
             for i in mutuals:
-                print self.friend_db[i]["name"]
+                if i in self.friend_db:
+                    print self.friend_db[i]["name"]
        
         
         
     def view_friend_info(self, name):
-        """ This allows the user to see a friend's attributes """
-        id = 0
-        for i in list(self.friend_db.columns.values):
-            if self.friend_db[i]["name"] == str(name):
-                id = i
-        if id == 0:
+        """ This allows the user to see a friend's attributes. If there
+        are several friends with the name, you see them all.
+        """
+        ids = self.friend_db.find(str(name))
+        if ids == []:
             print "Name not found. Please try again."
-        else:
+        for id in ids:
             print "ID#: "+str(id)
-            for attr in list(self.friend_db.index.values):
+            for attr in list(self.friend_db.attributes):
                 print str(attr) + ": "+ str(self.friend_db[id][attr])
 
 
@@ -1496,7 +1385,7 @@ class FBgraph(object):
             print "Incorrect group name"
         else:
             my_list = []
-            for i in self.friend_db.columns.values:
+            for i in self.friend_db:
                 if self.friend_db[i]["known from"] == group:
                     my_list.append(self.friend_db[i]["name"])
             print "You have included the following people in the group named "+str(self.contexts_list[group])+":"
@@ -1508,33 +1397,14 @@ class FBgraph(object):
         """ This method has the user test the principle of strong triadic closure; there is a
         good chance that friends with whom the ego has strong ties are also friends. This
         algorithm will not work if the user hasn't already defined which ties are strong."""
-        comps = []
-        edges = nx.get_edge_attributes(self.mynet, "strong")
-        if edges != {}:
-            for e in edges:
-                if edges[e] == 1:
-                    comps.append(e)
-            hit = []
-            for i in comps:
-                for j in comps:
-                    if i!=j:
-                        for k in i:
-                            if k != self.my_ID:
-                                notme1 = k
-                        for l in j:
-                            if l != self.my_ID:
-                                notme2 = l
-                        try:    
-                            self.mynet[notme1][notme2]
-                            hit.append(1)
-                        except:
-                            hit.append(0)
-            
+        found = self._strong_closure()
+        if found is not None:
+            pairs, closed = found[0]
             try:
-                val = sum(hit)/float(len(hit))
+                val = closed/float(pairs)
             except:
                 val = 0
-            print "Count of triads inspected: "+str(len(hit))
+            print "Count of triads inspected: "+str(pairs)
             print val
         else:
             print "ERROR: You must first enter information about strong ties [Command define_strong_ties()]."
@@ -1546,39 +1416,165 @@ class FBgraph(object):
         This algorithm will not work if the user hasn't already defined which ties are strong.
         The group value is the one associated with social contexts."""
         
-        comps = []
-        edges = nx.get_edge_attributes(self.mynet, "strong")
-        if edges != {}:
-            for e in edges:
-                if edges[e] == 1 and (self.friend_db[e[0]]["known from"] ==group or self.friend_db[e[1]]["known from"]==group):
-                    # the check above makes sure they are in the right group
-                    comps.append(e)
-                    
-            hit = []
-            for i in comps:
-                for j in comps:
-                    if i!=j:
-                        for k in i:
-                            if k != self.my_ID:
-                                notme1 = k
-                        for l in j:
-                            if l != self.my_ID:
-                                notme2 = l
-                        try:    
-                            self.mynet[notme1][notme2]
-                            hit.append(1)
-                        except:
-                            hit.append(0)
-            
+        found = self._strong_closure()
+        if found is not None:
+            # the ego's ties all count as being in the ego's own group
+            if self.my_ID in self.friend_db and self.friend_db.get_value(self.my_ID, "known from") == group:
+                pairs, closed = found[0]
+            else:
+                pairs, closed = 0, 0
+                for value, p, c in found[1]:
+                    if value == group:
+                        pairs, closed = p, c
             try:
-                val = sum(hit)/float(len(hit))
+                val = closed/float(pairs)
             except:
                 val = 0
-            print "Count of triads inspected: "+str(len(hit))
+            print "Count of triads inspected: "+str(pairs)
             print val
         else:
             print "ERROR: You must first enter information about your tie strengths."
         
+    def strong_triadic_closure_by_group(self):
+        """ Tests strong triadic closure within every group (social context) at once, printing the
+        number of triads inspected and the share of them that are closed for each group. Returns
+        the shares by group number."""
+        
+        found = self._strong_closure()
+        if found is None:
+            print "ERROR: You must first enter information about your tie strengths."
+            return
+        if self.my_ID in self.friend_db:
+            ego = self.friend_db.get_value(self.my_ID, "known from")
+        else:
+            ego = None
+        shares = {}
+        for group, pairs, closed in found[1]:
+            if group == ego or (group is ct.MISSING and not pairs):
+                continue
+            shares[group] = closed/float(pairs) if pairs else 0
+            print "Strong triadic closure in group "+str(group)+": "+str(shares[group])+" ("+str(pairs)+" triads inspected)"
+        return shares
+        
+    def _strong_closure(self):
+        """ ((pairs, closed), [(group, pairs, closed), ...]): the ordered pairs of friends you have
+        strong ties with and how many of them are friends themselves, for the whole network and for
+        each group (by "known from", in the order first seen), counted in one pass (see the
+        clustering module). None if no tie strengths have been entered. """
+        adj = cn.adjacency(self.mynet)
+        strong = self._strong_nodes(adj)
+        if strong is None:
+            return None
+        groups, values = self._node_codes(adj, "known from")
+        pairs, closed = cl.strong_closure(adj, strong)
+        overall = (int(pairs[0]), int(closed[0]))
+        pairs, closed = cl.strong_closure(adj, strong, groups, len(values))
+        return overall, zip(values, pairs.tolist(), closed.tolist())
+        
+    def _strong_nodes(self, adj):
+        """ Which of the nodes of adj you have strong ties with, as a list of True and False, or
+        None if no tie strengths have been entered. """
+        ties = self.mynet[self.my_ID] if self.my_ID in self.mynet else {}
+        # strengths are only ever entered for the ego's ties, so the rest of the network is only
+        # looked at if none of those have one
+        if not any("strong" in data for data in ties.itervalues()) and not any(
+            "strong" in data for u, v, data in self.mynet.edges_iter(data=True)):
+            return None
+        position = dict((n, i) for i, n in enumerate(adj[0]))
+        strong = [False]*len(adj[0])
+        for friend, data in ties.iteritems():
+            if data.get("strong") == 1 and friend != self.my_ID:
+                strong[position[friend]] = True
+        return strong
+        
+    def _node_codes(self, adj, attribute):
+        """ The codes of attribute (see the crosstab module) lined up with the nodes of adj, -1 for
+        nodes not in friend_db, and the values they stand for. """
+        position = dict((n, i) for i, n in enumerate(adj[0]))
+        found, values = ct.codes(self.friend_db, attribute)
+        codes = [-1]*len(adj[0])
+        for i, code in zip(self.friend_db.ids.tolist(), found.tolist()):
+            if i in position:
+                codes[position[i]] = code
+        return codes, values
+        
+    def associativity_significance(self, attribute, samples=10000, within=None, seed=None, workers=None):
+        """ Tests whether your friends are more alike in attribute than chance would make them: the
+        associativity of each value and the assortativity and E-I index (see homophily) are compared
+        with the same figures for samples shuffles of the values between your friends (only between
+        friends known from the same context with within="known from"). A small p (say under 0.05)
+        means chance is unlikely to have given a figure that far from what it usually gives; z says
+        how far, and in which direction. The work is shared out between workers processes."""
+        if attribute =="id" or attribute =="mutuals":
+            print "Sorry, "+ attribute+ " is not a sortable attribute."
+            return
+        model = sg.Homophily(self.friend_db, attribute, self.my_ID, within)
+        return self._significance(model, attribute, samples, seed, workers)
+        
+    def clustering_significance(self, attribute, samples=10000, within=None, rewire=False, seed=None, workers=None):
+        """ Tests whether the friends with each value of attribute are more (or less) clustered than
+        chance: the average clustering coefficient of each group is compared with samples shuffles of
+        the values between everyone (only within the same context with within="known from"), or with
+        rewire=True, with networks whose ties have been rewired at random, everyone keeping the same
+        number of ties. Rewiring is much slower, so use a few hundred samples."""
+        if attribute == "mutuals" or attribute == "id":
+            print "Sorry, "+attribute+ " is not a sortable attribute"
+            return
+        adj = cn.adjacency(self.mynet)
+        ego = adj[0].index(self.my_ID) if self.my_ID in self.mynet else None
+        groups, names = self._node_codes(adj, attribute)
+        if rewire:
+            model = sg.Rewired(adj, ego, groups, names)
+        else:
+            strata = self._node_codes(adj, within)[0] if within is not None else None
+            model = sg.GroupClustering(cl.coefficients(adj), groups, names, ego, strata)
+        return self._significance(model, attribute, samples, seed, workers)
+        
+    def strong_closure_significance(self, samples=10000, within=None, rewire=False, seed=None, workers=None):
+        """ Tests whether the friends you have strong ties with are more likely to be friends with
+        each other than chance (see test_Strong_Triadic_Closure), against samples shuffles of which
+        friends your strong ties are with (only within the same context with within="known from"),
+        or with rewire=True, against networks whose ties have been rewired at random."""
+        adj = cn.adjacency(self.mynet)
+        strong = self._strong_nodes(adj)
+        if strong is None:
+            print "ERROR: You must first enter information about your tie strengths."
+            return
+        if sum(strong) < 2:
+            print "You have fewer than two strong ties, so there are no triads to test."
+            return
+        ego = adj[0].index(self.my_ID) if self.my_ID in self.mynet else None
+        if rewire:
+            model = sg.Rewired(adj, ego, strong=strong)
+        else:
+            strata = self._node_codes(adj, within)[0] if within is not None else None
+            model = sg.StrongClosure(adj, strong, ego, strata)
+        return self._significance(model, None, samples, seed, workers)
+        
+    def _significance(self, model, attribute, samples, seed, workers):
+        """ Runs the test for model (see the significance module) and prints the results. """
+        table = sg.test(model, samples, seed, workers)
+        print "Compared with "+str(samples)+" randomized versions of the network:"
+        for row in table.itertuples(index=False):
+            name = row.statistic[0].upper() + row.statistic[1:]
+            if row.value is not None:
+                name += " for friends with "+str(attribute)+" value "+self._value_name(attribute, row.value)
+            if row.std == 0:
+                print name+": "+str(round(row.observed,4))+" (chance can't change it, so there is nothing to test)"
+                continue
+            print (name+": "+str(round(row.observed,4))+" (chance gives "+str(round(row.expected,4))
+                +" +/- "+str(round(row.std,4))+", z = "+str(round(row.z,2))+", p = "+str(round(row.p,4))+")")
+        return table
+        
+    def _value_name(self, attribute, value):
+        """ How a value of attribute is written out. Facebook's own values (like "female (hidden)")
+        are kept as they are. """
+        if value is None or value is ct.MISSING:
+            return "unknown"
+        if attribute == "known from":
+            return str(self.contexts_list.get(value, value))
+        return str(value)
+        
         
         
     def clean_mutuals(self):
@@ -1587,7 +1583,7 @@ class FBgraph(object):
         (because either a partial list loaded or a sample of all nodes was taken). It just 
         removes those alters."""
          
-        peeps = list(self.friend_db.columns.values)
+        peeps = list(self.friend_db)
         for i in peeps:
             existing = []
             muts = list(self.friend_db[int(i)]["mutuals"])
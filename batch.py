@@ -0,0 +1,176 @@
+""" Batch analysis of many ego network datasets
+
+Every dataset the labs save is a pair of files, name_friend_data.csv and
+name_general_data.csv. This script finds all the pairs in a folder, loads each
+one into its own Graph in a pool of worker processes and writes a single table
+with a row per dataset, e.g.
+
+	python batch.py . -o results.csv -w 4
+
+The table has the network's size and density, the number of components and the
+average clustering without the ego, the average of each centrality over the
+friends (leaving out those only tied to the ego), the strong triadic closure
+figures and how long the dataset took. A dataset that fails to load gets a row
+with the error instead of stopping the run.
+
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+
+import networkx as nx
+import pandas as pd
+
+import networks_lab as nl
+
+
+FRIEND_SUFFIX = "_friend_data.csv"
+GENERAL_SUFFIX = "_general_data.csv"
+
+COLUMNS = ["dataset", "friends", "ties", "density", "components", "clustering",
+	"betweenness", "closeness", "degree", "eigenvector", "strong ties",
+	"triads", "triadic closure", "seconds", "error"]
+
+
+def find_datasets(folder):
+	""" Returns the names (paths without the suffixes) of the datasets in
+	folder that have both their friend and general data files.
+	"""
+
+	names = []
+	for path in sorted(glob.glob(os.path.join(folder, "*"+FRIEND_SUFFIX))):
+		name = path[:-len(FRIEND_SUFFIX)]
+		if os.path.exists(name+GENERAL_SUFFIX):
+			names.append(name)
+	return names
+
+
+def strong_triadic_closure(graph):
+	""" Returns (strong ties, triads, share) as
+	Graph.test_Strong_Triadic_Closure counts them: the friends you have
+	strong ties with, the ordered pairs of them and the share of those
+	pairs who are friends themselves.
+	"""
+
+	found = graph._strong_closure()
+	if found is None:
+		return 0, 0, 0.
+	triads, closed = found[0]
+	strong = sum(graph._strong_nodes())
+	if triads == 0:
+		return strong, 0, 0.
+	return strong, triads, closed/float(triads)
+
+
+def analyse(name, samples=None, seed=0):
+	""" Loads one dataset and works out its row of the results table."""
+
+	start = time.time()
+	row = {"dataset": os.path.basename(name)}
+	# the lab methods talk to the user as they go; keep that out of
+	# the progress report
+	stdout = sys.stdout
+	sys.stdout = open(os.devnull, "w")
+	try:
+		graph = nl.Graph()
+		graph.load_data(os.path.relpath(name))
+		friends = len(graph.mynet) - 1
+		no_ego = graph.no_ego_net
+		row["friends"] = friends
+		row["ties"] = graph.mynet.number_of_edges()
+		row["density"] = graph.density()
+		# friends only tied to you are components on their own
+		row["components"] = (nx.number_connected_components(no_ego)
+			+ friends - len(no_ego))
+		row["clustering"] = graph.clustering(-1, average=True)
+
+		report = graph.centrality_report(samples=samples, seed=seed)
+		for measure in ["betweenness", "closeness", "degree", "eigenvector"]:
+			values = report[measure]
+			row[measure] = values[values != -1].mean()
+
+		(row["strong ties"], row["triads"],
+			row["triadic closure"]) = strong_triadic_closure(graph)
+	except Exception as error:
+		row["error"] = type(error).__name__+": "+str(error)
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+	row["seconds"] = time.time() - start
+	return row
+
+
+def _analyse(job):
+	return analyse(*job)
+
+
+def run(folder=".", output="batch_results.csv", workers=None, samples=None,
+	seed=0):
+	""" Analyses every dataset in folder with workers processes (one per
+	processor core by default), reporting progress as each one finishes,
+	and writes the results table to output. Returns the table.
+	"""
+
+	names = find_datasets(folder)
+	if not names:
+		print "No datasets found in "+str(folder)
+		return pd.DataFrame(columns=COLUMNS)
+
+	workers = min(workers or multiprocessing.cpu_count(), len(names))
+	print ("Analysing "+str(len(names))+" datasets with "+str(workers)
+		+" worker processes")
+	start = time.time()
+	rows = []
+	jobs = [(name, samples, seed) for name in names]
+	if workers > 1:
+		pool = multiprocessing.Pool(workers)
+		results = pool.imap_unordered(_analyse, jobs)
+	else:
+		pool = None
+		results = (analyse(*job) for job in jobs)
+	try:
+		for row in results:
+			rows.append(row)
+			if "error" in row:
+				status = "failed ("+row["error"]+")"
+			else:
+				status = "done in %.2fs" % row["seconds"]
+			print "[%d/%d] %s %s" % (len(rows), len(names), row["dataset"], status)
+			sys.stdout.flush()
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+
+	table = pd.DataFrame(rows, columns=COLUMNS).sort_values("dataset")
+	table.to_csv(output, index=False)
+	print ("Finished in %.2fs, results written to " % (time.time()-start)
+		+ str(output))
+	return table
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Analyse every ego network"
+		+" dataset (name_friend_data.csv and name_general_data.csv) in a folder.")
+	parser.add_argument("folder", nargs="?", default=".",
+		help="where the datasets are (default: here)")
+	parser.add_argument("-o", "--output", default="batch_results.csv",
+		help="the results table to write (default: batch_results.csv)")
+	parser.add_argument("-w", "--workers", type=int, default=None,
+		help="worker processes (default: one per core)")
+	parser.add_argument("-s", "--samples", type=int, default=None,
+		help="estimate betweenness and closeness from this many friends")
+	parser.add_argument("--seed", type=int, default=0,
+		help="random seed for --samples (default: 0)")
+	args = parser.parse_args(argv)
+	table = run(args.folder, args.output, args.workers, args.samples, args.seed)
+	with pd.option_context("display.width", 200, "display.max_columns", 20):
+		print table.drop("error", axis=1).to_string(index=False)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,974 @@
+""" Timing benchmarks for the Social Dynamics package
+
+These are for checking how the lab code scales, not for the lab itself.
+Run them from the lab folder, e.g.
+
+	python benchmarks.py load
+
+to time loading the shipped datasets and some larger synthetic ego networks, or
+
+	python benchmarks.py centrality
+
+to compare the exact and estimated betweenness and closeness centralities, or
+
+	python benchmarks.py parallel
+
+to see how the centralities speed up when shared between processes, or
+
+	python benchmarks.py snapshot
+
+to compare loading from the CSV files with loading a binary snapshot, or
+
+	python benchmarks.py crawl
+
+to time fetching a made up network from a stand-in for the Graph API, or
+
+	python benchmarks.py batch
+
+to count the requests saved by fetching profiles in batches, or
+
+	python benchmarks.py transport
+
+to time requests made over kept open connections against new ones each time, or
+
+	python benchmarks.py async
+
+to time fetching mutual friends with many requests waiting at once, or
+
+	python benchmarks.py paging
+
+to time going through a long friend list a page at a time, or
+
+	python benchmarks.py cache
+
+to time crawling again with the answers kept in a response cache, or
+
+	python benchmarks.py clustering
+
+to compare clustering by attribute from one triangle count with NetworkX, or
+
+	python benchmarks.py crosstab
+
+to time counting a hundred thousand friends by their attributes, or
+
+	python benchmarks.py homophily
+
+to compare associativity by attribute friend by friend and from an edge table, or
+
+	python benchmarks.py closure
+
+to compare testing strong triadic closure pair by pair and from tie counts, or
+
+	python benchmarks.py significance
+
+to time testing homophily, clustering and strong closure against shuffled and
+rewired networks.
+
+"""
+
+import BaseHTTPServer
+import csv
+import gzip
+import json
+import multiprocessing
+import os
+import shutil
+import SocketServer
+import StringIO
+import sys
+import tempfile
+import threading
+import time
+import urllib
+import urlparse
+
+import networkx as nx
+import numpy as np
+
+import centrality as cn
+import crawler as cr
+import crosstab as ct
+import facebook as fb
+import friend_store as fs
+import homophily as hm
+import networks_lab as nl
+
+
+SHIPPED = ["1", "2", "3", "4", "4j", "5"]
+
+
+def synthetic_ego_network(folder, name, size, degree=20, seed=0):
+	""" Writes a made up ego network with size friends to the files
+	name_friend_data.csv and name_general_data.csv in folder, in the
+	same format the labs save. Friends are mostly tied to friends with
+	nearby ID numbers (so the network has some clustering) with a few
+	random ties thrown in. Returns the file name to hand to load_data.
+	"""
+
+	rng = np.random.RandomState(seed)
+	ego = 1
+	ids = np.arange(2, size+2)
+
+	# ties to nearby friends, a tenth of them rewired at random
+	source = np.repeat(np.arange(size), degree//2)
+	target = (source + rng.randint(1, degree+1, len(source))) % size
+	rewire = rng.rand(len(source)) < 0.1
+	target[rewire] = rng.randint(0, size, rewire.sum())
+	keep = source != target
+	source, target = source[keep], target[keep]
+
+	both = np.concatenate([source, target])
+	other = np.concatenate([target, source])
+	order = np.lexsort((other, both))
+	both, other = both[order], other[order]
+	bounds = np.searchsorted(both, np.arange(size+1))
+
+	mutuals = ["[]"]
+	for n in range(size):
+		friends = np.unique(ids[other[bounds[n]:bounds[n+1]]])
+		mutuals.append("[" + ", ".join(str(i) for i in friends) + "]")
+
+	everyone = [ego] + ids.tolist()
+	genders = np.array(["female", "male", ""])[rng.choice(3, size+1, p=[.48, .48, .04])]
+	out = open(os.path.join(folder, name+"_friend_data.csv"), "wb")
+	writer = csv.writer(out)
+	writer.writerow([""] + everyone)
+	writer.writerow(["gender"] + genders.tolist())
+	writer.writerow(["known from", -1] + rng.randint(1, 6, size).tolist())
+	writer.writerow(["mutuals"] + mutuals)
+	writer.writerow(["name"] + ["Friend "+str(i) for i in everyone])
+	writer.writerow(["strong tie", -1] + (rng.rand(size) < 0.15).astype(int).tolist())
+	writer.writerow(["race"] + rng.randint(1, 3, size+1).tolist())
+	out.close()
+
+	out = open(os.path.join(folder, name+"_general_data.csv"), "w")
+	out.write("my_ID;"+str(ego)+"\n")
+	out.write("contexts_list;-1:Ego node,1:Family,2:Work,3:School,4:Social,5:Other,\n")
+	out.close()
+
+	return os.path.relpath(os.path.join(folder, name))
+
+
+class _StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+	# room for all the connections an AsyncGraphAPI opens at once
+	request_queue_size = 128
+
+
+def stand_in_graph(size=200, degree=10, delay=0.02, fail=0., seed=0,
+	handshake=0., limit=0, page_size=100):
+	""" Starts a local HTTP server that answers like graph.facebook.com
+	for a made up user ("me") with size friends, each with about degree
+	mutual friends. Every answer takes delay seconds and a share fail of
+	them are errors. Like the real thing, several profiles can be asked
+	for at once with ids=, which fails if any of them doesn't exist,
+	connections are kept open between requests and answers are gzipped
+	when the client takes gzip. Opening a connection takes handshake
+	seconds, standing in for the TLS handshake. If limit is set, requests
+	made while limit others are being answered get the Graph API's "User
+	request limit reached" error. Lists of friends come page_size to a
+	page, with a link to the next page. The first friend's name isn't
+	plain ASCII, and answers are sent as UTF-8 like the real thing.
+
+	Returns the server (call shutdown() when done; its requests,
+	connections and limited count the requests answered, connections
+	opened and requests turned away) and the url to give
+	facebook.GraphAPI.
+	"""
+
+	rng = np.random.RandomState(seed)
+	ids = [str(1000+i) for i in range(size)]
+	net = nx.watts_strogatz_graph(size, degree, 0.1, seed)
+	mutuals = dict((ids[n], [ids[m] for m in net.neighbors(n)]) for n in net)
+	genders = dict((i, ["female", "male"][rng.randint(2)]) for i in ids)
+	names = dict((i, "Friend "+i) for i in ids)
+	if ids:
+		names[ids[0]] = u"Ren\xe9e "+ids[0]
+	lock = threading.Lock()
+
+	def profile(id):
+		return {"id": id, "name": names[id], "gender": genders[id]}
+
+	class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+		protocol_version = "HTTP/1.1"
+		# the answer goes out in one piece when it is done, rather than a
+		# header at a time (which kept open connections wait on)
+		wbufsize = -1
+
+		def setup(self):
+			time.sleep(handshake)
+			with lock:
+				server.connections += 1
+			BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+		def do_GET(self):
+			with lock:
+				server.requests += 1
+				failing = rng.rand() < fail
+				busy = limit and server.busy >= limit
+				if busy:
+					server.limited += 1
+				else:
+					server.busy += 1
+			try:
+				self.answer(failing, busy)
+			finally:
+				if not busy:
+					with lock:
+						server.busy -= 1
+
+		def answer(self, failing, busy):
+			time.sleep(delay)
+			url = urlparse.urlparse(self.path)
+			path = url.path.strip("/").split("/")
+			asked = urlparse.parse_qs(url.query).get("ids", [""])[0]
+			asked = [id for id in asked.split(",") if id]
+			if busy:
+				answer = {"error": {"type": "OAuthException", "code": 17,
+					"message": "(#17) User request limit reached"}}
+			elif failing:
+				answer = {"error": {"type": "OAuthException",
+					"message": "Stand-in failure"}}
+			elif path == [""] and asked:
+				missing = [id for id in asked if id not in mutuals]
+				if missing:
+					answer = {"error": {"type": "OAuthException",
+						"message": "(#803) Some of the aliases you requested do "
+						"not exist: "+",".join(missing)}}
+				else:
+					answer = dict((id, profile(id)) for id in asked)
+			elif path == ["me", "friends"]:
+				answer = self.page(url, ids)
+			elif len(path) == 1 and path[0] in mutuals:
+				answer = profile(path[0])
+			elif len(path) == 2 and path[1] == "mutualfriends":
+				answer = self.page(url, mutuals.get(path[0], []))
+			else:
+				answer = {"error": {"type": "GraphMethodException",
+					"message": "Unsupported get request."}}
+			body = json.dumps(answer, ensure_ascii=False).encode("utf-8")
+			self.send_response(200)
+			self.send_header("Content-Type", "application/json")
+			if "gzip" in self.headers.get("Accept-Encoding", ""):
+				packed = StringIO.StringIO()
+				out = gzip.GzipFile(fileobj=packed, mode="wb")
+				out.write(body)
+				out.close()
+				body = packed.getvalue()
+				self.send_header("Content-Encoding", "gzip")
+			self.send_header("Content-Length", str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def page(self, url, people):
+			query = dict(urlparse.parse_qsl(url.query))
+			offset = int(query.get("offset", 0))
+			size = int(query.get("limit", page_size))
+			answer = {"data": [{"id": i, "name": names[i]}
+				for i in people[offset:offset+size]]}
+			if offset+size < len(people):
+				query.update(offset=offset+size, limit=size)
+				answer["paging"] = {"next": "http://%s%s?%s" % (
+					self.headers["Host"], url.path, urllib.urlencode(query))}
+			return answer
+
+		def log_message(self, *args):
+			pass
+
+	server = _StandInServer(("127.0.0.1", 0), Handler)
+	server.requests = 0
+	server.connections = 0
+	server.limited = 0
+	server.busy = 0
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	return server, "http://127.0.0.1:%d/" % server.server_address[1]
+
+
+def _quietly(function, *args):
+	""" Calls function without letting it print anything."""
+
+	shown = sys.stdout
+	sys.stdout = StringIO.StringIO()
+	try:
+		return function(*args)
+	finally:
+		sys.stdout = shown
+
+
+def best_time(function, repeat=3):
+	""" Returns the fastest of repeat runs of function, in seconds."""
+
+	times = []
+	for i in range(repeat):
+		start = time.time()
+		function()
+		times.append(time.time() - start)
+	return min(times)
+
+
+def bench_load(sizes=(10000, 100000)):
+	""" Times reading the friend data and building the network for the
+	shipped datasets and for synthetic ego networks of the given sizes.
+	"""
+
+	def load(file_name):
+		graph = nl.Graph()
+		graph._load_network(file_name)
+		return graph
+
+	print "%-12s %10s %10s %10s" % ("dataset", "friends", "ties", "seconds")
+	for name in SHIPPED:
+		graph = load(name)
+		print "%-12s %10d %10d %10.4f" % (name, len(graph.friend_db),
+			graph.mynet.number_of_edges(), best_time(lambda: load(name)))
+
+	folder = tempfile.mkdtemp()
+	try:
+		for size in sizes:
+			file_name = synthetic_ego_network(folder, "synthetic"+str(size), size)
+			start = time.time()
+			graph = load(file_name)
+			took = time.time() - start
+			print "%-12s %10d %10d %10.4f" % ("synthetic", len(graph.friend_db),
+				graph.mynet.number_of_edges(), took)
+	finally:
+		shutil.rmtree(folder)
+
+
+def bench_centrality(samples=100, seed=0, sizes=(50000,)):
+	""" Compares exact betweenness and closeness centrality (NetworkX)
+	with the estimates from samples pivots on the shipped datasets: the
+	time each takes, the largest error in the estimates and the bound
+	reported for it. The synthetic networks are too big for the exact
+	versions so only the estimates are timed.
+	"""
+
+	exact = {"betweenness": nx.betweenness_centrality,
+		"closeness": nx.closeness_centrality}
+	estimate = {"betweenness": cn.betweenness, "closeness": cn.closeness}
+
+	print "%-12s %-12s %8s %10s %10s %10s %10s" % ("dataset", "measure",
+		"nodes", "exact s", "approx s", "max error", "bound")
+	for name in SHIPPED:
+		graph = nl.Graph()
+		graph._load_network(name)
+		net = graph.no_ego_net
+		for measure in ["betweenness", "closeness"]:
+			start = time.time()
+			truth = exact[measure](net)
+			exact_time = time.time() - start
+			start = time.time()
+			values, bound = estimate[measure](cn.adjacency(net), samples, seed)
+			approx_time = time.time() - start
+			error = max(abs(values[n] - truth[n]) for n in truth)
+			print "%-12s %-12s %8d %10.4f %10.4f %10.4f %10.4f" % (name,
+				measure, len(net), exact_time, approx_time, error, bound)
+
+	folder = tempfile.mkdtemp()
+	try:
+		for size in sizes:
+			file_name = synthetic_ego_network(folder, "synthetic"+str(size), size)
+			graph = nl.Graph()
+			graph._load_network(file_name)
+			for measure in ["betweenness", "closeness"]:
+				start = time.time()
+				values, bound = estimate[measure](cn.adjacency(graph.mynet),
+					samples, seed)
+				approx_time = time.time() - start
+				print "%-12s %-12s %8d %10s %10.4f %10s %10.4f" % ("synthetic",
+					measure, len(graph.mynet), "-", approx_time, "-", bound)
+	finally:
+		shutil.rmtree(folder)
+
+
+def bench_parallel(size=5000, samples=1000, seed=0):
+	""" Times betweenness and closeness (from the same searches) on a
+	synthetic ego network with 1, 2, 4, ... worker processes, up to the
+	number of processor cores.
+	"""
+
+	folder = tempfile.mkdtemp()
+	try:
+		file_name = synthetic_ego_network(folder, "synthetic"+str(size), size)
+		graph = nl.Graph()
+		graph._load_network(file_name)
+		adj = cn.adjacency(graph.mynet)
+	finally:
+		shutil.rmtree(folder)
+
+	print "%-8s %10s %10s" % ("workers", "seconds", "speedup")
+	workers = 1
+	while True:
+		took = best_time(lambda: cn.shortest_paths(adj, samples, seed,
+			workers=workers), repeat=1)
+		if workers == 1:
+			single = took
+		print "%-8d %10.4f %10.2f" % (workers, took, single/took)
+		if workers >= multiprocessing.cpu_count():
+			break
+		workers = min(2*workers, multiprocessing.cpu_count())
+
+
+def bench_snapshot(sizes=(10000, 100000)):
+	""" Times loading the shipped datasets and synthetic ego networks of
+	the given sizes from their CSV files and from snapshots of them.
+	"""
+
+	print "%-12s %10s %10s %10s %10s" % ("dataset", "friends", "csv s",
+		"snapshot s", "speedup")
+	folder = tempfile.mkdtemp()
+	try:
+		names = SHIPPED + [synthetic_ego_network(folder, "synthetic"+str(size),
+			size) for size in sizes]
+		for name in names:
+			graph = nl.Graph()
+			graph._load_network(name)
+			snapshot = os.path.relpath(os.path.join(folder,
+				os.path.basename(name)))
+			graph.save_snapshot(snapshot)
+			csv_time = best_time(lambda: nl.Graph()._load_network(name))
+			snapshot_time = best_time(lambda: nl.Graph().load_snapshot(snapshot))
+			print "%-12s %10d %10.4f %10.4f %10.2f" % (os.path.basename(name),
+				len(graph.friend_db), csv_time, snapshot_time,
+				csv_time/snapshot_time)
+	finally:
+		shutil.rmtree(folder)
+
+
+def bench_crawl(size=200, delay=0.02, workers=(1, 4, 8, 16)):
+	""" Times fetching the friends and mutual friends of a made up user
+	from a stand-in Graph API server with delay seconds per request,
+	with different numbers of workers. Then shows a crawl with failing
+	requests finishing over a few runs from its checkpoint.
+	"""
+
+	folder = tempfile.mkdtemp()
+	server, url = stand_in_graph(size, delay=delay)
+	try:
+		graph = fb.GraphAPI("token", url=url)
+		print "%-8s %10s %10s" % ("workers", "seconds", "speedup")
+		for count in workers:
+			checkpoint = os.path.join(folder, "crawl%d.json" % count)
+			start = time.time()
+			crawler = cr.Crawler(graph, checkpoint, workers=count)
+			friends = crawler.friends()
+			crawler.profiles(friends)
+			crawler.mutual_friends(friends)
+			took = time.time() - start
+			if count == workers[0]:
+				single = took
+			print "%-8d %10.4f %10.2f" % (count, took, single/took)
+	finally:
+		server.shutdown()
+
+	server, url = stand_in_graph(size, delay=delay, fail=0.2)
+	try:
+		graph = fb.GraphAPI("token", url=url)
+		checkpoint = os.path.join(folder, "failing.json")
+		for run in range(1, 10):
+			crawler = cr.Crawler(graph, checkpoint, workers=max(workers))
+			try:
+				friends = crawler.friends()
+			except fb.GraphAPIError:
+				print "run %d: couldn't get the friend list" % run
+				continue
+			profiles = crawler.profiles(friends)
+			mutuals = crawler.mutual_friends(friends)
+			print "run %d: %d profiles and %d mutual friend lists of %d" % (run,
+				len(profiles), len(mutuals), len(friends))
+			if len(profiles) == len(mutuals) == len(friends):
+				break
+	finally:
+		server.shutdown()
+		shutil.rmtree(folder)
+
+
+def bench_batch(size=1000, delay=0.02, batch_sizes=(1, 10, 50)):
+	""" Counts and times the requests for the profiles of size friends
+	from a stand-in Graph API server, fetched batch_size to a request.
+	Then fetches them again with some IDs that don't exist mixed in, to
+	show those coming back as errors without spoiling the rest.
+	"""
+
+	server, url = stand_in_graph(size, delay=delay)
+	try:
+		graph = fb.GraphAPI("token", url=url)
+		friends = [str(person["id"])
+			for person in graph.iter_connections("me", "friends")]
+		print "%-8s %10s %10s %10s" % ("batch", "requests", "seconds", "speedup")
+		for batch_size in batch_sizes:
+			server.requests = 0
+			start = time.time()
+			profiles, errors = graph.fetch_objects(friends, batch_size)
+			took = time.time() - start
+			if batch_size == batch_sizes[0]:
+				single = took
+			assert len(profiles) == len(friends) and not errors
+			print "%-8d %10d %10.4f %10.2f" % (batch_size, server.requests,
+				took, single/took)
+
+		missing = [str(i) for i in range(10)]
+		server.requests = 0
+		profiles, errors = graph.fetch_objects(friends + missing,
+			max(batch_sizes))
+		print "with %d missing: %d profiles, %d errors, %d requests" % (
+			len(missing), len(profiles), len(errors), server.requests)
+	finally:
+		server.shutdown()
+
+
+def bench_transport(requests=500, handshake=0.01, delay=0.):
+	""" Times requests made one after another to a stand-in Graph API
+	server where each new connection takes handshake seconds, with a new
+	connection for every request (pool_size=0, as before the pool) and
+	with connections kept open, with and without gzip.
+	"""
+
+	server, url = stand_in_graph(delay=delay, handshake=handshake)
+	try:
+		print "%-16s %12s %10s %10s" % ("transport", "connections", "seconds",
+			"speedup")
+		for name, size, packed in [("new each time", 0, False),
+			("kept open", 8, False), ("kept open, gzip", 8, True)]:
+			graph = fb.GraphAPI("token", url=url, pool_size=size, gzip=packed)
+			server.connections = 0
+			start = time.time()
+			friends = graph.get_connections("me", "friends")["data"]
+			for i in range(requests):
+				graph.get_object(friends[i % len(friends)]["id"])
+			took = time.time() - start
+			graph.pool.close()
+			if size == 0:
+				single = took
+			print "%-16s %12d %10.4f %10.2f" % (name, server.connections, took,
+				single/took)
+	finally:
+		server.shutdown()
+
+
+def bench_async(size=1000, delay=0.02, limits=(8, 32, 64), server_limit=16):
+	""" Times fetching the mutual friends of size friends from a stand-in
+	Graph API server, one after another with GraphAPI and with limit
+	requests at once with AsyncGraphAPI. Then does it again with a
+	server that turns away more than server_limit requests at once, so
+	the requests have to back off.
+	"""
+
+	server, url = stand_in_graph(size, delay=delay)
+	try:
+		graph = fb.GraphAPI("token", url=url)
+		friends = [person["id"]
+			for person in graph.iter_connections("me", "friends")]
+		print "%-8s %10s %10s" % ("limit", "seconds", "speedup")
+		start = time.time()
+		expected = [graph.get_connections(id, "mutualfriends")["data"]
+			for id in friends]
+		single = time.time() - start
+		print "%-8d %10.4f %10.2f" % (1, single, 1.)
+		for limit in limits:
+			graph = fb.AsyncGraphAPI("token", url=url, limit=limit)
+			start = time.time()
+			pending = [graph.get_connections(id, "mutualfriends")
+				for id in friends]
+			found = [result.get()["data"] for result in pending]
+			took = time.time() - start
+			graph.close()
+			assert found == expected
+			print "%-8d %10.4f %10.2f" % (limit, took, single/took)
+	finally:
+		server.shutdown()
+
+	server, url = stand_in_graph(size, delay=delay, limit=server_limit)
+	try:
+		graph = fb.AsyncGraphAPI("token", url=url, limit=max(limits),
+			backoff=0.05)
+		start = time.time()
+		pending = [graph.get_connections(id, "mutualfriends") for id in friends]
+		found = [result.get()["data"] for result in pending]
+		took = time.time() - start
+		graph.close()
+		print "server taking %d at once: %d lists in %.4f seconds, %d requests" \
+			" turned away" % (server_limit, len(found), took, server.limited)
+	finally:
+		server.shutdown()
+
+
+def bench_paging(size=20000, page_size=500, delay=0.05, work=0.05):
+	""" Times going through the friend list of a user with size friends
+	from a stand-in Graph API server giving page_size friends to a page,
+	taking work seconds over each page, with and without fetching the next
+	page in the meantime.
+	"""
+
+	server, url = stand_in_graph(size, delay=delay, page_size=page_size)
+	try:
+		graph = fb.GraphAPI("token", url=url)
+		first = graph.get_connections("me", "friends")["data"]
+		print "get_connections: %d of %d friends" % (len(first), size)
+		print "%-10s %10s %10s %10s" % ("prefetch", "friends", "seconds",
+			"speedup")
+		for prefetch in [False, True]:
+			start = time.time()
+			count = 0
+			for person in graph.iter_connections("me", "friends", prefetch):
+				count += 1
+				if count % page_size == 0:
+					time.sleep(work)
+			took = time.time() - start
+			if not prefetch:
+				single = took
+			print "%-10s %10d %10.4f %10.2f" % (prefetch, count, took,
+				single/took)
+	finally:
+		server.shutdown()
+
+
+def bench_cache(size=500, delay=0.02, max_size=20000):
+	""" Crawls a made up user from a stand-in Graph API server twice
+	(each time from scratch, as if the checkpoint had been lost) through a
+	response cache, counting the requests that reach the server. Then
+	crawls once more with a cache too small to hold it all.
+	"""
+
+	folder = tempfile.mkdtemp()
+	server, url = stand_in_graph(size, delay=delay)
+	try:
+		cache = fb.ResponseCache(os.path.join(folder, "cache.sqlite"))
+		graph = fb.GraphAPI("token", url=url, cache=cache)
+		print "%-8s %10s %10s %10s %10s" % ("run", "requests", "hits", "misses",
+			"seconds")
+		for run in range(1, 3):
+			checkpoint = os.path.join(folder, "crawl%d.json" % run)
+			server.requests = cache.hits = cache.misses = 0
+			start = time.time()
+			crawler = cr.Crawler(graph, checkpoint)
+			friends = crawler.friends()
+			crawler.profiles(friends)
+			crawler.mutual_friends(friends)
+			print "%-8d %10d %10d %10d %10.4f" % (run, server.requests,
+				cache.hits, cache.misses, time.time() - start)
+		cache.close()
+
+		cache = fb.ResponseCache(os.path.join(folder, "small.sqlite"),
+			max_size=max_size)
+		graph = fb.GraphAPI("token", url=url, cache=cache)
+		crawler = cr.Crawler(graph, os.path.join(folder, "small.json"))
+		crawler.mutual_friends(crawler.friends())
+		print "cache of %d bytes: %d answers dropped" % (max_size,
+			cache.evictions)
+		cache.close()
+	finally:
+		server.shutdown()
+		shutil.rmtree(folder)
+
+
+def bench_clustering(sizes=(10000, 50000), attributes=("gender", "known from",
+	"race", "strong tie")):
+	""" Times the clustering coefficients by each of attributes the way
+	clustering_by_attribute_summary used to work them out (nx.clustering
+	for each value of each attribute) and from one count of the triangles,
+	on the shipped datasets and made up ones of the given sizes, with the
+	largest difference between the two.
+	"""
+
+	def old(graph, attributes):
+		found = {}
+		for attribute in attributes:
+			groups = {}
+			for i in graph.friend_db.ids.tolist():
+				groups.setdefault(repr(graph.friend_db.get_value(i, attribute)),
+					[]).append(i)
+			for nodes in groups.values():
+				found.update(nx.clustering(graph.mynet, nodes))
+		return found
+
+	def new(graph, attributes):
+		graph._touch()
+		for attribute in attributes:
+			_quietly(graph.clustering_by_attribute_summary, attribute)
+		nodes, values, position = graph._clustering()
+		return dict(zip(nodes, values.tolist()))
+
+	def compare(name, graph):
+		present = [a for a in attributes if a in graph.friend_db.attributes]
+		start = time.time()
+		expected = old(graph, present)
+		old_time = time.time() - start
+		start = time.time()
+		found = new(graph, present)
+		new_time = time.time() - start
+		error = max(abs(found[n] - expected[n]) for n in expected)
+		print "%-12s %8d %10.4f %10.4f %10.2f %10.2g" % (name, len(graph.mynet),
+			old_time, new_time, old_time/new_time, error)
+
+	print "%-12s %8s %10s %10s %10s %10s" % ("dataset", "nodes", "nx s",
+		"triangles s", "speedup", "max error")
+	for name in SHIPPED:
+		graph = nl.Graph()
+		graph._load_network(name)
+		compare(name, graph)
+
+	folder = tempfile.mkdtemp()
+	try:
+		for size in sizes:
+			file_name = synthetic_ego_network(folder, "synthetic"+str(size), size)
+			graph = nl.Graph()
+			graph._load_network(file_name)
+			compare("synthetic", graph)
+	finally:
+		shutil.rmtree(folder)
+
+
+def bench_crosstab(size=100000, extra=30, seed=0):
+	""" Times breaking a made up set of size friends down by each of
+	their attributes (the usual ones plus extra made up ones), the way
+	attribute_breakdown used to count them (friend by friend into a
+	dictionary) and with the crosstab module, and then counting them by
+	every attribute at once.
+	"""
+
+	rng = np.random.RandomState(seed)
+	choices = {"gender": ["female", "male", ""], "race": ["1", "2", ""],
+		"known from": [str(i) for i in range(8)] + [""],
+		"strong tie": ["0", "1", ""]}
+	for i in range(extra):
+		choices["extra%d" % i] = ["a", "b", "c", "d", ""]
+	columns = dict((attribute, np.array(values, dtype=object)[
+		rng.randint(len(values), size=size)])
+		for attribute, values in choices.items())
+	store = fs.FriendStore.from_columns(np.arange(2, size+2), columns)
+	attributes = sorted(choices)
+
+	def old(attribute):
+		vals = {}
+		for i in list(store):
+			which = store[i][attribute]
+			vals[repr(which)] = vals.get(repr(which), 0) + 1
+		return vals
+
+	start = time.time()
+	expected = [old(attribute) for attribute in attributes]
+	old_time = time.time() - start
+	start = time.time()
+	found = [ct.crosstab(store, attribute) for attribute in attributes]
+	new_time = time.time() - start
+	for counts, table in zip(expected, found):
+		assert sorted(counts.values()) == sorted(table.tolist())
+	print "%d friends, %d attributes one at a time: %.4f seconds friend by " \
+		"friend, %.4f with crosstab (%.0fx)" % (size, len(attributes),
+		old_time, new_time, old_time/new_time)
+
+	start = time.time()
+	table = ct.crosstab(store, attributes, share=True, within="known from")
+	print "all %d attributes together: %d combinations in %.4f seconds" % (
+		len(attributes), len(table), time.time() - start)
+
+
+def bench_homophily(sizes=(10000, 50000), attributes=("gender", "known from",
+	"race", "strong tie")):
+	""" Times the associativity by each of attributes the way
+	associativity_by_attribute used to work it out (looking up every
+	mutual friend of every friend) and from one edge table, with the
+	largest difference between the two, and then the assortativity and
+	E-I index of all the attributes together.
+	"""
+
+	def old(graph, attribute):
+		db = graph.friend_db
+		ego = db[graph.my_ID][attribute]
+		shares = {}
+		for i in list(db):
+			val = db[i][attribute]
+			hit = 0
+			total = 0
+			for j in db[i]["mutuals"]:
+				if int(j) in db:
+					if db[int(j)][attribute] == val:
+						hit += 1
+					total += 1
+			if i != graph.my_ID:
+				if ego == val:
+					hit += 1
+				total += 1
+			key = ct.MISSING if fs.is_missing(val) else val
+			shares.setdefault(key, []).append(hit/float(total) if total else 0)
+		return dict((k, sum(v)/len(v)) for k, v in shares.items())
+
+	def new(graph, attribute, table):
+		return hm.associativity(graph.friend_db, table, attribute,
+			graph.my_ID).to_dict()
+
+	def compare(name, graph):
+		present = [a for a in attributes if a in graph.friend_db.attributes]
+		start = time.time()
+		expected = [old(graph, attribute) for attribute in present]
+		old_time = time.time() - start
+		start = time.time()
+		table = hm.edges(graph.friend_db)
+		found = [new(graph, attribute, table) for attribute in present]
+		new_time = time.time() - start
+		error = max(abs(f[k] - e[k]) for f, e in zip(found, expected) for k in e)
+		start = time.time()
+		hm.summary(graph.friend_db, present)
+		print "%-12s %8d %10.4f %10.4f %10.2f %10.2g %10.4f" % (name,
+			len(graph.friend_db), old_time, new_time, old_time/new_time, error,
+			time.time() - start)
+
+	print "%-12s %8s %10s %10s %10s %10s %10s" % ("dataset", "friends",
+		"loop s", "table s", "speedup", "max error", "summary s")
+	for name in SHIPPED:
+		graph = nl.Graph()
+		graph._load_network(name)
+		compare(name, graph)
+
+	folder = tempfile.mkdtemp()
+	try:
+		for size in sizes:
+			file_name = synthetic_ego_network(folder, "synthetic"+str(size), size)
+			graph = nl.Graph()
+			graph._load_network(file_name)
+			compare("synthetic", graph)
+	finally:
+		shutil.rmtree(folder)
+
+
+def bench_closure(sizes=(10000, 100000), old_limit=2000):
+	""" Times test_Strong_Triadic_Closure the way it used to work
+	(checking every ordered pair of strong ties for a tie between the two
+	friends) against the new one together with the test within every
+	group, on the shipped datasets and made up ones of the given sizes.
+	The network's arrays are built before timing, as the other methods
+	share them. The old way is skipped when there are more than old_limit
+	strong ties.
+	"""
+
+	def old(graph):
+		comps = [e for e, s in nx.get_edge_attributes(graph.mynet,
+			"strong").items() if s == 1 and e[0] != e[1]]
+		hit = 0
+		for i in comps:
+			for j in comps:
+				if i != j:
+					notme1 = i[0] if i[0] != graph.my_ID else i[1]
+					notme2 = j[0] if j[0] != graph.my_ID else j[1]
+					if notme2 in graph.mynet[notme1]:
+						hit += 1
+		return len(comps)*(len(comps)-1), hit
+
+	def compare(name, graph):
+		strong = sum(1 for friend, data in graph.mynet[graph.my_ID].items()
+			if data.get("strong") == 1 and friend != graph.my_ID)
+		graph._adjacency(True)
+		start = time.time()
+		_quietly(graph.test_Strong_Triadic_Closure)
+		_quietly(graph.strong_triadic_closure_by_group)
+		new_time = time.time() - start
+		if strong <= old_limit:
+			start = time.time()
+			expected = old(graph)
+			old_time = time.time() - start
+			assert expected == graph._strong_closure()[0]
+			print "%-12s %8d %8d %10.4f %10.4f %10.2f" % (name,
+				len(graph.mynet), strong, old_time, new_time, old_time/new_time)
+		else:
+			print "%-12s %8d %8d %10s %10.4f %10s" % (name, len(graph.mynet),
+				strong, "-", new_time, "-")
+
+	print "%-12s %8s %8s %10s %10s %10s" % ("dataset", "nodes", "strong",
+		"pairs s", "counts s", "speedup")
+	for name in SHIPPED:
+		graph = nl.Graph()
+		graph._load_network(name)
+		compare(name, graph)
+
+	folder = tempfile.mkdtemp()
+	try:
+		for size in sizes:
+			file_name = synthetic_ego_network(folder, "synthetic"+str(size), size)
+			graph = nl.Graph()
+			graph._load_network(file_name)
+			compare("synthetic", graph)
+	finally:
+		shutil.rmtree(folder)
+
+
+def bench_significance(size=5000, samples=10000, rewired=100, seed=0):
+	""" Times the significance tests on a synthetic ego network: samples
+	shuffles for homophily, clustering by group and strong closure, and
+	rewired networks for clustering, with 1, 2, 4, ... worker processes
+	up to the number of processor cores. The results have to be the same
+	whatever the number of workers.
+	"""
+
+	folder = tempfile.mkdtemp()
+	try:
+		file_name = synthetic_ego_network(folder, "synthetic"+str(size), size)
+		graph = nl.Graph()
+		graph._load_network(file_name)
+		graph._adjacency(True)
+	finally:
+		shutil.rmtree(folder)
+
+	tests = [("homophily", samples, lambda n, workers:
+			graph.associativity_significance("known from", n, seed=seed,
+			workers=workers)),
+		("clustering", samples, lambda n, workers:
+			graph.clustering_significance("gender", n, seed=seed,
+			workers=workers)),
+		("closure", samples, lambda n, workers:
+			graph.strong_closure_significance(n, seed=seed, workers=workers)),
+		("rewired", rewired, lambda n, workers:
+			graph.clustering_significance("gender", n, rewire=True, seed=seed,
+			workers=workers))]
+	print "%-12s %8s %8s %10s %10s" % ("test", "samples", "workers",
+		"seconds", "speedup")
+	for name, n, test in tests:
+		workers = 1
+		while True:
+			start = time.time()
+			table = _quietly(test, n, workers)
+			took = time.time() - start
+			if workers == 1:
+				single, first = took, table
+			else:
+				assert table.equals(first)
+			print "%-12s %8d %8d %10.4f %10.2f" % (name, n, workers, took,
+				single/took)
+			if workers >= multiprocessing.cpu_count():
+				break
+			workers = min(2*workers, multiprocessing.cpu_count())
+
+if __name__ == "__main__":
+	which = sys.argv[1:] or ["load"]
+	if "load" in which:
+		bench_load()
+	if "centrality" in which:
+		bench_centrality()
+	if "parallel" in which:
+		bench_parallel()
+	if "snapshot" in which:
+		bench_snapshot()
+	if "crawl" in which:
+		bench_crawl()
+	if "batch" in which:
+		bench_batch()
+	if "transport" in which:
+		bench_transport()
+	if "async" in which:
+		bench_async()
+	if "paging" in which:
+		bench_paging()
+	if "cache" in which:
+		bench_cache()
+	if "clustering" in which:
+		bench_clustering()
+	if "crosstab" in which:
+		bench_crosstab()
+	if "homophily" in which:
+		bench_homophily()
+	if "closure" in which:
+		bench_closure()
+	if "significance" in which:
+		bench_significance()
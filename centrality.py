@@ -0,0 +1,430 @@
+""" Shortest path centralities for large ego networks
+
+NetworkX works out betweenness and closeness centrality by running a breadth
+first search from every node in the network, one node at a time in pure Python.
+That takes time proportional to nodes times ties, which is fine for a few hundred
+friends but hopeless once friends of friends get into the tens of thousands.
+
+This module does the same searches a whole level at a time on NumPy arrays and
+can estimate the centralities from a random sample of starting nodes (the
+"pivots"), scaling the sums up to the whole network the same way NetworkX does
+for its k argument. The estimates come with a Hoeffding bound: with the given
+confidence each node's value is within the bound of the exact one.
+
+The results use the same normalisation as nx.betweenness_centrality and
+nx.closeness_centrality, so with every node as a pivot they match NetworkX.
+
+The searches from different starting nodes don't depend on each other, so
+with workers set they are split between that many processes. The ties are put
+in shared memory once rather than sent to every process with each batch of
+starting nodes, and the processes send back their partial sums to be added up.
+
+Eigenvector centrality is done by the same power iteration as
+nx.eigenvector_centrality but with the multiplications done by SciPy's sparse
+matrices (or NumPy, if SciPy isn't installed), and it can start from an earlier
+answer so that a network that has only changed a little converges quickly.
+
+The network without the ego is made by masking the ego's ties out of the
+arrays (see without) rather than copying the network and removing it.
+
+"""
+
+import ctypes
+import math
+import multiprocessing
+import random
+from multiprocessing import sharedctypes
+
+import networkx as nx
+import numpy as np
+
+try:
+	from scipy import sparse
+except ImportError:
+	sparse = None
+
+
+def adjacency(net, nodes=None):
+	""" Returns the ties in net as (nodes, indptr, indices), a compressed
+	sparse row layout: the neighbours of nodes[i] are
+	nodes[indices[indptr[i]:indptr[i+1]]]. A self-loop shows up once.
+	"""
+
+	if nodes is None:
+		nodes = list(net.nodes())
+	position = dict((n, i) for i, n in enumerate(nodes))
+
+	sources = []
+	targets = []
+	for n, nbrs in net.adjacency_iter():
+		i = position[n]
+		for m in nbrs:
+			sources.append(i)
+			targets.append(position[m])
+	sources = np.array(sources, dtype=np.int64)
+	targets = np.array(targets, dtype=np.int64)
+
+	order = np.lexsort((targets, sources))
+	indptr = np.searchsorted(sources[order], np.arange(len(nodes)+1))
+	return nodes, indptr.astype(np.int64), targets[order]
+
+
+def without(adj, node, untied=False):
+	""" The adjacency arrays of the network with node taken out, along
+	with the nodes that are left with no ties (unless untied is True),
+	without copying the network itself. node may be None to only drop
+	the untied nodes.
+	"""
+
+	nodes, indptr, indices = adj
+	n = len(nodes)
+	rows = np.repeat(np.arange(n), np.diff(indptr))
+	keep = np.ones(len(indices), dtype=bool)
+	if node is not None:
+		position = nodes.index(node)
+		keep = (rows != position) & (indices != position)
+	rows, indices = rows[keep], indices[keep]
+
+	counts = np.bincount(rows, minlength=n)
+	if untied:
+		left = np.ones(n, dtype=bool)
+		if node is not None:
+			left[position] = False
+	else:
+		left = counts > 0
+	tied = np.flatnonzero(left)
+	renumber = np.cumsum(left) - 1
+	indptr = np.zeros(len(tied)+1, dtype=np.int64)
+	np.cumsum(counts[tied], out=indptr[1:])
+	return ([nodes[i] for i in tied.tolist()], indptr,
+		renumber[indices].astype(np.int64))
+
+
+def components(adj):
+	""" The number of connected components in the network."""
+
+	nodes, indptr, indices = adj
+	n = len(nodes)
+	if n == 0:
+		return 0
+	if sparse is not None:
+		from scipy.sparse import csgraph
+		matrix = sparse.csr_matrix((np.ones(len(indices)), indices, indptr),
+			shape=(n, n))
+		return int(csgraph.connected_components(matrix, directed=False)[0])
+	label = np.arange(n)
+	rows = np.repeat(np.arange(n), np.diff(indptr))
+	while True:
+		# every node takes the smallest label among its neighbours
+		# until nothing changes
+		smallest = label.copy()
+		np.minimum.at(smallest, rows, label[indices])
+		if (smallest == label).all():
+			return len(np.unique(label))
+		label = smallest[smallest]
+
+
+def degree(adj):
+	""" Degree centrality of every node, as nx.degree_centrality works
+	it out (a self-loop counts twice). Returns {node: value}.
+	"""
+
+	nodes, indptr, indices = adj
+	n = len(nodes)
+	rows = np.repeat(np.arange(n), np.diff(indptr))
+	counts = np.diff(indptr) + np.bincount(rows[rows == indices], minlength=n)
+	scale = 1. / (n-1) if n > 1 else 1.
+	return dict(zip(nodes, (counts*scale).tolist()))
+
+
+def _neighbours(indptr, indices, rows):
+	""" Returns (owner, nbrs): every neighbour of every node in rows,
+	with owner giving the position in rows it is a neighbour of.
+	"""
+
+	starts = indptr[rows]
+	counts = indptr[rows+1] - starts
+	owner = np.repeat(np.arange(len(rows)), counts)
+	ends = np.cumsum(counts)
+	offsets = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends-counts, counts)
+	return owner, indices[starts[owner] + offsets]
+
+
+def _search(indptr, indices, source):
+	""" Breadth first search from source. Returns the nodes found at
+	each distance, the number of shortest paths to each node (sigma) and,
+	for each distance, the (owner, nbrs) ties that lead one step further
+	out along shortest paths.
+	"""
+
+	n = len(indptr) - 1
+	sigma = np.zeros(n)
+	sigma[source] = 1.
+	seen = np.zeros(n, dtype=bool)
+	seen[source] = True
+
+	levels = [np.array([source])]
+	steps = []
+	while True:
+		frontier = levels[-1]
+		owner, nbrs = _neighbours(indptr, indices, frontier)
+		onward = ~seen[nbrs]
+		owner, nbrs = owner[onward], nbrs[onward]
+		if len(nbrs) == 0:
+			break
+		paths = sigma[frontier][owner]
+		if len(nbrs) > n//16:
+			# big levels are cheaper to count over the whole network
+			# than to sort
+			counts = np.bincount(nbrs, weights=paths, minlength=n)
+			new = np.flatnonzero(counts)
+			sigma[new] = counts[new]
+		else:
+			new, which = np.unique(nbrs, return_inverse=True)
+			sigma[new] = np.bincount(which, weights=paths)
+		seen[new] = True
+		levels.append(new)
+		steps.append((owner, nbrs))
+	return levels, sigma, steps
+
+
+def path_sums(adj, sources, betweenness=True, workers=None):
+	""" Searches from each of sources. Returns (dependency, distance,
+	reached, furthest): arrays over the nodes of the summed Brandes
+	dependencies (the shares of shortest paths each node lies on), the
+	summed distances from the sources that reach each node and how many
+	sources reach it, plus the furthest any source got. With workers,
+	the searches are shared out between that many processes.
+	"""
+
+	if workers > 1 and len(sources) > 1:
+		return _parallel_path_sums(adj, sources, betweenness, workers)
+
+	nodes, indptr, indices = adj
+	n = len(nodes)
+	dependency = np.zeros(n)
+	distance = np.zeros(n)
+	reached = np.zeros(n)
+	furthest = 0
+
+	for s in sources:
+		levels, sigma, steps = _search(indptr, indices, s)
+		for d, level in enumerate(levels):
+			distance[level] += d
+			reached[level] += 1
+		furthest = max(furthest, len(levels)-1)
+		if not betweenness:
+			continue
+
+		delta = np.zeros(n)
+		for d in range(len(steps)-1, -1, -1):
+			frontier = levels[d]
+			owner, nbrs = steps[d]
+			share = (1. + delta[nbrs]) / sigma[nbrs]
+			delta[frontier] = sigma[frontier] * np.bincount(owner,
+				weights=share, minlength=len(frontier))
+		delta[s] = 0.
+		dependency += delta
+
+	return dependency, distance, reached, furthest
+
+
+# The ties as seen from inside a worker process, set up by _start_worker
+_worker_adj = None
+
+
+def _share(array):
+	""" Copies an int64 array into memory the worker processes share."""
+
+	shared = sharedctypes.RawArray(ctypes.c_int64, len(array))
+	np.frombuffer(shared, dtype=np.int64)[:] = array
+	return shared
+
+
+def _start_worker(n, indptr, indices):
+	global _worker_adj
+	_worker_adj = (xrange(n), np.frombuffer(indptr, dtype=np.int64),
+		np.frombuffer(indices, dtype=np.int64))
+
+
+def _worker_path_sums(job):
+	sources, betweenness = job
+	return path_sums(_worker_adj, sources, betweenness)
+
+
+def _parallel_path_sums(adj, sources, betweenness, workers):
+	""" path_sums with the sources dealt out between workers processes,
+	a few batches each so that a slow batch doesn't hold up the rest.
+	"""
+
+	nodes, indptr, indices = adj
+	batches = min(len(sources), 4*workers)
+	jobs = [(sources[i::batches], betweenness) for i in range(batches)]
+	pool = multiprocessing.Pool(workers, _start_worker,
+		(len(nodes), _share(indptr), _share(indices)))
+	try:
+		parts = pool.map(_worker_path_sums, jobs)
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+
+	dependency, distance, reached, furthest = parts[0]
+	for part in parts[1:]:
+		dependency += part[0]
+		distance += part[1]
+		reached += part[2]
+		furthest = max(furthest, part[3])
+	return dependency, distance, reached, furthest
+
+
+def pivots(n, samples=None, seed=None):
+	""" Picks the starting nodes: all n of them if samples is None or
+	at least n, otherwise samples of them chosen with random.Random(seed).
+	"""
+
+	if samples is None or samples >= n:
+		return list(range(n))
+	return sorted(random.Random(seed).sample(range(n), int(samples)))
+
+
+def hoeffding(spread, samples, confidence=0.95):
+	""" The half-width of a Hoeffding interval for the mean of samples
+	values that each lie in a range of width spread.
+	"""
+
+	return spread * math.sqrt(math.log(2./(1.-confidence)) / (2.*samples))
+
+
+def _betweenness(sums, n, k, confidence):
+	""" Turns the path_sums from k of the n nodes into betweenness
+	centralities. Returns (values, bound).
+	"""
+
+	dependency = sums[0].copy()
+	bound = 0.
+	if n > 2:
+		# each pivot's share of a node's centrality lies in [0, n/(n-1)]
+		dependency *= float(n) / k / ((n-1)*(n-2))
+		if k < n:
+			bound = hoeffding(n/(n-1.), k, confidence)
+	else:
+		dependency[:] = 0.
+	return dependency, bound
+
+
+def _closeness(sums, n, k, confidence):
+	""" Turns the path_sums from k of the n nodes into closeness
+	centralities. Returns (values, bound).
+	"""
+
+	dependency, distance, reached, furthest = sums
+	scale = float(n) / max(k, 1)
+	total = distance * scale
+	found = reached * scale
+	values = np.zeros(n)
+	if n > 1:
+		ok = total > 0
+		values[ok] = (found[ok]-1)**2 / total[ok] / (n-1)
+
+	bound = 0.
+	if k < n and n > 1:
+		# no two nodes are further apart than twice the furthest a
+		# pivot got
+		spread = min(2*furthest, n-1)
+		bound = hoeffding(spread, k, confidence) * n / (n-1.)
+	return values, bound
+
+
+def betweenness(adj, samples=None, seed=None, confidence=0.95, workers=None):
+	""" Betweenness centrality of every node, normalised like NetworkX.
+	With samples set it is estimated from that many pivots. Returns
+	({node: value}, bound), the bound being 0 when it is exact.
+	"""
+
+	nodes = adj[0]
+	sources = pivots(len(nodes), samples, seed)
+	values, bound = _betweenness(path_sums(adj, sources, workers=workers),
+		len(nodes), len(sources), confidence)
+	return dict(zip(nodes, values.tolist())), bound
+
+
+def closeness(adj, samples=None, seed=None, confidence=0.95, workers=None):
+	""" Closeness centrality of every node, normalised like NetworkX.
+	With samples set, the distances to the rest of the network are
+	estimated from that many pivots. Returns ({node: value}, bound) where
+	bound is for each node's average distance to the others.
+	"""
+
+	nodes = adj[0]
+	sources = pivots(len(nodes), samples, seed)
+	sums = path_sums(adj, sources, betweenness=False, workers=workers)
+	values, bound = _closeness(sums, len(nodes), len(sources), confidence)
+	return dict(zip(nodes, values.tolist())), bound
+
+
+def shortest_paths(adj, samples=None, seed=None, confidence=0.95,
+	workers=None):
+	""" Betweenness and closeness centrality from the same searches,
+	which is about as quick as betweenness on its own. Returns
+	((betweenness, bound), (closeness, bound)) like the functions above.
+	"""
+
+	nodes = adj[0]
+	n = len(nodes)
+	sources = pivots(n, samples, seed)
+	sums = path_sums(adj, sources, workers=workers)
+	between, between_bound = _betweenness(sums, n, len(sources), confidence)
+	close, close_bound = _closeness(sums, n, len(sources), confidence)
+	return ((dict(zip(nodes, between.tolist())), between_bound),
+		(dict(zip(nodes, close.tolist())), close_bound))
+
+
+def _product(adj):
+	""" Returns a function multiplying a vector over the nodes by the
+	adjacency matrix.
+	"""
+
+	nodes, indptr, indices = adj
+	n = len(nodes)
+	if sparse is not None:
+		matrix = sparse.csr_matrix((np.ones(len(indices)), indices, indptr),
+			shape=(n, n))
+		return matrix.dot
+	rows = np.repeat(np.arange(n), np.diff(indptr))
+	return lambda x: np.bincount(rows, weights=x[indices], minlength=n)
+
+
+def eigenvector(adj, max_iter=100, tol=1.0e-6, start=None):
+	""" Eigenvector centrality of every node, as nx.eigenvector_centrality
+	works it out (and with the same max_iter and tol). start is an earlier
+	{node: value} answer to begin from; nodes missing from it start at the
+	average. Returns {node: value}.
+	"""
+
+	nodes = adj[0]
+	n = len(nodes)
+	if n == 0:
+		raise nx.NetworkXException("Empty graph.")
+
+	x = np.ones(n)
+	if start:
+		earlier = np.array([start.get(node, np.nan) for node in nodes])
+		known = ~np.isnan(earlier)
+		if known.any() and earlier[known].sum() > 0:
+			x = np.where(known, earlier, earlier[known].mean())
+	x /= x.sum()
+
+	product = _product(adj)
+	for i in range(max_iter):
+		xlast = x
+		x = product(xlast)
+		norm = math.sqrt(np.dot(x, x))
+		if norm > 0:
+			x /= norm
+		if np.abs(x - xlast).sum() < n*tol:
+			return dict(zip(nodes, x.tolist()))
+	raise nx.NetworkXError("eigenvector_centrality(): power iteration"
+		+" failed to converge in %d iterations." % max_iter)
@@ -0,0 +1,153 @@
+""" Clustering coefficients from triangle counts
+
+A friend's clustering coefficient is the share of pairs of their friends who
+are friends themselves, which comes down to counting the triangles each friend
+is in. nx.clustering counts them in pure Python by intersecting sets of
+neighbours, from scratch every time it is called, so asking for the clustering
+of every group in turn counted the same triangles over and over.
+
+Here the triangles of every node are counted at once, on the arrays from the
+centrality module. Counting them as the row sums of (A.A)*A (A the adjacency
+matrix, * multiplying element by element) is the usual way, but in an ego
+network the ego is tied to everyone, so every row of A.A fills up and the
+product has as many entries as there are pairs of friends. Instead each tie is
+pointed from the friend with fewer ties to the one with more (the "forward"
+order) and every triangle is found exactly once, from its first two ties in
+that order, by checking the tie that closes it. The ego, having the most ties,
+has no ties pointing away from it and costs next to nothing. The checks are
+done on NumPy arrays a block of ties at a time, so memory use stays bounded.
+The coefficients then come out of the counts for every node together, and the
+averages for groups of nodes are sums over the array rather than new counts.
+
+The coefficients are those of nx.clustering: self-loops are left out and a
+node with fewer than two friends has a coefficient of 0.
+
+Strong triadic closure is about the triangles through the ego: of the pairs of
+friends the ego has strong ties with, how many are friends themselves. That is
+the number of ties among the strong friends, which one pass over the arrays
+finds for every group of friends at once, so nothing is compared pair by pair.
+
+"""
+
+import numpy as np
+
+
+# About how many possible triangles are checked at once
+BLOCK = 4000000
+
+
+def _simple(adj):
+	""" The rows and columns of the ties in the network, less self-loops,
+	with the new indptr.
+	"""
+
+	nodes, indptr, indices = adj
+	n = len(nodes)
+	rows = np.repeat(np.arange(n), np.diff(indptr))
+	keep = rows != indices
+	rows, cols = rows[keep], indices[keep]
+	ptr = np.zeros(n+1, dtype=np.int64)
+	np.cumsum(np.bincount(rows, minlength=n), out=ptr[1:])
+	return rows, cols, ptr
+
+
+def triangles(adj):
+	""" The number of triangles each node is in, lined up with the nodes."""
+
+	nodes = adj[0]
+	n = len(nodes)
+	count = np.zeros(n, dtype=np.int64)
+	if n == 0:
+		return count
+	rows, cols, ptr = _simple(adj)
+
+	# each tie pointed from the end with fewer ties to the one with more
+	rank = np.empty(n, dtype=np.int64)
+	rank[np.lexsort((np.arange(n), np.diff(ptr)))] = np.arange(n)
+	forward = rank[rows] < rank[cols]
+	first, second = rows[forward], cols[forward]
+	out = np.zeros(n+1, dtype=np.int64)
+	np.cumsum(np.bincount(first, minlength=n), out=out[1:])
+	ties = first*n + second
+
+	# every tie first -> second followed by every tie second -> third
+	# makes a possible triangle, closed if first -> third is a tie
+	work = np.diff(out)[second]
+	ends = np.searchsorted(np.cumsum(work), np.arange(BLOCK, work.sum(), BLOCK))
+	start = 0
+	for stop in ends.tolist() + [len(ties)]:
+		stop = max(stop, start+1)
+		if stop > len(ties):
+			break
+		steps = work[start:stop]
+		total = steps.sum()
+		if total:
+			a = np.repeat(first[start:stop], steps)
+			b = np.repeat(second[start:stop], steps)
+			place = (np.arange(total) - np.repeat(np.cumsum(steps) - steps, steps)
+				+ np.repeat(out[second[start:stop]], steps))
+			c = second[place]
+			wanted = a*n + c
+			found = np.minimum(np.searchsorted(ties, wanted), len(ties)-1)
+			closed = ties[found] == wanted
+			for corner in (a, b, c):
+				count += np.bincount(corner[closed], minlength=n)
+		start = stop
+	return count
+
+
+def coefficients(adj, counts=None):
+	""" The clustering coefficient of each node, lined up with the
+	nodes. counts are the triangle counts, if they have already been
+	worked out.
+	"""
+
+	if counts is None:
+		counts = triangles(adj)
+	rows, cols, ptr = _simple(adj)
+	degree = np.diff(ptr).astype(float)
+	pairs = degree*(degree-1)
+	out = np.zeros(len(counts))
+	some = counts > 0
+	out[some] = 2.*counts[some]/pairs[some]
+	return out
+
+
+def group_averages(values, groups, count):
+	""" The average of values over each of count groups, groups giving
+	the group of each value (or -1 to leave it out). Groups with no values
+	get NaN.
+	"""
+
+	groups = np.asarray(groups, dtype=np.int64)
+	keep = groups >= 0
+	total = np.bincount(groups[keep], weights=values[keep], minlength=count)
+	size = np.bincount(groups[keep], minlength=count)
+	out = np.empty(count)
+	out[:] = np.nan
+	out[size > 0] = total[size > 0]/size[size > 0]
+	return out
+
+
+def strong_closure(adj, strong, groups=None, count=1):
+	""" Strong triadic closure around the ego. strong marks the nodes
+	the ego has strong ties with (lined up with the nodes). Pairs of
+	them are only counted if they are in the same group, groups giving
+	the group of each node (-1 for none, everyone in group 0 if it isn't
+	given) out of count groups. Returns (pairs, closed), arrays with the
+	number of ordered pairs of strong friends in each group and how many
+	of them are tied to each other.
+	"""
+
+	rows, cols, ptr = _simple(adj)
+	n = len(adj[0])
+	if groups is None:
+		groups = np.zeros(n, dtype=np.int64)
+	groups = np.where(np.asarray(strong, dtype=bool),
+		np.asarray(groups, dtype=np.int64), -1)
+	size = np.bincount(groups[groups >= 0], minlength=count)
+	# the arrays hold each tie both ways, so each tied pair comes up
+	# in both orders
+	first = groups[rows]
+	inside = (first >= 0) & (first == groups[cols])
+	return size*(size-1), np.bincount(first[inside], minlength=count)
@@ -0,0 +1,155 @@
+""" Fetching friends from the Graph API a piece at a time
+
+Getting a user's friends means one request for the friend list, then one for
+each friend's profile and one for each friend's mutual friends: hundreds of
+requests, each waiting on the network. Made one after another, a single failure
+(an expired token, a dropped connection) used to lose everything fetched so far.
+
+The Crawler here asks for the profiles fifty at a time (the Graph API takes a
+list of IDs), makes the requests from a small pool of threads, so several
+are waiting on the network at once, and writes what it has fetched to a
+checkpoint file as it goes. Running it again after a failure picks up where it
+left off, only asking for what it doesn't have yet. A friend whose request fails
+is noted and skipped; running again tries them again.
+
+The checkpoint is a JSON file:
+
+	{"friends": [ID, ...],
+	 "profiles": {"ID": {...profile...}, ...},
+	 "mutuals": {"ID": [ID, ...], ...}}
+
+"""
+
+import json
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+
+class Crawler(object):
+	""" Fetches friends, profiles and mutual friends through a
+	facebook.GraphAPI (graph), keeping them in the checkpoint file.
+	workers is how many requests are made at once, and profiles are
+	fetched batch_size to a request.
+	"""
+
+	def __init__(self, graph, checkpoint="crawl_checkpoint.json", workers=8,
+		save_every=25, batch_size=50):
+		self.graph = graph
+		self.checkpoint = checkpoint
+		self.workers = workers
+		self.save_every = save_every
+		self.batch_size = batch_size
+		# the IDs whose last request failed, with the error, by kind
+		self.failed = {}
+		self.data = {"friends": None, "profiles": {}, "mutuals": {}}
+		if os.path.exists(checkpoint):
+			saved = open(checkpoint, "r")
+			try:
+				self.data.update(json.load(saved))
+			finally:
+				saved.close()
+
+	def save(self):
+		""" Writes everything fetched so far to the checkpoint. The
+		file is written under another name and then renamed, so a crash
+		part way through leaves the last checkpoint whole.
+		"""
+
+		temporary = self.checkpoint + ".part"
+		out = open(temporary, "w")
+		try:
+			json.dump(self.data, out)
+		finally:
+			out.close()
+		if os.name == "nt" and os.path.exists(self.checkpoint):
+			os.remove(self.checkpoint)
+		os.rename(temporary, self.checkpoint)
+
+	def remove(self):
+		""" Deletes the checkpoint, once everything is fetched and
+		safely stored elsewhere.
+		"""
+
+		if os.path.exists(self.checkpoint):
+			os.remove(self.checkpoint)
+
+	def friends(self):
+		""" The IDs of the user's friends, fetched the first time. """
+
+		if self.data["friends"] is None:
+			found = self.graph.iter_connections("me", "friends")
+			self.data["friends"] = [str(person["id"]) for person in found]
+			self.save()
+		return list(self.data["friends"])
+
+	def profiles(self, ids, progress=None):
+		""" {ID: profile} for each of ids, fetched batch_size at a time
+		(see facebook.GraphAPI.fetch_objects).
+		"""
+
+		return self._crawl("profiles", ids, lambda batch:
+			self.graph.fetch_objects(batch, self.batch_size), progress,
+			self.batch_size)
+
+	def mutual_friends(self, ids, progress=None):
+		""" {ID: [IDs of their mutual friends with the user]} for each of
+		ids.
+		"""
+
+		def fetch(batch):
+			found = self.graph.iter_connections(batch[0], "mutualfriends")
+			return {batch[0]: [str(person["id"]) for person in found]}, {}
+		return self._crawl("mutuals", ids, fetch, progress)
+
+	def _crawl(self, kind, ids, fetch, progress=None, batch_size=1):
+		""" Fetches whatever of ids isn't in the checkpoint already, in
+		batches of batch_size with workers requests at a time, saving as
+		it goes. fetch(batch) returns ({ID: result}, {ID: error}).
+		progress(done, total) is called after each batch. Returns {ID:
+		result} for the ids that have been fetched (now or before).
+		"""
+
+		ids = [str(id) for id in ids]
+		store = self.data[kind]
+		todo = [id for id in ids if id not in store]
+		batches = [todo[i:i+batch_size] for i in range(0, len(todo), batch_size)]
+		failed = self.failed[kind] = {}
+		done = len(ids) - len(todo)
+		if progress is not None:
+			progress(done, len(ids))
+
+		def attempt(batch):
+			try:
+				return batch, fetch(batch), None
+			except Exception as error:
+				return batch, None, error
+
+		if batches:
+			pool = ThreadPool(min(self.workers, len(batches)))
+			unsaved = 0
+			last_save = time.time()
+			try:
+				for batch, result, error in pool.imap_unordered(attempt, batches):
+					done += len(batch)
+					if error is not None:
+						for id in batch:
+							failed[id] = error
+					else:
+						found, errors = result
+						store.update(found)
+						failed.update(errors)
+						unsaved += len(found)
+					if unsaved >= self.save_every or (unsaved and
+						time.time() - last_save > 5):
+						self.save()
+						unsaved = 0
+						last_save = time.time()
+					if progress is not None:
+						progress(done, len(ids))
+			finally:
+				pool.terminate()
+				pool.join()
+				self.save()
+
+		return dict((id, store[id]) for id in ids if id in store)
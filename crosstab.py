@@ -0,0 +1,137 @@
+""" Counting friends by their attributes
+
+The breakdowns in the labs used to go through the friends one at a time,
+looking each one's value up and counting it into a dictionary, once for every
+question asked. Here the values of each attribute are turned into integer codes
+for all the friends at once (categorical attributes already are codes in the
+FriendStore) and the friends are counted by any number of attributes together
+with NumPy, so a breakdown of a hundred thousand friends by a few dozen
+attributes takes milliseconds.
+
+Friends missing a value are counted together under MISSING rather than left
+out, so the counts always add up to the number of friends.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+import friend_store as fs
+
+
+class _Missing(object):
+	""" The value counted for friends who don't have one. """
+
+	def __repr__(self):
+		return "missing"
+
+	__str__ = __repr__
+
+MISSING = _Missing()
+
+# Codes for combinations of values are squeezed back down once they get
+# this big, so that any number of attributes can be counted together
+_LARGEST = 2**40
+
+
+def codes(store, attribute):
+	""" Returns (codes, values): a code for every friend (lined up with
+	store.ids) and the value each code stands for, MISSING last.
+	"""
+
+	if attribute not in store.attributes:
+		raise KeyError(attribute)
+	kind = store._kinds[attribute]
+	if kind == "mutuals":
+		raise ValueError(str(attribute)+" can't be counted by value")
+	if kind == "category":
+		found, values = store.codes(attribute)
+		found = np.where(found < 0, len(values), found).astype(np.int64)
+		return found, list(values) + [MISSING]
+
+	# numbered in the order first seen, then the values that count as
+	# missing (NaN, blanks) are moved to the end
+	found, values = pd.factorize(store.column(attribute))
+	missing = np.array([fs.is_missing(value) for value in values] + [True],
+		dtype=bool)
+	renumber = np.cumsum(~missing) - 1
+	renumber[missing] = (~missing).sum()
+	found = renumber[found].astype(np.int64)
+	return found, [value for value, gone in zip(values, missing) if not gone] \
+		+ [MISSING]
+
+
+def _combine(columns, sizes):
+	""" Numbers the combinations of codes that come up. Returns (which,
+	first): the number of every friend's combination and, for each
+	combination, the first friend with it.
+	"""
+
+	key = np.zeros(len(columns[0]) if columns else 0, dtype=np.int64)
+	span = 1
+	for column, size in zip(columns, sizes):
+		if span*size >= _LARGEST:
+			found, key = np.unique(key, return_inverse=True)
+			span = len(found)
+		key = key*size + column
+		span *= size
+	found, first, which = np.unique(key, return_index=True,
+		return_inverse=True)
+	return which, first
+
+
+def crosstab(store, attributes, share=False, within=None):
+	""" Counts the friends in store by the values of attributes (a name
+	or a list of them). Returns a pandas Series of the counts, indexed by
+	the values of the attributes (by every combination of values that
+	comes up, for more than one). Values come in the order they were
+	first seen, with MISSING last.
+
+	If share is set, the counts are divided by the number of friends, or
+	if within names some of the attributes, by the number of friends with
+	the same values of those.
+	"""
+
+	if isinstance(attributes, basestring):
+		attributes = [attributes]
+	attributes = list(attributes)
+	columns = []
+	levels = []
+	for attribute in attributes:
+		found, values = codes(store, attribute)
+		columns.append(found)
+		levels.append(values)
+	sizes = [len(values) for values in levels]
+
+	which, first = _combine(columns, sizes)
+	counts = np.bincount(which, minlength=len(first)).astype(float if share
+		else np.int64)
+	cells = [column[first] for column in columns]
+	order = np.lexsort(cells[::-1]) if cells else np.arange(0)
+	counts = counts[order]
+	cells = [column[order] for column in cells]
+
+	if share:
+		if within:
+			if isinstance(within, basestring):
+				within = [within]
+			picked = [cells[attributes.index(a)] for a in within]
+			groups = _combine(picked, [sizes[attributes.index(a)]
+				for a in within])[0]
+			totals = np.bincount(groups, weights=counts)[groups]
+		else:
+			totals = np.empty(len(counts))
+			totals[:] = counts.sum()
+		counts = counts / np.maximum(totals, 1)
+
+	labels = []
+	for values, column in zip(levels, cells):
+		lookup = np.empty(len(values), dtype=object)
+		for code, value in enumerate(values):
+			lookup[code] = value
+		labels.append(lookup[column])
+	if len(attributes) == 1:
+		index = pd.Index(labels[0], name=attributes[0], dtype=object)
+	else:
+		index = pd.MultiIndex.from_arrays(labels, names=attributes)
+	return pd.Series(counts, index=index)
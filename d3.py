@@ -0,0 +1,147 @@
+""" Writing networks out for the D3 pages
+
+The visualizations read the network as two JavaScript lists, the nodes (with a
+color, an id, a name, a size and the text shown when the mouse is over them)
+and the links between them. Rather than build the lists up as one big string,
+the functions here write one node or link at a time straight to the file, so
+memory use doesn't grow with the network, and every piece of text goes through
+the json encoder so names with quotes, backslashes or accents come out right.
+
+"""
+
+import cgi
+import json
+import math
+
+
+_encode = json.JSONEncoder().encode
+
+# Colors for groups of friends (D3's category10)
+PALETTE = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b",
+	"#e377c2", "#7f7f7f", "#bcbd22", "#17becf"]
+
+
+def text(value):
+	""" Makes value readable by the json encoder: byte strings are
+	decoded (UTF-8, or Latin-1 if they aren't UTF-8) and anything else
+	that isn't text is written the way str writes it.
+	"""
+
+	if isinstance(value, unicode):
+		return value
+	if isinstance(value, str):
+		try:
+			return value.decode("utf-8")
+		except UnicodeDecodeError:
+			return value.decode("latin-1")
+	return unicode(str(value))
+
+
+def quote(value):
+	""" value as a JSON string that is also safe inside a <script>."""
+
+	return _encode(text(value)).replace("</", "<\\/")
+
+
+def html(value):
+	""" value as text for the tooltips, which are shown as HTML."""
+
+	return cgi.escape(text(value))
+
+
+def node(color, id, name, value, desc=None, position=None, radius=None):
+	""" The JSON for one node. position is where the node goes, as
+	fractions (x, y) of the width and height of the page, and radius its
+	size in pixels if it isn't the usual 10.
+	"""
+
+	out = ("{\"color\":" + quote(color) + ",\"id\":" + quote(id)
+		+ ",\"name\":" + quote(name) + ",\"value\":" + str(int(value)))
+	if desc is not None:
+		out += ",\"desc\":" + quote(desc)
+	if position is not None:
+		out += ",\"fx\":%.4f,\"fy\":%.4f" % tuple(position)
+	if radius is not None:
+		out += ",\"r\":%.1f" % radius
+	return out + "}"
+
+
+def _tie(value):
+	""" A tie strength or weight as JSON, with 0 for missing ones."""
+
+	try:
+		if value == -1 or math.isnan(value):
+			return "0"
+	except TypeError:
+		return "0"
+	return str(value)
+
+
+def link(source, target, n1, n2, strong=0, weight=None, width=None):
+	""" The JSON for one link between the nodes numbered source and
+	target. n1 and n2 are their names, already put through quote (a
+	network has far more links than names, so each name is only quoted
+	once). strong (and weight, if given) are 0 unless they are known.
+	width is the thickness of the line in pixels if it isn't the usual.
+	"""
+
+	out = ("{\"source\":" + str(int(source)) + ", \"target\":"
+		+ str(int(target)) + ", \"n1\":" + n1 + ", \"n2\":" + n2
+		+ ",\"strong\":" + _tie(strong))
+	if weight is not None:
+		out += ",\"weight\":" + _tie(weight)
+	if width is not None:
+		out += ",\"width\":%.1f" % width
+	return out + "}"
+
+
+def write_list(out, items):
+	""" Writes the JSON for each of items to out, separated by commas,
+	one to a line.
+	"""
+
+	first = True
+	for item in items:
+		if first:
+			out.write("\n")
+			first = False
+		else:
+			out.write(",\n")
+		out.write(item)
+
+
+def write_page(file_name, template, nodes, links):
+	""" Copies the template page to file_name, filling in the nodes and
+	links lists (each an iterable of JSON objects from node and link).
+	"""
+
+	base_file = open(template, "r")
+	my_file = open(file_name, "w")
+	try:
+		for line in base_file:
+			my_file.write(line)
+			if "var nodes=[" in line:
+				write_list(my_file, nodes)
+				my_file.write("];\n")
+			if "var links=[" in line:
+				write_list(my_file, links)
+				my_file.write("];\n")
+	finally:
+		my_file.close()
+		base_file.close()
+
+
+def write_json(file_name, nodes, links):
+	""" Writes the nodes and links as a JSON file with a "nodes" and a
+	"links" list.
+	"""
+
+	my_file = open(file_name, "w")
+	try:
+		my_file.write("{\"nodes\":[")
+		write_list(my_file, nodes)
+		my_file.write("],\n\"links\":[")
+		write_list(my_file, links)
+		my_file.write("]}\n")
+	finally:
+		my_file.close()
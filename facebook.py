@@ -35,8 +35,16 @@ usage of this module might look like this:
 
 import cgi
 import hashlib
+import httplib
+import random
+import socket
+import sqlite3
+import threading
 import time
 import urllib
+import urlparse
+import zlib
+from multiprocessing.pool import ThreadPool
 
 # Find a JSON parser
 try:
@@ -52,6 +60,200 @@ except ImportError:
         _parse_json = lambda s: simplejson.loads(s)
 
 
+GRAPH_URL = "https://graph.facebook.com/"
+
+# How many objects fetch_objects asks for in each request
+BATCH_SIZE = 50
+
+# The error codes the Graph API answers with when too many requests are made
+RATE_LIMIT_CODES = (4, 17, 32, 613)
+
+
+class ConnectionPool(object):
+    """Keeps connections to one server open between requests.
+
+    Opening a connection to graph.facebook.com takes a TLS handshake, which
+    can take longer than the request itself. The pool keeps up to size
+    connections open once their requests are done and hands them out again,
+    so a crawl making thousands of requests only makes a handful of
+    connections. It can be shared between threads; each connection is used
+    by one request at a time. A size of 0 closes every connection after its
+    request.
+    """
+    def __init__(self, url, size=8, timeout=30, gzip=True):
+        parts = urlparse.urlsplit(url)
+        if parts.scheme == "https":
+            self.connection_class = httplib.HTTPSConnection
+        else:
+            self.connection_class = httplib.HTTPConnection
+        self.host = parts.netloc
+        self.size = size
+        self.timeout = timeout
+        self.gzip = gzip
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def request(self, method, path, body=None, headers=None):
+        """Makes the request and returns (status, body), the body
+        decompressed if the server gzipped it.
+
+        A connection that has been sitting in the pool may have been closed
+        by the server in the meantime; if one fails the request is tried
+        once more on a new connection. A request other than a GET (a POST,
+        say, which mustn't be made twice) is only tried again if it failed
+        before it was sent, as otherwise the server may have acted on it.
+        """
+        headers = dict(headers or {})
+        if self.gzip:
+            headers["Accept-Encoding"] = "gzip"
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is not None:
+            sent = False
+            try:
+                connection.request(method, path, body, headers)
+                sent = True
+                return self._answer(connection)
+            except (httplib.HTTPException, socket.error):
+                connection.close()
+                if sent and method != "GET":
+                    raise
+        connection = self.connection_class(self.host, timeout=self.timeout)
+        try:
+            connection.request(method, path, body, headers)
+            return self._answer(connection)
+        except:
+            connection.close()
+            raise
+
+    def _answer(self, connection):
+        response = connection.getresponse()
+        data = response.read()
+        if response.getheader("content-encoding", "").lower() == "gzip":
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+        return response.status, data
+
+    def _release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """Closes the connections in the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class ResponseCache(object):
+    """Keeps Graph API answers in an SQLite file, so asking again doesn't
+    go over the network.
+
+    Answers are kept by path and arguments, leaving out the access token
+    (so a new token still finds the answers fetched with the old one; keep
+    one file for each user). An answer older than ttl seconds is fetched
+    again, and once the answers kept take more than max_size bytes the ones
+    least recently used are dropped. hits, misses and evictions count what
+    the cache has done since it was opened. It can be shared between
+    threads.
+
+       graph = facebook.GraphAPI(access_token,
+                                 cache=facebook.ResponseCache("cache.sqlite"))
+    """
+    def __init__(self, path="graph_cache.sqlite", ttl=24 * 60 * 60,
+                 max_size=100 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # losing the last few answers in a power cut only means fetching
+        # them again, so there's no need to wait for the disk
+        self._db.execute("PRAGMA synchronous = OFF")
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT "
+                         "PRIMARY KEY, body BLOB, stored REAL, used REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_used "
+                         "ON responses (used)")
+        self._db.commit()
+        # sizes in bytes, whether the body was kept as a BLOB or (by
+        # earlier versions) as TEXT
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(LENGTH(CAST(body AS BLOB))), 0) "
+            "FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(path, args):
+        """The key an answer is kept under."""
+        args = sorted((k, v) for k, v in args.items() if k != "access_token")
+        return path + "?" + urllib.urlencode(args)
+
+    def get(self, key):
+        """The answer kept under key, or None if there isn't a fresh one."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT body, stored FROM responses "
+                                   "WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET used = ? WHERE key = ?",
+                             (now, key))
+            self._db.commit()
+            self.hits += 1
+            return str(row[0])
+
+    def put(self, key, body):
+        """Keeps body, an answer (the bytes as they came), under key."""
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT LENGTH(CAST(body AS BLOB)) "
+                                   "FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+            if old is not None:
+                self._size -= old[0]
+            # kept as a BLOB, as answers can hold UTF-8 (accented names)
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES "
+                             "(?, ?, ?, ?)",
+                             (key, sqlite3.Binary(body), now, now))
+            self._size += len(body)
+            while self._size > self.max_size:
+                rows = self._db.execute(
+                    "SELECT key, LENGTH(CAST(body AS BLOB)) FROM responses "
+                    "WHERE key != ? ORDER BY used LIMIT 100",
+                    (key,)).fetchall()
+                if not rows:
+                    break
+                for old_key, size in rows:
+                    self._db.execute("DELETE FROM responses WHERE key = ?",
+                                     (old_key,))
+                    self._size -= size
+                    self.evictions += 1
+                    if self._size <= self.max_size:
+                        break
+            self._db.commit()
+
+    def clear(self):
+        """Drops every answer kept."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
 class GraphAPI(object):
     """A client for the Facebook Graph API.
 
@@ -79,9 +281,20 @@ class GraphAPI(object):
     If you are using the JavaScript SDK, you can use the
     get_user_from_cookie() method below to get the OAuth access token
     for the active user from the cookie saved by the SDK.
+
+    url is where the Graph API is; it can point at a local stand-in
+    server for testing. Requests go through a ConnectionPool keeping up
+    to pool_size connections open, with timeout seconds to wait for an
+    answer and gzipped answers if gzip is set. If cache (a ResponseCache)
+    is given, the answers to GET requests are kept in it and asking again
+    gets the kept answer.
     """
-    def __init__(self, access_token=None):
+    def __init__(self, access_token=None, url=GRAPH_URL, pool_size=8,
+                 timeout=30, gzip=True, cache=None):
         self.access_token = access_token
+        self.url = url
+        self.pool = ConnectionPool(url, pool_size, timeout, gzip)
+        self.cache = cache
 
     def get_object(self, id, **args):
         """Fetchs the given object from the graph."""
@@ -96,10 +309,68 @@ class GraphAPI(object):
         args["ids"] = ",".join(ids)
         return self.request("", args)
 
+    def fetch_objects(self, ids, batch_size=BATCH_SIZE, **args):
+        """Fetches all of the given objects, batch_size at a time.
+
+        Unlike get_objects, a bad ID doesn't spoil the rest: a batch
+        that fails is split in half and each half tried again, down to
+        the IDs that fail on their own. We return two maps from ID, one
+        to the objects fetched and one to the GraphAPIError for each ID
+        that couldn't be.
+        """
+        ids = [str(id) for id in ids]
+        objects = {}
+        errors = {}
+        for start in range(0, len(ids), batch_size):
+            self._fetch_batch(ids[start:start + batch_size], args, objects,
+                              errors)
+        return objects, errors
+
+    def _fetch_batch(self, ids, args, objects, errors):
+        try:
+            found = self.get_objects(ids, **dict(args))
+        except GraphAPIError, e:
+            if len(ids) == 1:
+                errors[ids[0]] = e
+            else:
+                half = len(ids) // 2
+                self._fetch_batch(ids[:half], args, objects, errors)
+                self._fetch_batch(ids[half:], args, objects, errors)
+            return
+        for id in ids:
+            if id in found:
+                objects[id] = found[id]
+            else:
+                errors[id] = GraphAPIError("GraphMethodException",
+                                           "No object returned for " + id)
+
     def get_connections(self, id, connection_name, **args):
         """Fetchs the connections for given object."""
         return self.request(id + "/" + connection_name, args)
 
+    def iter_connections(self, id, connection_name, prefetch=True, **args):
+        """Goes through all of the connections for given object.
+
+        get_connections only returns the first page of a long list of
+        connections. This yields the connections one at a time, following
+        the paging links from page to page, with only the page being gone
+        through (and the next one) held at once. If prefetch is set, each
+        next page is fetched while the one before it is being gone through.
+        """
+        path = id + "/" + connection_name
+        page = self.request(path, args)
+        while True:
+            next = page.get("paging", {}).get("next")
+            following = None
+            if next and page.get("data"):
+                args = dict(urlparse.parse_qsl(urlparse.urlsplit(next).query))
+                following = _Later(prefetch, self.request, path, args)
+            for item in page.get("data", []):
+                yield item
+            if following is None:
+                return
+            page = following.get()
+
     def put_object(self, parent_object, connection_name, **data):
         """Writes the given object to the graph, connected to the given parent.
 
@@ -162,28 +433,184 @@ class GraphAPI(object):
         we send a POST request to the given path with the given arguments.
         """
         if not args: args = {}
+        key = None
+        if self.cache is not None and post_args is None:
+            key = self.cache.key(path, args)
+            body = self.cache.get(key)
+            if body is not None:
+                return _parse_json(body)
         if self.access_token:
             if post_args is not None:
                 post_args["access_token"] = self.access_token
             else:
                 args["access_token"] = self.access_token
-        post_data = None if post_args is None else urllib.urlencode(post_args)
-        file = urllib.urlopen("https://graph.facebook.com/" + path + "?" +
-                              urllib.urlencode(args), post_data)
-        try:
-            response = _parse_json(file.read())
-        finally:
-            file.close()
+        path = urlparse.urlsplit(self.url).path + path + "?" + \
+            urllib.urlencode(args)
+        if post_args is None:
+            status, body = self.pool.request("GET", path)
+        else:
+            status, body = self.pool.request(
+                "POST", path, urllib.urlencode(post_args),
+                {"Content-Type": "application/x-www-form-urlencoded"})
+        response = _parse_json(body)
         if response.get("error"):
             raise GraphAPIError(response["error"]["type"],
-                                response["error"]["message"])
+                                response["error"]["message"],
+                                response["error"].get("code"))
+        if key is not None:
+            self.cache.put(key, body)
         return response
 
 
+class _Later(object):
+    """Calls function(*args), in another thread straight away if start is
+    set or else when get() is called. get() returns what it returned (or
+    raises what it raised)."""
+    def __init__(self, start, function, *args):
+        self._call = (function, args)
+        self._result = None
+        self._error = None
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        function, args = self._call
+        try:
+            self._result = function(*args)
+        except Exception, e:
+            self._error = e
+
+    def get(self):
+        if self._thread is None:
+            self._run()
+        else:
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class AsyncGraphAPI(object):
+    """A Graph API client that doesn't wait for its answers.
+
+    The methods are those of GraphAPI, but each returns straight away with a
+    result whose get() waits for the answer (or raises the GraphAPIError),
+    so many requests can be waiting on the network at once:
+
+       graph = facebook.AsyncGraphAPI(access_token, limit=32)
+       pending = [graph.get_connections(id, "mutualfriends") for id in ids]
+       mutuals = [result.get() for result in pending]
+
+    At most limit requests are made at once, from a pool of threads. When
+    the Graph API says too many requests are being made, every request
+    waits before trying again (twice as long each time a request is turned
+    away again, up to retries times) and only half as many are made at once
+    from then on, going back up by about one for each round of requests
+    that get through.
+    """
+    def __init__(self, access_token=None, url=GRAPH_URL, limit=32,
+                 timeout=30, gzip=True, retries=5, backoff=1., cache=None):
+        self.graph = GraphAPI(access_token, url, limit, timeout, gzip, cache)
+        self.limit = limit
+        self.retries = retries
+        self.backoff = backoff
+        self._workers = ThreadPool(limit)
+        self._ready = threading.Condition()
+        # how many requests may be made at once, how many are being
+        # made and when requests can start again after being turned away
+        self._allowed = float(limit)
+        self._active = 0
+        self._resume = 0.
+
+    def get_object(self, id, **args):
+        """Fetchs the given object from the graph."""
+        return self._submit(self.graph.get_object, id, **args)
+
+    def get_objects(self, ids, **args):
+        """Fetchs all of the given object from the graph."""
+        return self._submit(self.graph.get_objects, ids, **args)
+
+    def get_connections(self, id, connection_name, **args):
+        """Fetchs the connections for given object."""
+        return self._submit(self.graph.get_connections, id, connection_name,
+                            **args)
+
+    def put_object(self, parent_object, connection_name, **data):
+        """Writes the given object to the graph (see GraphAPI.put_object)."""
+        return self._submit(self.graph.put_object, parent_object,
+                            connection_name, **data)
+
+    def request(self, path, args=None, post_args=None):
+        """Fetches the given path in the Graph API."""
+        return self._submit(self.graph.request, path, args, post_args)
+
+    def close(self):
+        """Waits for the requests already made, then closes the threads
+        and connections.
+        """
+        self._workers.close()
+        self._workers.join()
+        self.graph.pool.close()
+
+    def _submit(self, method, *args, **kwargs):
+        return self._workers.apply_async(self._call, (method, args, kwargs))
+
+    def _call(self, method, args, kwargs):
+        attempt = 0
+        while True:
+            self._start()
+            succeeded = limited = False
+            try:
+                result = method(*args, **kwargs)
+                succeeded = True
+                return result
+            except GraphAPIError, e:
+                limited = e.code in RATE_LIMIT_CODES
+                if not limited or attempt >= self.retries:
+                    raise
+            finally:
+                self._finish(succeeded, limited, attempt)
+            attempt += 1
+
+    def _start(self):
+        with self._ready:
+            while True:
+                wait = self._resume - time.time()
+                if wait > 0:
+                    self._ready.wait(wait)
+                elif self._active >= int(self._allowed):
+                    self._ready.wait()
+                else:
+                    break
+            self._active += 1
+
+    def _finish(self, succeeded, limited, attempt):
+        with self._ready:
+            self._active -= 1
+            if limited:
+                now = time.time()
+                # requests turned away together only halve it once
+                if self._resume <= now:
+                    self._allowed = max(1., self._allowed / 2)
+                # a little at random, so the waiting requests don't all
+                # come back at the same moment
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+                self._resume = max(self._resume, now + delay)
+            elif succeeded:
+                self._allowed = min(float(self.limit),
+                                    self._allowed + 1. / self._allowed)
+            # other failures say nothing about how many requests to make
+            self._ready.notify_all()
+
+
 class GraphAPIError(Exception):
-    def __init__(self, type, message):
+    def __init__(self, type, message, code=None):
         Exception.__init__(self, message)
         self.type = type
+        self.code = code
 
 
 def get_user_from_cookie(cookies, app_id, app_secret):
@@ -0,0 +1,826 @@
+""" Friend storage for the Social Dynamics package
+
+The labs used to keep the friend database as a Pandas DataFrame turned on its
+side: one row per attribute and one column per friend. Every lookup was a column
+fetch followed by a label lookup and every new friend reallocated the whole frame.
+
+This module keeps one row per friend instead. Each attribute lives in its own
+typed NumPy array (integer codes for categorical attributes like gender or
+"known from", floats for tie strength and a compressed sparse row layout for the
+mutual friend lists) so that adding, looking up and scanning friends stays
+linear in the size of the network.
+
+A FriendStore still answers the old style of lookup, so code like
+friend_db[some_id]["known from"] keeps working. It also keeps an index from
+names to IDs so finding a friend by name doesn't mean reading every name.
+
+"""
+
+import bisect
+import csv
+import numpy as np
+import pandas as pd
+
+
+# Attributes that only take a handful of values are stored as integer codes.
+# The value is the type the raw data are coerced to before coding.
+CATEGORICAL = {"gender": str, "race": int, "known from": int, "strong tie": int}
+
+# Attributes stored as floating point numbers
+FLOATS = ("tie strength",)
+
+# The attribute holding each friend's list of mutual friends
+MUTUALS = "mutuals"
+
+# The attribute friends are looked up by
+NAME = "name"
+
+NAN = float("nan")
+
+
+def is_missing(value):
+	""" Returns True for the values the labs treat as "not coded yet"."""
+
+	if value is None:
+		return True
+	try:
+		if value != value: # funky NaN check
+			return True
+	except ValueError:
+		return False
+	return isinstance(value, basestring) and value.strip() in ("", "nan")
+
+
+def _name_key(value):
+	""" The key a name is indexed under, or None for a missing name."""
+
+	if is_missing(value):
+		return None
+	if isinstance(value, basestring):
+		return value
+	return str(value)
+
+
+def parse_id_list(value):
+	""" Turns a mutual friends entry into an array of IDs. Saved files
+	hold these as strings like "[1, 2, 3]"; anything that isn't a
+	bracketed list (NaN, or the ego's "-1") means no mutual friends.
+	"""
+
+	if isinstance(value, np.ndarray):
+		return value.astype(np.int64)
+	if isinstance(value, basestring):
+		value = value.strip()
+		if not value.startswith("["):
+			return np.empty(0, dtype=np.int64)
+		return np.array([int(j) for j in value[1:-1].split(",") if j.strip()],
+			dtype=np.int64)
+	if is_missing(value):
+		return np.empty(0, dtype=np.int64)
+	return np.array([int(j) for j in value], dtype=np.int64)
+
+
+def parse_id_lists(values):
+	""" Decodes a whole column of mutual friend entries at once. Returns
+	(indptr, indices) arrays in compressed sparse row layout, so friend
+	n's mutual friends are indices[indptr[n]:indptr[n+1]].
+	"""
+
+	text = pd.Series(np.asarray(values, dtype=object))
+	n = len(text)
+	indptr = np.zeros(n+1, dtype=np.int64)
+	if n == 0:
+		return indptr, np.empty(0, dtype=np.int64)
+
+	strings = text.map(lambda v: isinstance(v, basestring)).values.astype(bool)
+	if not (strings | text.isnull().values).all():
+		# already decoded lists; nothing to vectorize
+		lists = [parse_id_list(v) for v in text]
+		np.cumsum([len(l) for l in lists], out=indptr[1:])
+		return indptr, np.concatenate(lists).astype(np.int64)
+
+	body = text[strings].str.strip()
+	body = body[body.str.startswith("[").values].str[1:-1].str.strip()
+	body = body[(body != "").values]
+	counts = np.zeros(n, dtype=np.int64)
+	counts[body.index.values] = body.str.count(",").values + 1
+	np.cumsum(counts, out=indptr[1:])
+
+	if len(body) == 0:
+		return indptr, np.empty(0, dtype=np.int64)
+	indices = np.fromstring(",".join(body.tolist()), dtype=np.int64, sep=",")
+	if len(indices) != indptr[-1]:
+		# something like a trailing comma; decode those lists one by one
+		lists = [parse_id_list(v) for v in text]
+		np.cumsum([len(l) for l in lists], out=indptr[1:])
+		indices = np.concatenate(lists).astype(np.int64)
+	return indptr, indices
+
+
+def read_friend_csv(path):
+	""" Reads a saved *_friend_data.csv file (attributes as rows, one
+	column per friend) into a FriendStore in a single pass. Each line
+	of the file is one attribute, so it becomes one column as is.
+	"""
+
+	# a single mutual friends entry can be longer than csv's default limit
+	csv.field_size_limit(2**31-1)
+
+	data = open(path, "rb")
+	try:
+		reader = csv.reader(data)
+		header = next(reader)
+		rows = [row for row in reader if row]
+	finally:
+		data.close()
+
+	# Files written by Pandas start the header with an empty cell for
+	# the attribute names; some older files leave it out.
+	width = max([len(row)-1 for row in rows] + [0])
+	if len(header) > width:
+		header = header[1:]
+	ids = np.array(header).astype(np.int64)
+
+	columns = {}
+	attributes = []
+	for row in rows:
+		values = row[1:] + [""]*(len(ids)-len(row)+1)
+		attributes.append(row[0])
+		columns[row[0]] = values
+	return FriendStore.from_columns(ids, columns, attributes)
+
+
+def _coerce(kind, value):
+	""" Converts a raw value to the type stored for a categorical
+	attribute. Values that won't convert are kept as they are.
+	"""
+
+	if is_missing(value):
+		return NAN
+	try:
+		if kind is int:
+			value = float(value)
+			if value != value:
+				return NAN
+			return int(value)
+		return kind(value)
+	except (TypeError, ValueError):
+		return value
+
+
+class FriendRecord(object):
+	""" A view of one friend's row in a FriendStore. It behaves like the
+	Pandas Series the labs used to hand back, so record["name"] reads
+	a value and record["strong tie"] = 1 writes one straight into
+	the store.
+	"""
+
+	def __init__(self, store, id):
+		self.store = store
+		self.name = id
+
+	def __getitem__(self, attribute):
+		return self.store.get_value(self.name, attribute)
+
+	def __setitem__(self, attribute, value):
+		self.store.set_value(self.name, attribute, value)
+
+	def __contains__(self, attribute):
+		return attribute in self.store.attributes
+
+	def __iter__(self):
+		return iter(self.store.attributes)
+
+	def __len__(self):
+		return len(self.store.attributes)
+
+	def keys(self):
+		return list(self.store.attributes)
+
+	def items(self):
+		return [(attr, self[attr]) for attr in self.store.attributes]
+
+	def get(self, attribute, default=None):
+		if attribute in self.store.attributes:
+			return self[attribute]
+		return default
+
+	def __repr__(self):
+		return "FriendRecord(%r, %r)" % (self.name, dict(self.items()))
+
+
+class FriendStore(object):
+	""" Row-per-friend storage for the friend database. Rows are kept
+	in the order friends were added. Removing a friend only marks the
+	row as gone; the arrays are compacted the next time a whole column
+	is asked for.
+	"""
+
+	def __init__(self, attributes=None):
+
+		self.attributes = []
+		self._kinds = {}
+		self._columns = {}
+		self._categories = {}
+		self._category_codes = {}
+
+		self._size = 0
+		self._capacity = 0
+		self._ids = np.empty(0, dtype=np.int64)
+		self._alive = np.empty(0, dtype=bool)
+		self._dead = 0
+		self._pos = {}
+
+		# mutual friends: a CSR block for compacted rows plus the
+		# lists of rows added or edited since the last compaction
+		self._mut_ptr = np.zeros(1, dtype=np.int64)
+		self._mut_idx = np.empty(0, dtype=np.int64)
+		self._mut_edits = {}
+
+		# name -> IDs and lower case name -> IDs, built when first
+		# needed and then kept up to date (see find)
+		self._names = None
+		self._folded = None
+		self._prefixes = None
+
+		for attribute in attributes or []:
+			self.add_attribute(attribute)
+
+
+	## Building and editing
+
+	def add_attribute(self, attribute):
+		""" Adds an (empty) attribute for every friend."""
+
+		if attribute in self._kinds:
+			return
+		if attribute == MUTUALS:
+			kind = "mutuals"
+		elif attribute in CATEGORICAL:
+			kind = "category"
+			self._categories[attribute] = []
+			self._category_codes[attribute] = {}
+			self._columns[attribute] = np.full(self._capacity, -1, dtype=np.int32)
+		elif attribute in FLOATS:
+			kind = "float"
+			self._columns[attribute] = np.full(self._capacity, np.nan)
+		else:
+			kind = "object"
+			column = np.empty(self._capacity, dtype=object)
+			column.fill(NAN)
+			self._columns[attribute] = column
+		self._kinds[attribute] = kind
+		self.attributes.append(attribute)
+
+
+	def rename_attribute(self, old, new):
+		""" Renames an attribute, e.g. when one of the spare "undefined"
+		rows is put to use. The stored values are kept.
+		"""
+
+		if old not in self._kinds:
+			raise KeyError(old)
+		if new in self._kinds:
+			raise ValueError("attribute "+str(new)+" already exists")
+		self.attributes[self.attributes.index(old)] = new
+		if NAME in (old, new):
+			self._names = None
+		self._kinds[new] = self._kinds.pop(old)
+		for table in (self._columns, self._categories, self._category_codes):
+			if old in table:
+				table[new] = table.pop(old)
+
+
+	def _reserve(self, count):
+		""" Makes room for count rows, growing the arrays geometrically
+		so that appending friends one at a time stays linear overall.
+		"""
+
+		if count <= self._capacity:
+			return
+		capacity = max(count, 2*self._capacity, 16)
+		grow = capacity - self._capacity
+
+		self._ids = np.concatenate([self._ids, np.zeros(grow, dtype=np.int64)])
+		self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+		for attribute, column in self._columns.items():
+			kind = self._kinds[attribute]
+			if kind == "category":
+				extra = np.full(grow, -1, dtype=np.int32)
+			elif kind == "float":
+				extra = np.full(grow, np.nan)
+			else:
+				extra = np.empty(grow, dtype=object)
+				extra.fill(NAN)
+			self._columns[attribute] = np.concatenate([column, extra])
+		self._capacity = capacity
+
+
+	def _code(self, attribute, value):
+		""" Returns the integer code for a categorical value, adding a
+		new category if it hasn't been seen before.
+		"""
+
+		value = _coerce(CATEGORICAL[attribute], value)
+		if is_missing(value):
+			return -1
+		codes = self._category_codes[attribute]
+		try:
+			return codes[value]
+		except KeyError:
+			codes[value] = len(self._categories[attribute])
+			self._categories[attribute].append(value)
+			return codes[value]
+
+
+	def _row(self, id):
+		try:
+			return self._pos[int(id)]
+		except (KeyError, TypeError, ValueError):
+			raise KeyError(id)
+
+
+	def __setitem__(self, id, values):
+		""" Adds a friend (or overwrites an existing one) from a dictionary
+		of attribute values. Like the old DataFrame, only attributes the
+		database already has are kept; an empty store takes its
+		attributes from the first friend added.
+		"""
+
+		id = int(id)
+		if not self.attributes:
+			for attribute in values.keys():
+				self.add_attribute(attribute)
+
+		if id in self._pos:
+			row = self._pos[id]
+		else:
+			self._reserve(self._size+1)
+			row = self._size
+			self._ids[row] = id
+			self._alive[row] = True
+			self._pos[id] = row
+			self._size += 1
+
+		for attribute in self.attributes:
+			try:
+				value = values[attribute]
+			except KeyError:
+				value = NAN
+			self._set(row, attribute, value)
+
+
+	def __delitem__(self, id):
+		row = self._row(id)
+		if self._names is not None and NAME in self._kinds:
+			self._index_name(int(id), self._columns[NAME][row], remove=True)
+		del self._pos[int(id)]
+		self._alive[row] = False
+		self._mut_edits.pop(row, None)
+		self._dead += 1
+
+
+	def get_value(self, id, attribute):
+		""" Returns one attribute of one friend."""
+
+		row = self._row(id)
+		kind = self._kinds[attribute]
+		if kind == "category":
+			code = self._columns[attribute][row]
+			if code < 0:
+				return NAN
+			return self._categories[attribute][code]
+		elif kind == "float":
+			value = float(self._columns[attribute][row])
+			if value != value:
+				return NAN
+			return value
+		elif kind == "mutuals":
+			return self._mutuals_of(row).tolist()
+		return self._columns[attribute][row]
+
+
+	def set_value(self, id, attribute, value):
+		""" Sets one attribute of one friend, adding the attribute
+		if need be.
+		"""
+
+		row = self._row(id)
+		if attribute not in self._kinds:
+			self.add_attribute(attribute)
+		self._set(row, attribute, value)
+
+
+	def _set(self, row, attribute, value):
+		kind = self._kinds[attribute]
+		if kind == "category":
+			self._columns[attribute][row] = self._code(attribute, value)
+		elif kind == "float":
+			try:
+				self._columns[attribute][row] = float(value)
+			except (TypeError, ValueError):
+				self._columns[attribute][row] = np.nan
+		elif kind == "mutuals":
+			self._mut_edits[row] = parse_id_list(value)
+		else:
+			if attribute == NAME and self._names is not None:
+				id = int(self._ids[row])
+				self._index_name(id, self._columns[attribute][row], remove=True)
+				self._index_name(id, value)
+			self._columns[attribute][row] = value
+
+
+	def _mutuals_of(self, row):
+		try:
+			return self._mut_edits[row]
+		except KeyError:
+			if row+1 < len(self._mut_ptr):
+				return self._mut_idx[self._mut_ptr[row]:self._mut_ptr[row+1]]
+			return np.empty(0, dtype=np.int64)
+
+
+	def compact(self):
+		""" Drops the rows of removed friends and folds edited mutual
+		friend lists back into the CSR arrays.
+		"""
+
+		if self._dead == 0 and not self._mut_edits and len(self._mut_ptr) == self._size+1:
+			return
+
+		keep = np.flatnonzero(self._alive[:self._size])
+		lengths = np.zeros(len(keep), dtype=np.int64)
+		pieces = []
+		for n, row in enumerate(keep):
+			mutuals = self._mutuals_of(row)
+			lengths[n] = len(mutuals)
+			pieces.append(mutuals)
+		ptr = np.zeros(len(keep)+1, dtype=np.int64)
+		np.cumsum(lengths, out=ptr[1:])
+		if pieces:
+			idx = np.concatenate(pieces).astype(np.int64)
+		else:
+			idx = np.empty(0, dtype=np.int64)
+
+		if self._dead:
+			self._ids = self._ids[keep]
+			self._alive = np.ones(len(keep), dtype=bool)
+			for attribute in self._columns:
+				self._columns[attribute] = self._columns[attribute][keep]
+			self._size = self._capacity = len(keep)
+			self._pos = dict(zip(self._ids.tolist(), range(len(keep))))
+			self._dead = 0
+
+		self._mut_ptr = ptr
+		self._mut_idx = idx
+		self._mut_edits = {}
+
+
+	## Looking things up
+
+	def __len__(self):
+		return self._size - self._dead
+
+	def __contains__(self, id):
+		try:
+			return int(id) in self._pos
+		except (TypeError, ValueError):
+			return False
+
+	def __iter__(self):
+		return iter(self.ids.tolist())
+
+	def __getitem__(self, id):
+		self._row(id)
+		return FriendRecord(self, int(id))
+
+
+	@property
+	def ids(self):
+		""" The friend IDs, in the order friends were added."""
+		if self._dead:
+			return self._ids[:self._size][self._alive[:self._size]]
+		return self._ids[:self._size]
+
+
+	def column(self, attribute):
+		""" Returns a whole attribute as an array lined up with ids.
+		Categorical attributes are decoded back to their values, missing
+		values are NaN and mutuals come back as lists.
+		"""
+
+		self.compact()
+		kind = self._kinds[attribute]
+		if kind == "mutuals":
+			column = np.empty(self._size, dtype=object)
+			for row in range(self._size):
+				column[row] = self._mutuals_of(row).tolist()
+			return column
+		if kind == "category":
+			lookup = np.empty(len(self._categories[attribute])+1, dtype=object)
+			lookup[:-1] = self._categories[attribute]
+			lookup[-1] = NAN
+			return lookup[self._columns[attribute][:self._size]]
+		return self._columns[attribute][:self._size]
+
+
+	def codes(self, attribute):
+		""" Returns (codes, categories) for a categorical attribute,
+		with -1 marking missing values.
+		"""
+
+		self.compact()
+		return (self._columns[attribute][:self._size],
+			list(self._categories[attribute]))
+
+
+	def mutuals_csr(self):
+		""" Returns the (indptr, indices) arrays holding every friend's
+		mutual friends, lined up with ids.
+		"""
+
+		self.compact()
+		return self._mut_ptr, self._mut_idx
+
+
+	## Looking friends up by name
+
+	def find(self, name, exact=True):
+		""" Returns the IDs of the friends called name, in the order they
+		were added. With exact=False case doesn't matter and, if nobody's
+		name matches in full, it returns everyone whose name starts with
+		name instead (sorted by name).
+		"""
+
+		self._index_names()
+		key = _name_key(name)
+		if key is None:
+			return []
+		if exact:
+			return list(self._names.get(key, []))
+
+		folded = key.lower()
+		if folded in self._folded:
+			return list(self._folded[folded])
+		if self._prefixes is None:
+			pairs = sorted((k, id) for k, ids in self._folded.items() for id in ids)
+			self._prefixes = ([k for k, id in pairs], [id for k, id in pairs])
+		keys, ids = self._prefixes
+		found = []
+		n = bisect.bisect_left(keys, folded)
+		while n < len(keys) and keys[n].startswith(folded):
+			found.append(ids[n])
+			n += 1
+		return found
+
+
+	def _index_names(self):
+		""" Builds the name lookup tables the first time they're needed.
+		After that _set and __delitem__ keep them up to date.
+		"""
+
+		if self._names is not None:
+			return
+		self._names = {}
+		self._folded = {}
+		self._prefixes = None
+		if NAME in self._kinds:
+			for id, value in zip(self.ids.tolist(), self.column(NAME)):
+				self._index_name(id, value)
+
+
+	def _index_name(self, id, value, remove=False):
+		key = _name_key(value)
+		if key is None:
+			return
+		for table, k in ((self._names, key), (self._folded, key.lower())):
+			if remove:
+				ids = table.get(k, [])
+				if id in ids:
+					ids.remove(id)
+				if not ids:
+					table.pop(k, None)
+			else:
+				table.setdefault(k, []).append(id)
+		self._prefixes = None
+
+
+	## Conversions
+
+	@classmethod
+	def from_columns(cls, ids, columns, attributes=None):
+		""" Builds a store in one go from an array of friend IDs and a
+		dictionary of raw values (e.g. strings read from a saved file)
+		lined up with them. Each attribute is converted with a single
+		vectorized pass instead of friend by friend.
+		"""
+
+		if attributes is None:
+			attributes = sorted(columns.keys())
+		store = cls(attributes)
+		ids = np.asarray(ids, dtype=np.int64)
+		n = len(ids)
+		store._reserve(n)
+		store._ids[:n] = ids
+		store._alive[:n] = True
+		store._size = n
+		store._pos = dict(zip(ids.tolist(), range(n)))
+		if len(store._pos) != n:
+			raise ValueError("friend IDs must be unique")
+
+		for attribute in attributes:
+			store._load_column(attribute, columns[attribute])
+		return store
+
+
+	@classmethod
+	def from_frame(cls, frame):
+		""" Builds a store from a DataFrame in the lab's saved layout:
+		attributes as rows and one column per friend.
+		"""
+
+		attributes = list(frame.index.values)
+		columns = dict((attr, frame.loc[attr].values) for attr in attributes)
+		ids = [int(i) for i in frame.columns.values]
+		return cls.from_columns(ids, columns, attributes)
+
+
+	def _load_column(self, attribute, values):
+		""" Fills a whole attribute for a freshly built store."""
+
+		kind = self._kinds[attribute]
+		n = self._size
+		raw = pd.Series(np.asarray(values, dtype=object))
+		if len(raw) != n:
+			raise ValueError("attribute "+str(attribute)+" has "
+				+str(len(raw))+" values for "+str(n)+" friends")
+		missing = raw.isnull().values | raw.isin(["", "nan"]).values
+
+		if kind == "mutuals":
+			self._mut_ptr, self._mut_idx = parse_id_lists(values)
+			self._mut_edits = {}
+
+		elif kind == "float":
+			self._columns[attribute][:n] = pd.to_numeric(raw,
+				errors="coerce").values.astype(float)
+
+		elif kind == "object":
+			if attribute == NAME:
+				self._names = None
+			column = raw.values.copy()
+			column[missing] = NAN
+			self._columns[attribute][:n] = column
+
+		else:
+			present = np.flatnonzero(~missing)
+			if CATEGORICAL[attribute] is int:
+				numbers = pd.to_numeric(raw[present], errors="coerce").values
+				clean = (numbers == numbers).all()
+				if clean:
+					codes, uniques = pd.factorize(numbers.astype(np.int64))
+					uniques = [int(u) for u in uniques]
+			else:
+				codes, uniques = pd.factorize(raw.values[present])
+				uniques = [CATEGORICAL[attribute](u) for u in uniques]
+				clean = len(set(uniques)) == len(uniques)
+
+			if clean:
+				self._columns[attribute][:n] = -1
+				self._columns[attribute][present] = codes
+				self._categories[attribute] = uniques
+				self._category_codes[attribute] = dict(zip(uniques,
+					range(len(uniques))))
+			else:
+				# values that won't convert; code them one at a time
+				for row in range(n):
+					self._set(row, attribute, values[row])
+
+
+	def mutual_edges(self):
+		""" Returns (sources, targets) arrays of friend IDs with one entry
+		per pair of friends who are friends with each other. Mutual friends
+		who aren't in the store are left out and each pair is listed once.
+		"""
+
+		indptr, indices = self.mutuals_csr()
+		ids = self.ids
+		n = len(ids)
+		if n == 0 or len(indices) == 0:
+			return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+		order = np.argsort(ids, kind="mergesort")
+		sorted_ids = ids[order]
+		where = np.searchsorted(sorted_ids, indices)
+		where[where == n] = 0
+		found = sorted_ids[where] == indices
+
+		source = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))[found]
+		target = order[where[found]].astype(np.int64)
+		pairs = np.unique(np.minimum(source, target)*n + np.maximum(source, target))
+		return ids[pairs // n], ids[pairs % n]
+
+
+	def to_frame(self):
+		""" Returns the friends as a DataFrame in the lab's saved layout
+		(attributes as rows, one column per friend).
+		"""
+
+		data = dict((attribute, self.column(attribute)) for attribute in self.attributes)
+		frame = pd.DataFrame(data, index=self.ids, columns=self.attributes)
+		return frame.T
+
+
+	def to_csv(self, path):
+		""" Writes the friends out in the same format save() always has."""
+		self.to_frame().to_csv(path)
+
+
+	def to_arrays(self):
+		""" Returns (arrays, header) for saving a snapshot: a dictionary
+		of NumPy arrays (IDs, the mutual friend lists and the category code
+		and float columns) and a dictionary of plain values (attribute names,
+		category values and the columns holding anything else) that can be
+		written as JSON.
+		"""
+
+		self.compact()
+		n = self._size
+		arrays = {"ids": self._ids[:n], "mutuals_indptr": self._mut_ptr,
+			"mutuals_indices": self._mut_idx}
+		header = {"attributes": to_json(self.attributes), "categories": {},
+			"objects": {}}
+		for number, attribute in enumerate(self.attributes):
+			kind = self._kinds[attribute]
+			if kind == "category":
+				arrays["column"+str(number)] = self._columns[attribute][:n]
+				header["categories"][str(number)] = to_json(self._categories[attribute])
+			elif kind == "float":
+				arrays["column"+str(number)] = self._columns[attribute][:n]
+			elif kind == "object":
+				header["objects"][str(number)] = to_json(self._columns[attribute][:n].tolist())
+		return arrays, header
+
+
+	@classmethod
+	def from_arrays(cls, arrays, header):
+		""" Rebuilds a store from what to_arrays returned (once the header
+		has been through JSON and back, see to_json).
+		"""
+
+		store = cls(from_json(header["attributes"]))
+		ids = np.asarray(arrays["ids"], dtype=np.int64)
+		n = len(ids)
+		store._reserve(n)
+		store._ids[:n] = ids
+		store._alive[:n] = True
+		store._size = n
+		store._pos = dict(zip(ids.tolist(), range(n)))
+		store._mut_ptr = np.asarray(arrays["mutuals_indptr"], dtype=np.int64)
+		store._mut_idx = np.asarray(arrays["mutuals_indices"], dtype=np.int64)
+
+		for number, attribute in enumerate(store.attributes):
+			kind = store._kinds[attribute]
+			if kind == "category":
+				store._columns[attribute][:n] = arrays["column"+str(number)]
+				values = from_json(header["categories"][str(number)])
+				store._categories[attribute] = values
+				store._category_codes[attribute] = dict(zip(values, range(len(values))))
+			elif kind == "float":
+				store._columns[attribute][:n] = arrays["column"+str(number)]
+			elif kind == "object":
+				column = store._columns[attribute]
+				for row, value in enumerate(header["objects"][str(number)]):
+					column[row] = from_json(value)
+		return store
+
+
+def to_json(value):
+	""" Gets one of the values the labs store ready for JSON without
+	losing anything: byte strings go in as the characters with the same
+	codes (so any bytes survive) and unicode strings are marked as such.
+	"""
+
+	if isinstance(value, str):
+		return value.decode("latin-1")
+	if isinstance(value, unicode):
+		return {"unicode": value}
+	if isinstance(value, (list, tuple)):
+		return [to_json(v) for v in value]
+	if isinstance(value, np.generic):
+		return value.item()
+	return value
+
+
+def from_json(value):
+	""" Undoes to_json once the value has been through JSON, with
+	missing values coming back as the shared NAN.
+	"""
+
+	if isinstance(value, unicode):
+		return value.encode("latin-1")
+	if isinstance(value, dict) and "unicode" in value:
+		return value["unicode"]
+	if isinstance(value, float) and value != value:
+		return NAN
+	if isinstance(value, list):
+		return [from_json(v) for v in value]
+	return value
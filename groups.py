@@ -0,0 +1,110 @@
+""" Summing networks up a group at a time
+
+Drawing every friend and every tie stops being useful (or possible, for the
+browser) well before a network reaches a hundred thousand friends. Instead the
+friends can be put into groups, by where they are known from or by the
+communities the ties themselves make, and each group drawn as one node with the
+ties between groups added up.
+
+communities finds groups of friends who are tied mostly to each other by label
+propagation: everyone starts in a group of their own and then, again and again,
+joins the group most of their friends are in, until nobody moves. It is done for
+every friend at once on the arrays from the centrality module.
+
+summarise adds up the sizes of the groups and the ties inside and between them,
+keeping the biggest groups and putting the rest together as "All other groups"
+so that the summary stays small however big the network is.
+
+"""
+
+import numpy as np
+
+
+OTHER = "All other groups"
+
+
+def communities(adj, max_iter=20, seed=None):
+	""" Label propagation over the network. Returns an array lined up
+	with the nodes of the community each is in, numbered from 0 for the
+	biggest.
+	"""
+
+	nodes, indptr, indices = adj
+	n = len(nodes)
+	if n == 0:
+		return np.zeros(0, dtype=np.int64)
+	rng = np.random.RandomState(seed)
+
+	# everyone counts their own group once too, which stops pairs of
+	# friends from swapping groups back and forth forever
+	rows = np.concatenate([np.repeat(np.arange(n), np.diff(indptr)),
+		np.arange(n)])
+	cols = np.concatenate([indices, np.arange(n)])
+	label = np.arange(n, dtype=np.int64)
+	for i in range(max_iter):
+		key, counts = np.unique(rows*n + label[cols], return_counts=True)
+		owner = key // n
+		# the most common group among each node's friends, ties broken
+		# at random
+		score = counts + rng.rand(len(counts))*.5
+		order = np.lexsort((score, owner))
+		last = np.append(owner[order][1:] != owner[order][:-1], True)
+		new = np.empty(n, dtype=np.int64)
+		new[owner[order][last]] = (key % n)[order][last]
+		if (new == label).all():
+			break
+		label = new
+
+	found, label, size = np.unique(label, return_inverse=True,
+		return_counts=True)
+	rank = np.empty(len(found), dtype=np.int64)
+	rank[np.argsort(-size, kind="mergesort")] = np.arange(len(found))
+	return rank[label]
+
+
+def summarise(adj, membership, max_groups=50):
+	""" Adds the network up by group. membership gives each node's
+	group (lined up with the nodes). Only the max_groups biggest groups
+	are kept, the rest going into one called OTHER.
+
+	Returns (groups, sizes, inside, between): the group names, how many
+	nodes and ties each has, and {(group, group): ties} for the ties
+	between groups, the groups numbered by their place in groups.
+	"""
+
+	nodes, indptr, indices = adj
+	number = {}
+	groups = []
+	which = np.empty(len(nodes), dtype=np.int64)
+	for i, name in enumerate(membership):
+		if name not in number:
+			number[name] = len(groups)
+			groups.append(name)
+		which[i] = number[name]
+
+	sizes = np.bincount(which, minlength=len(groups))
+	order = np.argsort(-sizes, kind="mergesort")
+	if len(groups) > max_groups:
+		keep = order[:max_groups]
+		groups = [groups[g] for g in keep] + [OTHER]
+		renumber = np.empty(len(order), dtype=np.int64)
+		renumber[:] = max_groups
+		renumber[keep] = np.arange(max_groups)
+	else:
+		groups = [groups[g] for g in order]
+		renumber = np.empty(len(order), dtype=np.int64)
+		renumber[order] = np.arange(len(order))
+	which = renumber[which]
+	sizes = np.bincount(which, minlength=len(groups))
+
+	# each tie once (the arrays have both directions)
+	rows = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+	once = rows <= indices
+	first, second = which[rows[once]], which[indices[once]]
+	inside = np.bincount(first[first == second], minlength=len(groups))
+	low = np.minimum(first, second)[first != second]
+	high = np.maximum(first, second)[first != second]
+	key, counts = np.unique(low*len(groups) + high, return_counts=True)
+	between = dict(((int(k // len(groups)), int(k % len(groups))), int(c))
+		for k, c in zip(key, counts))
+	return groups, sizes.tolist(), inside.tolist(), between
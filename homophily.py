@@ -0,0 +1,189 @@
+""" Homophily: how much friends are tied to friends like themselves
+
+associativity_by_attribute used to go through every friend's mutual friends
+one at a time, looking up the value of the attribute for each, once for every
+attribute asked about. Here the mutual friend lists are turned once into an edge
+table, two arrays holding the rows (in the FriendStore) at the two ends of every
+entry, and each attribute becomes an array of codes (see the crosstab module),
+so comparing the two ends of every tie is one NumPy operation. The same edge
+table serves every attribute.
+
+Besides each friend's share of mutual friends with the same value (the labs'
+associativity), there are three summaries of the ties between friends:
+
+- the mixing matrix, how many ties there are between friends with each pair of
+  values (each tie counted once each way, so it is symmetric)
+- Newman's assortativity coefficient, 1 when every tie is between friends with
+  the same value, 0 when ties ignore the attribute and negative when friends
+  with different values are tied more often than by chance
+- the E-I index (Krackhardt and Stern), the ties between friends with different
+  values less those between friends with the same value, over all the ties:
+  -1 when every tie is inside a group, 1 when none is
+
+Friends with no value count as a value of their own (MISSING) in the mixing
+matrix but never match anyone, and the assortativity and E-I index leave out
+the ties where either end is missing.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+import crosstab as ct
+import friend_store as fs
+
+
+def edges(store):
+	""" The edge table: (source, target) arrays of rows in store (lined
+	up with store.ids), one entry for each entry in each friend's mutual
+	friend list. Mutual friends who aren't in the store are left out.
+	"""
+
+	indptr, indices = store.mutuals_csr()
+	ids = store.ids
+	n = len(ids)
+	if n == 0 or len(indices) == 0:
+		return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+	order = np.argsort(ids, kind="mergesort")
+	sorted_ids = ids[order]
+	where = np.searchsorted(sorted_ids, indices)
+	where[where == n] = 0
+	found = sorted_ids[where] == indices
+	source = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))[found]
+	return source, order[where[found]].astype(np.int64)
+
+
+def _row(store, id):
+	""" The row of id in store, or None if it isn't there. """
+
+	if id is None:
+		return None
+	rows = np.flatnonzero(store.ids == int(id))
+	return int(rows[0]) if len(rows) else None
+
+
+def ties(store, table, ego=None):
+	""" The ties between friends as (first, second) arrays of rows, each
+	tie once whichever of the two lists the other. If ego (an ID) is given,
+	the ego's ties to everyone else are added.
+	"""
+
+	n = len(store.ids)
+	source, target = table
+	keep = source != target
+	pairs = np.unique(np.minimum(source, target)[keep]*n
+		+ np.maximum(source, target)[keep])
+	first, second = pairs // n, pairs % n
+	row = _row(store, ego)
+	if row is not None:
+		others = np.flatnonzero(np.arange(n) != row)
+		first = np.concatenate([first, np.repeat(row, len(others))])
+		second = np.concatenate([second, others])
+	return first, second
+
+
+def associativity(store, table, attribute, ego=None):
+	""" The labs' associativity: for each friend, the share of their
+	mutual friends (and the ego, if ego is given as an ID) with the same
+	value of attribute as theirs, 0 for friends with nobody to compare
+	with. Returns a pandas Series of the average for each value that comes
+	up, in the order the values were first seen (MISSING last).
+	"""
+
+	found, values = ct.codes(store, attribute)
+	missing = len(values) - 1
+	n = len(found)
+	source, target = table
+	same = (found[source] == found[target]) & (found[source] != missing)
+	hits = np.bincount(source, weights=same, minlength=n)
+	total = np.bincount(source, minlength=n).astype(float)
+	row = _row(store, ego)
+	if row is not None:
+		others = np.arange(n) != row
+		hits[others] += (found[others] == found[row]) & (found[row] != missing)
+		total[others] += 1
+	share = np.zeros(n)
+	some = total > 0
+	share[some] = hits[some]/total[some]
+
+	size = np.bincount(found, minlength=len(values))
+	sums = np.bincount(found, weights=share, minlength=len(values))
+	seen = np.flatnonzero(size)
+	index = pd.Index([values[v] for v in seen], name=attribute, dtype=object)
+	return pd.Series(sums[seen]/size[seen], index=index)
+
+
+def mixing(store, pairs, attribute):
+	""" The mixing matrix of attribute over the ties in pairs (from
+	ties): a pandas DataFrame with a row and a column for every value
+	that comes up (MISSING last), holding how many ties there are between
+	friends with the two values. Ties inside a group count twice on the
+	diagonal, once for each end.
+	"""
+
+	found, values = ct.codes(store, attribute)
+	k = len(values)
+	first, second = found[pairs[0]], found[pairs[1]]
+	counts = (np.bincount(first*k + second, minlength=k*k)
+		+ np.bincount(second*k + first, minlength=k*k)).reshape(k, k)
+	seen = np.flatnonzero(np.bincount(found, minlength=k))
+	index = pd.Index([values[v] for v in seen], name=attribute, dtype=object)
+	return pd.DataFrame(counts[np.ix_(seen, seen)], index=index,
+		columns=index)
+
+
+def _known(matrix):
+	""" The mixing matrix as an array, less the row and column for
+	MISSING.
+	"""
+
+	keep = [value is not ct.MISSING for value in matrix.index]
+	return matrix.values[np.ix_(keep, keep)].astype(float)
+
+
+def assortativity(matrix):
+	""" Newman's assortativity coefficient from a mixing matrix, NaN if
+	there are no ties or everyone has the same value.
+	"""
+
+	e = _known(matrix)
+	total = e.sum()
+	if total == 0:
+		return float("nan")
+	e /= total
+	expected = (e.sum(axis=0)*e.sum(axis=1)).sum()
+	if expected >= 1:
+		return float("nan")
+	return (np.trace(e) - expected)/(1 - expected)
+
+
+def ei_index(matrix):
+	""" The E-I index from a mixing matrix, NaN if there are no ties."""
+
+	e = _known(matrix)
+	total = e.sum()
+	if total == 0:
+		return float("nan")
+	return (total - 2*np.trace(e))/total
+
+
+def summary(store, attributes=None, ego=None):
+	""" The assortativity and E-I index of each of attributes (by
+	default the categorical ones), with the number of ties between
+	friends who both have a value, as a pandas DataFrame with a row for
+	each attribute. The ego's ties are counted if ego (an ID) is given.
+	"""
+
+	if attributes is None:
+		attributes = [a for a in store.attributes if a in fs.CATEGORICAL]
+	elif isinstance(attributes, basestring):
+		attributes = [attributes]
+	pairs = ties(store, edges(store), ego)
+	rows = []
+	for attribute in attributes:
+		matrix = mixing(store, pairs, attribute)
+		rows.append((assortativity(matrix), ei_index(matrix),
+			int(_known(matrix).sum()) // 2))
+	return pd.DataFrame(rows, index=pd.Index(attributes, name="attribute"),
+		columns=["assortativity", "E-I index", "ties"])
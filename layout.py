@@ -0,0 +1,180 @@
+""" Laying out networks before they are drawn
+
+The D3 pages normally place the nodes by running a force simulation in the
+browser, starting from random positions every time the page is opened. That is
+fine for a few hundred friends but takes minutes (or never settles) once there
+are thousands. This module works the positions out in Python instead, on the
+same arrays the centrality module uses, so the page can draw the nodes where
+they belong straight away.
+
+The layout starts from a spectral one (the nodes placed by the two slowest
+changing patterns of a random walk on the network, found by power iteration
+as Koren does it) and is then tidied up by a number of Fruchterman-Reingold
+steps: tied nodes pull together and every node pushes the others away. The
+pushing is worked out exactly for smaller networks; for large ones each node is
+pushed by the crowd in each square of a grid over the picture rather than by
+every other node.
+
+Given earlier positions (from an earlier drawing), the layout starts from
+those and only moves things a little, so redrawing a network that has changed
+a bit keeps its shape.
+
+"""
+
+import math
+
+import numpy as np
+
+import centrality as cn
+
+
+# Networks bigger than this are pushed apart a grid square at a time
+EXACT = 2000
+
+
+def _spectral(adj, rng, iterations=100):
+	""" Koren's degree-normalised spectral layout by power iteration.
+	Returns an (n, 2) array.
+	"""
+
+	nodes, indptr, indices = adj
+	n = len(nodes)
+	product = cn._product(adj)
+	degree = np.diff(indptr).astype(float)
+	degree[degree == 0] = 1.
+	found = [np.ones(n) / math.sqrt(n)]
+	for axis in range(2):
+		x = rng.rand(n) - .5
+		for i in range(iterations):
+			for u in found:
+				x -= np.dot(x, degree*u) / np.dot(u, degree*u) * u
+			x = .5 * (x + product(x) / degree)
+			norm = math.sqrt(np.dot(x, x))
+			if norm == 0:
+				break
+			x /= norm
+		found.append(x)
+	return np.column_stack(found[1:])
+
+
+def _fit(pos, margin=.02):
+	""" Scales and shifts positions to fill the unit square, less a margin."""
+
+	low = pos.min(axis=0)
+	span = pos.max(axis=0) - low
+	span[span == 0] = 1.
+	return margin + (1.-2*margin) * (pos - low) / span
+
+
+def _repulsion(pos, k):
+	""" Fruchterman-Reingold repulsion between every pair of nodes,
+	k^2/d away from each other, a block of nodes at a time.
+	"""
+
+	n = len(pos)
+	force = np.zeros_like(pos)
+	block = max(1, 1000000 // max(n, 1))
+	for start in range(0, n, block):
+		delta = pos[start:start+block, None, :] - pos[None, :, :]
+		distance2 = np.maximum((delta**2).sum(axis=2), 1e-9)
+		force[start:start+block] = (delta * (k*k/distance2)[:, :, None]).sum(axis=1)
+	return force
+
+
+def _grid_repulsion(pos, k, side):
+	""" Repulsion on the grid: each node is pushed by the crowds in the
+	other squares as if they were all at their centre of mass (worked
+	out once for each square rather than for each node), and away from
+	the centre of the crowd in its own square.
+	"""
+
+	low = pos.min(axis=0)
+	span = np.maximum(pos.max(axis=0) - low, 1e-9)
+	cell = np.minimum(((pos-low) / span * side).astype(int), side-1)
+	which = cell[:, 0]*side + cell[:, 1]
+	mass = np.bincount(which, minlength=side*side).astype(float)
+	full = np.flatnonzero(mass)
+	centre = np.column_stack([np.bincount(which, weights=pos[:, 0],
+		minlength=side*side)[full], np.bincount(which, weights=pos[:, 1],
+		minlength=side*side)[full]]) / mass[full][:, None]
+	mass = mass[full]
+
+	# the push on each square from all the others
+	delta = centre[:, None, :] - centre[None, :, :]
+	distance2 = np.maximum((delta**2).sum(axis=2), 1e-9)
+	field = (delta * (mass*k*k/distance2)[:, :, None]).sum(axis=1)
+
+	square = np.searchsorted(full, which)
+	delta = pos - centre[square]
+	distance2 = np.maximum((delta**2).sum(axis=1), k*k/100.)
+	return field[square] + delta * ((mass[square]-1)*k*k/distance2)[:, None]
+
+
+def _step(adj, pos, k, limit, side):
+	nodes, indptr, indices = adj
+	n = len(nodes)
+	if side:
+		force = _grid_repulsion(pos, k, side)
+	else:
+		force = _repulsion(pos, k)
+
+	# ties pull their ends together with d^2/k
+	rows = np.repeat(np.arange(n), np.diff(indptr))
+	delta = pos[rows] - pos[indices]
+	distance = np.sqrt((delta**2).sum(axis=1))
+	pull = delta * (distance/k)[:, None]
+	force[:, 0] -= np.bincount(rows, weights=pull[:, 0], minlength=n)
+	force[:, 1] -= np.bincount(rows, weights=pull[:, 1], minlength=n)
+
+	length = np.maximum(np.sqrt((force**2).sum(axis=1)), 1e-9)
+	return pos + force * (np.minimum(length, limit)/length)[:, None]
+
+
+def layout(adj, iterations=50, start=None, seed=None):
+	""" Positions for the nodes of the network, in the unit square.
+	start is an earlier {node: (x, y)} layout to begin from; nodes
+	missing from it are put among their neighbours. iterations is how
+	many Fruchterman-Reingold steps to take. Returns {node: (x, y)}.
+	"""
+
+	nodes, indptr, indices = adj
+	n = len(nodes)
+	if n == 0:
+		return {}
+	if n == 1:
+		return {nodes[0]: (.5, .5)}
+	rng = np.random.RandomState(seed)
+
+	known = np.zeros(n, dtype=bool)
+	pos = np.zeros((n, 2))
+	if start:
+		for i, node in enumerate(nodes):
+			if node in start:
+				known[i] = True
+				pos[i] = start[node]
+
+	if known.any():
+		# new nodes go to the middle of the neighbours already placed,
+		# or anywhere if none are
+		product = cn._product(adj)
+		placed = product(known.astype(float))
+		for axis in range(2):
+			total = product(np.where(known, pos[:, axis], 0.))
+			pos[:, axis] = np.where(known, pos[:, axis], np.where(placed > 0,
+				total/np.maximum(placed, 1), rng.rand(n)))
+		pos[~known] += (rng.rand((~known).sum(), 2) - .5) * .01
+		temperature = .02
+	else:
+		pos = _fit(_spectral(adj, rng) + (rng.rand(n, 2) - .5) * 1e-3)
+		temperature = .1
+
+	k = 1. / math.sqrt(n)
+	side = 0
+	if n > EXACT:
+		side = int(min(32, math.sqrt(n)/4))
+	for i in range(iterations):
+		limit = temperature * (1. - float(i)/iterations)
+		pos = _step(adj, pos, k, limit, side)
+
+	pos = _fit(pos)
+	return dict(zip(nodes, [tuple(p) for p in pos.tolist()]))
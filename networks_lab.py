@@ -17,6 +17,16 @@ import IPython as ip
 import math
 import urllib2
 import os
+import friend_store as fs
+import centrality as cn
+import snapshot as sn
+import d3
+import layout as ly
+import groups as gr
+import clustering as cl
+import crosstab as ct
+import homophily as hm
+import significance as sg
 
 
 
@@ -41,16 +51,29 @@ class Graph(object):
 		self.contexts_list = {}
 		self.defined_colors = []
 		self.me = False
-		self.old_positions=[]
+		# where draw_network last put each node, as {ID: (x, y)}
+		self.old_positions = {}
 		self.note = "<br><strong>Programming note:</strong><p>There are two lines of code above. The first could be run by itself, but the second will only work if the first has already run. This is because the first line creates an object named <code>network</code> and only once we've created it, can we \"call\" it's <em>method</em> named <code>load_data</code>. A method (or more generally a function) describes some action to be done. Here we ask the object to load data into itself by \"calling\" the appropriate method.</p><br><p>It's like we've made a box and now we ask the box to fill with water. The box can do all sorts of stuff, the specifications of which are contained in the module <code>netlab</code>. The module contains the blueprints for box objects (here something named <code>FBgraph</code>) and can make as many as you'd like. We just happened to name ours <code>network</code> but almost anything else would work. The process of naming an object is called assignment and in Python we do it with an equals sign; the first line can be read as \"Hey <code>netlab</code>, let's make a <code>Graph</code> object and name it <code>network</code>.\" Then when we use the name later, it gives us that unique object.</p><br><p>Once we've constructed the <code>network</code> object, we tell it to load the dataset named <code>\"example.\"</code> The word <code>\"example\"</code> here is called an <em>argument</em>. Most methods have arguments that specify some sort of details about the action to be taken. Sometimes an argument is required for the code to work (e.g. what is the name of the dataset I should load), in other instances they are optional. When they are optional, there is a default value described inside the method. If you want to change it, you have to name that argument and set its value equal to something. You can do this for required arguments too. For example, in the line above, the name of argument asking for the name of file to be loaded is <code>file_name</code> so the verbose way to write the same command is <code>network.load_data(file_name=\"example\")</code>. We'll make use of arguments later so if this concept doesn't make sense just yet, it should as you use them more.</p><br><p>Finally, you'll note that running this code returned the message <code>Data successfully loaded.</code> From a programming perspective, this is unnecessary and perhaps even annoying, but because the notebook's signal that it is done running code is so subtle (the text to the left of code box changes from <code>In [*]:</code> to <code>In [x]:</code> where x is the number of code snippnets run up to this point), I wanted to make it clearer. This lab uses messages like this to both tell you what is happening and give you the information you're asking for.</p><br><br>"
-		self.b_cent = {}
-		self.c_cent = {}
-		self.d_cent = {}
-		self.e_cent = {}
-		self.b_cent_w = {}
-		self.c_cent_w = {}
-		self.d_cent_w = {}
-		self.e_cent_w = {}
+		# Results worked out from the network (centralities and the
+		# like) are kept here until the network changes. See _cached.
+		self._version = 0
+		self._cache = {}
+		self._cache_key = None
+		# the last eigenvector centralities, to start the next ones from
+		self._eigenvector_start = {}
+		# how many processes share out the centrality work by default
+		self.workers = None
+
+	# The columns of centrality_report as {ID: value} dictionaries. Without
+	# the ego, the friends who are only tied to you get a -1 for each measure.
+	b_cent = property(lambda self: self._report(False)["betweenness"].to_dict())
+	c_cent = property(lambda self: self._report(False)["closeness"].to_dict())
+	d_cent = property(lambda self: self._report(False)["degree"].to_dict())
+	e_cent = property(lambda self: self._report(False)["eigenvector"].to_dict())
+	b_cent_w = property(lambda self: self._report(True)["betweenness"].to_dict())
+	c_cent_w = property(lambda self: self._report(True)["closeness"].to_dict())
+	d_cent_w = property(lambda self: self._report(True)["degree"].to_dict())
+	e_cent_w = property(lambda self: self._report(True)["eigenvector"].to_dict())
 
 	def random_sample(self,count=200):
 		""" Creating a random sampling of the whole network to make
@@ -58,11 +81,12 @@ class Graph(object):
 		can be undone is to reload your data from Facebook.
 		"""
  
-		total = len(list(self.friend_db.columns.values))
-		for sap in random.sample(list(self.friend_db.columns.values),(total-count)):
+		total = len(self.friend_db)
+		for sap in random.sample(list(self.friend_db),(total-count)):
 			if sap != self.my_ID:
 				del self.friend_db[int(sap)]
 				self.mynet.remove_node(int(sap))
+		self._touch()
 
 		print ("Your network now has a random subset of "
 			+str(count)+" nodes from your whole network")
@@ -89,183 +113,273 @@ class Graph(object):
 
 	def count_components(self, withme=False):
 		""" This method returns the number of components in
-		the network without the ego.It does this by removing 
-		the ego in a copy of the network."""
+		the network without the ego. Friends only tied to the ego
+		are components on their own."""
 
 		if withme:
 			print ("If you're in the network, it"
 				+" has to have a single component!")
 		else:
-			bu = nx.Graph()
-			bu.add_nodes_from(self.mynet.nodes())
-			bu.add_edges_from(self.mynet.edges())
-			bu.remove_node(self.my_ID)
+			alone = len(self.mynet) - len(self._adjacency(False)[0])
+			if self.my_ID in self.mynet:
+				alone -= 1
 			print ("Your network has "
-				+ str(nx.number_connected_components(bu)) 
+				+ str(cn.components(self._adjacency(False)) + alone)
 				+" components")
 
 	def density(self):
 		return round(nx.density(self.mynet),4)
 
 	def draw_network(self,file_name="Visualization.html",
-		colors=[], strong=False, weight=False, withme=False):
+		colors=[], strong=False, weight=False, withme=False,
+		layout=False, iterations=50, group=None, by="known from"):
 		""" This function writes the network to an html file 
 		so that users can explore the network move thoroughly.
+
+		With layout=True the positions of the nodes are worked out
+		here (taking iterations steps) instead of in the browser, so
+		even big networks show up straight away. The positions are
+		kept in old_positions and the next layout starts from them.
+
+		With group set, only the friends in that group are drawn. The
+		groups are the same as draw_groups makes with by (where friends
+		are known from, another attribute or "community").
 		"""
-		base_file = open("D3JS.html", "r")
-		my_file = open(file_name, "w")
-		for line in base_file:
-			my_file.write(line)
-			if "var nodes=[" in line:
-				if not withme:
-					strong=False
-					if colors == []:
-						colors = self.defined_colors
-						if colors != []:
-							backup_colors = {}
-							nodes = list(self.mynet.nodes())
-							for i in range(len(nodes)):
-								backup_colors[nodes[i]]=self.defined_colors[i]
-							index = list(self.mynet.nodes()
-								).index(self.my_ID)
-							self.defined_colors.pop(index)
-						else:
-							backup_colors = []
+		report = self._report(withme)
+		bs = report["betweenness"].to_dict()
+		cs = report["closeness"].to_dict()
+		ds = report["degree"].to_dict()
+		es = report["eigenvector"].to_dict()
+		# Without the ego, the ego and its ties are just skipped over
+		# rather than taken out of the network
+		if not withme:
+			strong = False
+		nodes = [i for i in self.mynet.nodes() if withme or i != self.my_ID]
+		if group is not None:
+			group = self._group_name(by, group)
+			adj, membership = self._membership(by, withme)
+			members = set(n for n, g in zip(adj[0], membership) if g == group)
+			nodes = [i for i in nodes if i in members]
+			if nodes == []:
+				print "Nobody is in the group "+str(group)
+				return
+
+		# This defaults the coloring scheme to what the user has
+		# previously defined (if anything) if no color
+		# argument is passed in
+		if colors == []:
+			if self.defined_colors != []:
+				color = dict(zip(self.mynet.nodes(), self.defined_colors))
+				colors = [color[i] for i in nodes]
+			else:
+				colors = []
+				for i in nodes:
+					if i == self.my_ID:
+						colors.append("blue")
 					else:
-						backup_colors = {}
-						nodes = list(self.mynet.nodes())
-						for i in range(len(nodes)):
-							backup_colors[nodes[i]] = self.defined_colors[i]
-						index = list(self.mynet.nodes()).index(self.my_ID)
-						self.defined_colors.pop(index)
-
-					backup_net = nx.Graph(self.mynet)
-					self.mynet.remove_node(self.my_ID)
-
-
-				# This defaults the coloring scheme to what the user has
-				# previously defined (if anything) if no color 
-				# argument is passed in
-				if colors == []:
-					colors = list(self.defined_colors)
-					if colors == []:
-						for i in self.mynet.nodes():
-							if i == self.my_ID:
-								colors.append("blue")   
-							else:
-								colors.append("aqua")
-
-
-				# A dictionary for renumbering the node ids
-				rewrite = {}
-				# also for the renumbering operation. 
-				count = 0
-				# We use the count of mutual friends as data 
-				mutuals = {}
-				# We use the member list from the network instead
-				# of the database because it colors nodes in the order 
-				# of this list and the imported color list is in that order
-				nodes = self.mynet.nodes()
-				if withme:
-					bs = self.b_cent_w
-					cs = self.c_cent_w
-					ds = self.d_cent_w
-					es = self.e_cent_w
+						colors.append("aqua")
+
+		# We use the member list from the network instead of the
+		# database because it colors nodes in the order of this list
+		# and the imported color list is in that order. The nodes are
+		# renumbered 0, 1, 2... in the same order.
+		rewrite = dict((i, count) for count, i in enumerate(nodes))
+
+		# the attributes are read a whole column at a time and looked
+		# up by each friend's row
+		row = dict((i, r) for r, i in enumerate(self.friend_db.ids.tolist()))
+		names = self.friend_db.column("name").tolist()
+		indptr = self.friend_db.mutuals_csr()[0]
+		mutuals = (indptr[1:] - indptr[:-1]).tolist()
+		extra = []
+		for attribute in ["known from", "gender", "race"]:
+			if attribute in self.friend_db.attributes:
+				extra.append((attribute, self.friend_db.column(attribute).tolist()))
+
+		def describe(r, i):
+			desc = "Name: " + d3.html(names[r])
+			for attribute, values in extra:
+				value = values[r]
+				if attribute == "known from":
+					desc += ("<br>Known from: "
+						+ d3.html(self.contexts_list.get(value, value)))
+				elif attribute == "gender":
+					desc += "<br>Gender: " + d3.html(value)
+				elif value == 1:
+					desc += "<br>Race: white"
 				else:
-					bs = self.b_cent
-					cs = self.c_cent
-					ds = self.d_cent
-					es = self.e_cent
-				# In both the loop for nodes and links, we do n-1
-				# first and the last one manually because of the
-				# the need to insert the right characters for
-				# the .json format.
-				giant_string = "\n"
-				for j in range(len(nodes)):
-					# i is the usual id number
-					i = nodes[j]  
-					# renumbering business
-					rewrite[i]=count 
-					# A Pandas series object is just like a
-					# python dictionary, but isn't...Cast it!
-					my_dct = dict(self.friend_db[int(i)]) 
-
-					mutuals[i]=len(my_dct["mutuals"])
-					if my_dct["race"] == 1:
-						race = "white"
-					else:
-						race = "nonwhite"
-					# The next 3 lines create the bulk of the text
-					giant_string += ("{\"color\":" + "\""
-						+str(colors[count])+ "\"" + ",\"id\":"+"\""
-						+str(rewrite[i]) + "\"" + ",\"name\":"+"\""
-						+str(my_dct["name"]) + "\"" +",\"value\":"
-						+str(mutuals[i]) + ", \"desc\":\"Name: "
-						+str(my_dct["name"]) + "<br>Known from: "
-						+str(self.contexts_list[my_dct["known from"]]) 
-						+ "<br>Gender: "+str(my_dct["gender"]) 
-						+ "<br>Race: "+str(race)
-						+ "<br>Betweenness Centrality: " + str(bs[i])
-						+ "<br>Closeness Centrality: " + str(cs[i])
-						+ "<br>Degree Centrality: " + str(ds[i])
-						+ "<br>Eigenvector Centrality: " + str(es[i])+"\""+"},\n")
-
-
-					count +=1
-
-				my_file.write(giant_string[:-2]+"];\n")
-
-			# Part 2: adding the edges       
-			if "var links=[" in line:
-
-				count = 0
-				edges = self.mynet.edges()
-
-				giant_string = "\n"
-				for i in range(len(edges)):
-					j = edges[i] # this is a tuple of source and target pairs
-					giant_string += ("{\"source\":"
-						+str(rewrite[j[0]])+", \"target\":"
-						+str(rewrite[j[1]])+", \"n1\":\""
-						+str(self.friend_db[j[0]]["name"])
-						+"\", \"n2\":\""
-						+str(self.friend_db[j[1]]["name"])+"\"")
-
-
-					if strong:
-						try:
-							strg = self.mynet[j[0]][j[1]]["strong"]
-							if not (strg==strg) or strg==-1:
-								giant_string +=",\"strong\":"+str(0)
-							else:
-								giant_string +=",\"strong\":"+str(strg)
-						except:
-							giant_string +=",\"strong\":"+str(0)
-					else:
-						giant_string +=",\"strong\":"+str(0)
+					desc += "<br>Race: nonwhite"
+			return (desc + "<br>Betweenness Centrality: " + str(bs[i])
+				+ "<br>Closeness Centrality: " + str(cs[i])
+				+ "<br>Degree Centrality: " + str(ds[i])
+				+ "<br>Eigenvector Centrality: " + str(es[i]))
+
+		positions = {}
+		if layout:
+			positions = self._layout(withme, iterations)
+
+		def node_list():
+			for count, i in enumerate(nodes):
+				r = row[i]
+				yield d3.node(colors[count], count, names[r], mutuals[r],
+					describe(r, i), positions.get(i))
+
+		def link_list():
+			quoted = dict((i, d3.quote(names[row[i]])) for i in nodes)
+			for u, v, data in self.mynet.edges_iter(nodes, data=True):
+				if u not in rewrite or v not in rewrite:
+					continue
+				yield d3.link(rewrite[u], rewrite[v], quoted[u], quoted[v],
+					data.get("strong", 0) if strong else 0)
+
+		d3.write_page(file_name, "D3JS.html", node_list(), link_list())
+
+
+	def _drawn_adjacency(self, withme):
+		""" The arrays for the network as draw_network shows it: like
+		_adjacency, but keeping the friends only tied to the ego.
+		"""
+		def compute():
+			adj = self._adjacency(True)
+			if not withme and self.my_ID in self.mynet:
+				adj = cn.without(adj, self.my_ID, untied=True)
+			return adj
+		return self._cached(("drawn adjacency", withme), compute)
+
+
+	def _layout(self, withme, iterations=50):
+		""" Lays out the network (without the ego unless withme) for
+		draw_network, starting from old_positions, and keeps the
+		result there.
+		"""
+		adj = self._drawn_adjacency(withme)
+		positions = ly.layout(adj, iterations, start=self.old_positions)
+		self.old_positions.update(positions)
+		return positions
+
+
+	def draw_groups(self, file_name="Groups.html", by="known from",
+		withme=False, max_groups=50):
+		""" Draws the network a group of friends at a time, each group
+		as one circle (bigger for bigger groups) and the ties between
+		groups as one line (thicker for more ties). The groups are by
+		where friends are known from, by another attribute or, with
+		by="community", the communities the ties make. Only the
+		max_groups biggest groups are shown, the rest together as
+		"All other groups", so the page stays small however big the
+		network is. Use draw_network with group set to see one group
+		in full.
+		"""
 
-					giant_string+="},\n"
+		adj, membership = self._membership(by, withme)
+		groups, sizes, inside, between = gr.summarise(adj, membership,
+			max_groups)
+		biggest = float(max(sizes))
+		most = float(max(between.values() + [1]))
+
+		def node_list():
+			for count, name in enumerate(groups):
+				size = sizes[count]
+				pairs = size*(size-1)/2.
+				desc = ("Group: " + d3.html(name)
+					+ "<br>Friends: " + str(size)
+					+ "<br>Ties inside: " + str(inside[count])
+					+ "<br>Density: " + str(round(inside[count]/pairs, 4)
+						if pairs else 0)
+					+ "<br>Ties to other groups: "
+					+ str(sum(t for g, t in between.items() if count in g)))
+				yield d3.node(d3.PALETTE[count % len(d3.PALETTE)], count, name,
+					size, desc, radius=5+25*math.sqrt(size/biggest))
+
+		def link_list():
+			for (a, b), ties in sorted(between.items()):
+				yield d3.link(a, b, d3.quote(groups[a]), d3.quote(groups[b]),
+					weight=ties, width=1+9*math.sqrt(ties/most))
+
+		d3.write_page(file_name, "D3JS.html", node_list(), link_list())
+		print ("Drew "+str(len(groups))+" groups of "+str(sum(sizes))
+			+" friends")
+
+
+	def _membership(self, by, withme):
+		""" The group of everyone draw_network would show, by an
+		attribute or by="community". Returns the arrays from
+		_drawn_adjacency and the group names lined up with them.
+		"""
+		adj = self._drawn_adjacency(withme)
+		if by == "community":
+			found = self._cached(("communities", withme),
+				lambda: gr.communities(adj, seed=0))
+			return adj, ["Community "+str(c+1) for c in found.tolist()]
+
+		row = dict((i, r) for r, i in enumerate(self.friend_db.ids.tolist()))
+		values = self.friend_db.column(by).tolist()
+		membership = []
+		for i in adj[0]:
+			value = values[row[i]]
+			if fs.is_missing(value):
+				membership.append("Unknown")
+			elif by == "known from":
+				membership.append(self.contexts_list.get(value, value))
+			else:
+				membership.append(value)
+		return adj, membership
 
-					count +=1
-				my_file.write(giant_string[:-2]+"];\n")
 
-		my_file.close()
-		base_file.close()
+	def _group_name(self, by, group):
+		""" Lets a group be given by its context number or community
+		number as well as its name.
+		"""
+		if by == "known from" and group in self.contexts_list:
+			return self.contexts_list[group]
+		if by == "community" and isinstance(group, (int, long)):
+			return "Community "+str(group)
+		return group
 
-		#restoring the full network
-		if not withme:
-			self.mynet = nx.Graph(backup_net)
-			if backup_colors == []:
-				self.defined_colors = []
-			else:
-				clrs = []
-				for i in self.mynet.nodes():
-					clrs.append(backup_colors[i])
-  				self.defined_colors = clrs
 
+	def load_data(self,file_name="1", workers=None):
+		""" This method loads existing data into a graph object. The
+		centralities are worked out when first asked for, sharing the
+		work between workers processes unless told otherwise.
+		"""
+
+		self.workers = workers
+
+		self._load_network(file_name)
 
-	def load_data(self,file_name="1"):
-		""" This method loads existing data into a graph object.
+		print "Data successfully loaded"
+
+
+	def save_snapshot(self, file_name=None):
+		""" Saves everything loaded (friends, network, contexts and
+		colors) as one binary file, file_name_snapshot.npz, which
+		load_snapshot reads back far quicker than load_data reads the
+		CSV files. The file name defaults to the graph's name.
+		"""
+
+		if file_name is None:
+			file_name = self.graph_name
+		sn.save("./"+str(file_name)+sn.SUFFIX, self.friend_db, self.mynet,
+			self.my_ID, self.contexts_list, self.defined_colors)
+		print "Snapshot saved"
+
+
+	def load_snapshot(self, file_name="1", workers=None):
+		""" Loads data saved with save_snapshot. Everything comes back
+		just as it was saved.
+		"""
+
+		(self.friend_db, self.mynet, self.my_ID, self.contexts_list,
+			self.defined_colors) = sn.load("./"+str(file_name)+sn.SUFFIX)
+		self.workers = workers
+		self._touch()
+		print "Data successfully loaded"
+
+
+	def _load_network(self, file_name):
+		""" Reads the saved files for a dataset and builds the network
+		from them. The friend data are read and converted a whole
+		attribute at a time and the ties go into the network in bulk.
 		"""
 
 		self.contexts_list = {}
@@ -290,94 +404,186 @@ class Graph(object):
 							self.contexts_list[int(j[0])] = j[1]
 			if data[0] == "defined_colors":
 				self.defined_colors = [i for i in data[1].split(",")]
+		other.close()
+
+		# loading in the database (saved with one column per friend)
+		self.friend_db = fs.read_friend_csv("./"+str(file_name)
+			+"_friend_data.csv")
+		ids = self.friend_db.ids.tolist()
+
+		# adding the mutual ties connections
+		sources, targets = self.friend_db.mutual_edges()
+		self.mynet.add_nodes_from(ids)
+		self.mynet.add_edges_from(zip(sources.tolist(), targets.tolist()),
+			strong=0)
+
+		# adding the ties to the ego. The ego's own entry has always
+		# given it a self-loop and the lab's figures include it.
+		strong = pd.to_numeric(pd.Series(self.friend_db.column("strong tie")),
+			errors="coerce").fillna(0).astype(int).tolist()
+		self.mynet.add_edges_from([(i, self.my_ID, {"strong": s})
+			for i, s in zip(ids, strong)])
+		self._touch()
+
+
+	def _touch(self):
+		""" Called by the methods that change the network so that the
+		results kept in the cache get worked out again.
+		"""
+		self._version += 1
 
 
-		# loading in the database          
-		self.friend_db = pd.read_csv("./"+str(file_name)
-			+"_friend_data.csv", header=0, index_col=0)    
-		new_names = []
-		for i in list(self.friend_db.columns.values):
-			new_names.append(int(i))
-			if self.my_ID != i:
-				# adding network ties
-				self.mynet.add_node(int(i))
-				self.mynet.add_edge(int(i), self.my_ID)
-
-		self.friend_db.columns = new_names
-
-		attrs=list(self.friend_db.index.values)
-
-		# adding the mutual ties connections 
-		#and converting to ints from strings)
-		for i in list(self.friend_db.columns.values):
-
-			q = self.friend_db[int(i)]["known from"]
-			if q==q:
-				self.friend_db[int(i)]["known from"] = int(q)
-
-			r = self.friend_db[int(i)]["race"]
-			if r==r:
-				self.friend_db[int(i)]["race"] = int(r)
+	def _graph_key(self):
+		""" Identifies the network as it is right now. Besides the
+		version bumped by _touch, the node and edge counts catch
+		changes made straight to mynet.
+		"""
+		return (self._version, id(self.mynet), self.mynet.number_of_nodes(),
+			self.mynet.number_of_edges())
 
-			p = self.friend_db[int(i)]["gender"]
-			if p==p:
-				self.friend_db[int(i)]["gender"] = str(p)
 
-			if type(self.friend_db[int(i)]["mutuals"]) == str:
-				mut_str = self.friend_db[int(i)]["mutuals"][1:-1].split(",")
-				mutuals = []
-				for j in mut_str:
-					try:
-						mutuals.append(int(j))
-					except:
-						if j != "":
-							mutuals.append(long(j))
-						else:
-							pass
-
-			self.friend_db[int(i)]["mutuals"] = mutuals
-			for j in mutuals:
-				if int(j) in new_names:
-					try:
-						edge = self.mynet[int(j)][int(i)]
-					except:
-						self.mynet.add_edge(int(j), int(i))
+	def _cached(self, name, compute):
+		""" Returns the result stored under name, calling compute() to
+		work it out if the network has changed since it was stored (or
+		it never was).
+		"""
+		key = self._graph_key()
+		if key != self._cache_key:
+			self._cache = {}
+			self._cache_key = key
+		if name not in self._cache:
+			self._cache[name] = compute()
+		return self._cache[name]
+
+
+	@property
+	def no_ego_net(self):
+		""" The network without the ego and without the friends who are
+		only tied to the ego.
+		"""
+		return self._cached("no_ego_net", self._without_ego)
 
-			val = self.friend_db[int(i)]["strong tie"]
-			if val != "" and (val==val):
-				self.mynet[int(i)][self.my_ID]["strong"] = int(val)
 
-		for edge in self.mynet.edges():
-			try:
-				self.mynet[int(edge[0])][int(edge[1])]["strong"]
-			except:
-				self.mynet[int(edge[0])][int(edge[1])]["strong"]=0
-		isos = []
+	def _without_ego(self):
 		bu = nx.Graph()
 		bu.add_nodes_from(self.mynet.nodes())
 		bu.add_edges_from(self.mynet.edges())
 		bu.remove_node(self.my_ID)
-		for n in bu.nodes():
-			if nx.is_isolate(bu, n):
-				bu.remove_node(n)
-				isos.append(n)
-		self.no_ego_net = bu
-		
-		self.b_cent = self.betweenness_centrality(withme=False)
-		self.c_cent = self.closeness_centrality(withme=False)
-		self.d_cent = self.degree_centrality(withme=False)
-		self.e_cent = self.eigenvector_centrality(iterations=100,withme=False)
-		for iso in isos:
-			self.b_cent[iso]=-1
-			self.c_cent[iso]=-1
-			self.d_cent[iso]=-1
-			self.e_cent[iso]=-1
-		self.b_cent_w = self.betweenness_centrality(withme=True)
-		self.c_cent_w = self.closeness_centrality(withme=True)
-		self.d_cent_w = self.degree_centrality(withme=True)
-		self.e_cent_w = self.eigenvector_centrality(iterations=100,withme=True)
+		bu.remove_nodes_from([n for n in bu.nodes() if nx.is_isolate(bu, n)])
+		return bu
+
+
+	def _centrality(self, metric, withme, iterations=100, samples=None,
+		seed=None, tolerance=1.0e-6, workers=None):
+		""" Returns the {ID: value} dictionary for one of "betweenness",
+		"closeness", "degree" or "eigenvector" centrality, with or without
+		the ego. Each is only worked out the first time it is asked for
+		after the network changes. Once the eigenvector centrality has
+		converged, asking again with a different number of iterations
+		gives back the same answer. Betweenness and closeness come from
+		_path_centrality.
+
+		Eigenvector centrality starts from the last answer worked out
+		with or without the ego, so after small changes to the network
+		it only takes a few iterations.
+		"""
+		if metric in ("betweenness", "closeness"):
+			return self._path_centrality(metric, withme, samples, seed,
+				workers)[0]
+
+		def compute():
+			if metric == "degree":
+				return cn.degree(self._adjacency(withme))
+			elif metric == "eigenvector":
+				values = cn.eigenvector(self._adjacency(withme), iterations,
+					tolerance, start=self._eigenvector_start.get(withme))
+				self._eigenvector_start[withme] = values
+				return values
+			raise ValueError("Unknown centrality measure: "+str(metric))
+
+		key = ("centrality", metric, withme)
+		if metric == "eigenvector":
+			key += (tolerance,)
+		return self._cached(key, compute)
+
+
+	def _adjacency(self, withme):
+		""" The network (or the one without the ego) as the arrays
+		the centrality module works on. Without the ego, they are the
+		same arrays with the ego and the friends only tied to it masked
+		out, so the nodes match no_ego_net.
+		"""
+		if withme:
+			return self._cached(("adjacency", True),
+				lambda: cn.adjacency(self.mynet))
+		if self.my_ID in self.mynet:
+			ego = self.my_ID
+		else:
+			ego = None
+		return self._cached(("adjacency", False),
+			lambda: cn.without(self._adjacency(True), ego))
+
+
+	def _path_centrality(self, metric, withme, samples=None, seed=None,
+		workers=None):
+		""" Returns betweenness or closeness centrality as an {ID: value}
+		dictionary and the bound the values (or for closeness, the average
+		distances) are within 95% of the time. Both come out of the same
+		searches through the network, so asking for one after the other
+		costs nothing. With samples, the searches only start from that
+		many randomly chosen nodes and the bound is no longer 0. Without
+		a seed, the same estimate is given back until the network changes.
+		The searches are shared out between workers processes (by default
+		the number load_data was given).
+		"""
+		if metric not in ("betweenness", "closeness"):
+			raise ValueError("Only betweenness and closeness come from paths")
+		paths = self._cached(("paths", withme, samples, seed),
+			lambda: cn.shortest_paths(self._adjacency(withme), samples, seed,
+				workers=workers or self.workers))
+		if metric == "betweenness":
+			return paths[0]
+		return paths[1]
+
+
+	def _report_estimate(self, metric, withme, samples, seed=None, workers=None):
+		bound = self._path_centrality(metric, withme, samples, seed, workers)[1]
+		if metric == "closeness":
+			print ("Estimated from "+str(samples)+" friends: each average"
+				+" distance is within "+str(round(bound,4))
+				+" of the real one 95% of the time")
+		else:
+			print ("Estimated from "+str(samples)+" friends: each value"
+				+" is within "+str(round(bound,4))
+				+" of the real one 95% of the time")
+
+
+	def centrality_report(self, withme=False, samples=None, seed=None,
+		workers=None):
+		""" Returns a table (a Pandas DataFrame) of the betweenness,
+		closeness, degree and eigenvector centrality of everyone in the
+		network, one row per ID. Without the ego, the friends who are
+		only tied to you get -1s. Pass samples (and a seed) to estimate
+		betweenness and closeness, as for betweenness_centrality, and
+		workers to share the work between that many processes.
+		"""
+		if samples:
+			self._report_estimate("betweenness", withme, samples, seed, workers)
+			self._report_estimate("closeness", withme, samples, seed, workers)
+		return self._report(withme, samples, seed, workers).copy()
 
-		print "Data successfully loaded"
+
+	def _report(self, withme, samples=None, seed=None, workers=None):
+		def compute():
+			columns = ["betweenness", "closeness", "degree", "eigenvector"]
+			values = dict((c, self._centrality(c, withme, samples=samples,
+				seed=seed, workers=workers)) for c in columns)
+			ids = [n for n in self.mynet.nodes() if withme or n != self.my_ID]
+			report = pd.DataFrame(values, columns=columns).reindex(ids)
+			report.index.name = "ID"
+			return report.fillna(-1)
+
+		return self._cached(("report", withme, samples, seed), compute)
 
 
 	def avg_path_length(self, withme=False):
@@ -399,20 +605,20 @@ class Graph(object):
 
 		if node==None:
 			if withme:
-				my_dict = nx.degree_centrality(self.mynet)
+				my_dict = self._centrality("degree", True)
 				new = {}
 				new2={}
 				for i in my_dict:
 					new[self.id_to_name(i)] = my_dict[i]
 					new2[i] = my_dict[i]
 				if average:
-					print "The average is " + str(round(sum(new.values())/float(len(new.values())),4))
+					print "The average is " + str(round(sum(new2.values())/float(len(new2.values())),4))
 				else:
 					for i,j in new.items():
 						print i, round(j,4)
 					return new2
 	 		else:
-				my_dict = nx.degree_centrality(self.no_ego_net)
+				my_dict = self._centrality("degree", False)
 
 				new = {}
 				new2={}
@@ -420,7 +626,7 @@ class Graph(object):
 					new[self.id_to_name(i)] = my_dict[i]
 					new2[i] = my_dict[i]
 				if average:
-					print "The average is " + str(round(sum(new.values())/float(len(new.values())),4))
+					print "The average is " + str(round(sum(new2.values())/float(len(new2.values())),4))
 				else:
 					for i,j in new.items():
 						print i, round(j,4)
@@ -428,7 +634,7 @@ class Graph(object):
 	
 		else:
 			if withme:
-				my_dict = nx.degree_centrality(self.mynet)
+				my_dict = self._centrality("degree", True)
 				try:
 					print "The coefficient for node "+str(node)+ "is "+ str(round(my_dict[node],4))
 				except:
@@ -437,7 +643,7 @@ class Graph(object):
 					except:
 						print "Invalid node name"
 			else:
-				my_dict = nx.degree_centrality(self.no_ego_net)
+				my_dict = self._centrality("degree", False)
 				try:
 					print "The coefficient for node "+str(node)+ "is "+ str(round(my_dict[node],4))
 				except:
@@ -447,23 +653,34 @@ class Graph(object):
 						print "Invalid node name"
 
 
-	def betweenness_centrality(self, withme=False, node=None,average=False):
+	def betweenness_centrality(self, withme=False, node=None,average=False,
+		samples=None, seed=None, workers=None):
+		""" Pass samples (a number of friends) to estimate the values
+		from paths starting at that many randomly chosen friends instead
+		of everyone. It's much quicker for big networks. The seed makes
+		the choice of friends repeatable. workers shares the work out
+		between that many processes, one per processor core is best.
+		"""
+		if samples:
+			self._report_estimate("betweenness", withme, samples, seed, workers)
 		if node==None:
 			if withme:
-				my_dict = nx.betweenness_centrality(self.mynet)
+				my_dict = self._centrality("betweenness", True, samples=samples, seed=seed,
+					workers=workers)
 				new = {}
 				new2={}
 				for i in my_dict:
 					new[self.id_to_name(i)] = my_dict[i]
 					new2[i] = my_dict[i]
 				if average:
-					print "The average is " + str(round(sum(new.values())/float(len(new.values())),4))
+					print "The average is " + str(round(sum(new2.values())/float(len(new2.values())),4))
 				else:
 					for i,j in new.items():
 						print i, round(j,4)
 					return new2
 			else:
-				my_dict = nx.betweenness_centrality(self.no_ego_net)
+				my_dict = self._centrality("betweenness", False, samples=samples, seed=seed,
+					workers=workers)
 
 				new = {}
 				new2={}
@@ -471,7 +688,7 @@ class Graph(object):
 					new[self.id_to_name(i)] = my_dict[i]
 					new2[i] = my_dict[i]
 				if average:
-					print "The average is " + str(round(sum(new.values())/float(len(new.values())),4))
+					print "The average is " + str(round(sum(new2.values())/float(len(new2.values())),4))
 				else:
 					for i,j in new.items():
 						print i, round(j,4)
@@ -479,7 +696,8 @@ class Graph(object):
 
 		else:
 			if withme:
-				my_dict = nx.betweenness_centrality(self.mynet)
+				my_dict = self._centrality("betweenness", True, samples=samples, seed=seed,
+					workers=workers)
 				try:
 					print "The coefficient for node "+str(node)+ "is "+ str(round(my_dict[node],4))
 				except:
@@ -488,7 +706,8 @@ class Graph(object):
 					except:
 						print "Invalid node name"
 			else:
-				my_dict = nx.betweenness_centrality(self.no_ego_net)
+				my_dict = self._centrality("betweenness", False, samples=samples, seed=seed,
+					workers=workers)
 				try:
 					print "The coefficient for node "+str(node)+ "is "+ str(round(my_dict[node],4))
 				except:
@@ -498,23 +717,32 @@ class Graph(object):
 						print "Invalid node name"
 
 
-	def closeness_centrality(self, withme=False, node=None, average=False):
+	def closeness_centrality(self, withme=False, node=None, average=False,
+		samples=None, seed=None, workers=None):
+		""" Pass samples to estimate the values from the distances to
+		that many randomly chosen friends and workers to share out the
+		work, as for betweenness_centrality.
+		"""
+		if samples:
+			self._report_estimate("closeness", withme, samples, seed, workers)
 		if node==None:
 			if withme:
-				my_dict = nx.closeness_centrality(self.mynet)
+				my_dict = self._centrality("closeness", True, samples=samples, seed=seed,
+					workers=workers)
 				new = {}
 				new2={}
 				for i in my_dict:
 					new[self.id_to_name(i)] = my_dict[i]
 					new2[i] = my_dict[i]
 				if average:
-					print "The average is " + str(round(sum(new.values())/float(len(new.values())),4))
+					print "The average is " + str(round(sum(new2.values())/float(len(new2.values())),4))
 				else:
 					for i,j in new.items():
 						print i, round(j,4)
 					return new2
 			else:
-				my_dict = nx.closeness_centrality(self.no_ego_net)
+				my_dict = self._centrality("closeness", False, samples=samples, seed=seed,
+					workers=workers)
 
 				new = {}
 				new2={}
@@ -522,14 +750,15 @@ class Graph(object):
 					new[self.id_to_name(i)] = my_dict[i]
 					new2[i] = my_dict[i]
 				if average:
-					print "The average is " + str(round(sum(new.values())/float(len(new.values())),4))
+					print "The average is " + str(round(sum(new2.values())/float(len(new2.values())),4))
 				else:
 					for i,j in new.items():
 						print i, round(j,4)
 					return new2
 		else:
 			if withme:
-				my_dict = nx.closeness_centrality(self.mynet)
+				my_dict = self._centrality("closeness", True, samples=samples, seed=seed,
+					workers=workers)
 				try:
 					print "The coefficient for node "+str(node)+ "is "+ str(round(my_dict[node],4))
 				except:
@@ -538,7 +767,8 @@ class Graph(object):
 					except:
 						print "Invalid node name"
 			else:
-				my_dict = nx.closeness_centrality(self.no_ego_net)
+				my_dict = self._centrality("closeness", False, samples=samples, seed=seed,
+					workers=workers)
 				try:
 					print "The coefficient for node "+str(node)+ "is "+ str(round(my_dict[node],4))
 				except:
@@ -547,29 +777,31 @@ class Graph(object):
 					except:
 						print "Invalid node name"
 
-	def eigenvector_centrality(self, iterations, withme=False, node=None, average=False):
-		my_dict = nx.eigenvector_centrality(self.mynet,
-			max_iter = iterations)
-
+	def eigenvector_centrality(self, iterations, withme=False, node=None, average=False,
+		tolerance=1.0e-6):
+		""" iterations is the most times the power iteration may go round
+		before giving up and tolerance is how close (on average, per node)
+		two rounds have to be for it to stop.
+		"""
 		if node==None:
 			if withme:
-				my_dict =nx.eigenvector_centrality(self.mynet,
-					max_iter = iterations)
+				my_dict = self._centrality("eigenvector", True, iterations,
+					tolerance=tolerance)
 				new = {}
 				new2={}
 				for i in my_dict:
 					new[self.id_to_name(i)] = my_dict[i]
 					new2[i] = my_dict[i]
 				if average:
-					print "The average is " + str(round(sum(new.values())/float(len(new.values())),4))
+					print "The average is " + str(round(sum(new2.values())/float(len(new2.values())),4))
 				else:
 					for i,j in new.items():
 						print i, round(j,4)
 					return new2
 			else:
 
-				my_dict = nx.eigenvector_centrality(self.no_ego_net,
-					max_iter = iterations)
+				my_dict = self._centrality("eigenvector", False, iterations,
+					tolerance=tolerance)
 
 				new = {}
 				new2={}
@@ -577,7 +809,7 @@ class Graph(object):
 					new[self.id_to_name(i)] = my_dict[i]
 					new2[i] = my_dict[i]
 				if average:
-					print "The average is " + str(round(sum(new.values())/float(len(new.values())),4))
+					print "The average is " + str(round(sum(new2.values())/float(len(new2.values())),4))
 				else:
 					for i,j in new.items():
 						print i, round(j,4)
@@ -586,7 +818,8 @@ class Graph(object):
 
 		else:
 			if withme:
-				my_dict = nx.eigenvector_centrality(self.mynet,max_iter = iterations)
+				my_dict = self._centrality("eigenvector", True, iterations,
+					tolerance=tolerance)
 				try:
 					print "The coefficient for node "+str(node)+ "is "+ str(round(my_dict[node],4))
 				except:
@@ -595,7 +828,8 @@ class Graph(object):
 					except:
 						print "Invalid node name"
 			else:
-				my_dict = nx.eigenvector_centrality(self.no_ego_net,max_iter = iterations)
+				my_dict = self._centrality("eigenvector", False, iterations,
+					tolerance=tolerance)
 				try:
 					print "The coefficient for node "+str(node)+ "is "+ str(round(my_dict[node],4))
 				except:
@@ -617,7 +851,7 @@ class Graph(object):
 			vals = list(self.mynet.degree(self.mynet.nodes()).values())
 			return round(sum(vals)/float(len(vals)),4)
 		else:
-			vals = list(self.mynet.degree(self.no_ego_net.nodes()).values())
+			vals = list(self.mynet.degree(self._adjacency(False)[0]).values())
 			return round(sum(vals)/float(len(vals)),4)
 			
 
@@ -628,19 +862,17 @@ class Graph(object):
 		network minus the ego because it skews everything so much.
 		"""
 
-		node_list = []
+		nodes, values, position = self._clustering()
 		if group==-1:
-			for i in self.mynet.nodes():
-				if i != self.my_ID:
-					node_list.append(i)
+			rows = [position[i] for i in nodes if i != self.my_ID]
 		elif group==0: 
-			node_list = self.mynet.nodes()
+			rows = range(len(nodes))
 		else:
-			for i in self.mynet.nodes():
-				if self.friend_db[int(i)]["known from"] == group:
-					node_list.append(i)
+			known = self.friend_db.column("known from")
+			members = set(self.friend_db.ids[known == group].tolist())
+			rows = [position[i] for i in nodes if i in members]
 
-		clustering = nx.clustering(self.mynet, node_list)
+		clustering = dict((nodes[r], values[r]) for r in rows)
 		new_dict = {}
 		for node, val in clustering.items():
 			new_dict[self.id_to_name(node)] = round(val,4)
@@ -658,7 +890,66 @@ class Graph(object):
 			return new_dict
 		else: 
 			print "The average clustering coefficient for people in" +g_name
-			return round(sum(new_dict.values())/float(len(new_dict.values())),4)
+			if not len(rows):
+				return float("nan")
+			return round(values[rows].mean(),4)
+
+
+	def _clustering(self):
+		""" The clustering coefficient of everyone in the network, as
+		(nodes, values, position): the nodes, an array of their
+		coefficients and {ID: place in nodes}. The triangles are only
+		counted once for each version of the network.
+		"""
+		def compute():
+			adj = self._adjacency(True)
+			position = dict((n, i) for i, n in enumerate(adj[0]))
+			return adj[0], cl.coefficients(adj), position
+		return self._cached("clustering", compute)
+
+
+	def _clustering_groups(self, attribute):
+		""" Splits the friends in the network by their value of
+		attribute, with everyone missing a value together in a group of
+		their own (None). Returns the values in the order they first come
+		up in friend_db, the IDs in each group (in the same order) and the
+		group of each node in _clustering, -1 for those not in friend_db.
+		"""
+		nodes, values, position = self._clustering()
+		number = {}
+		found = []
+		members = []
+		which = [-1]*len(nodes)
+		for i, value in zip(self.friend_db.ids.tolist(),
+			self.friend_db.column(attribute).tolist()):
+			if i not in position:
+				continue
+			if fs.is_missing(value):
+				value = None
+			if value not in number:
+				number[value] = len(found)
+				found.append(value)
+				members.append([])
+			members[number[value]].append(i)
+			which[position[i]] = number[value]
+		return found, members, which
+
+
+	def _value_name(self, attribute, value):
+		""" How a value of attribute is written out. """
+		if value is None or value is ct.MISSING:
+			return "unknown"
+		if attribute == "race":
+			return {1: "white", 2: "nonwhite"}.get(value, "unknown")
+		elif attribute == "gender":
+			return value if value in ("female", "male") else "unknown"
+		elif attribute == "strong tie":
+			return {0: "weak", 1: "strong", "0": "weak", "1": "strong"}.get(value,
+				"unknown")
+		elif attribute == "known from":
+			return str(self.contexts_list.get(value, value))
+		return str(value)
+
 
 	def clustering_by_attribute_summary(self, attribute):
 		""" This allows the user to group people by an attribute
@@ -667,52 +958,12 @@ class Graph(object):
 		if attribute == "mutuals" or attribute == "id":
 			print "Sorry, "+attribute+ " is not a sortable attribute"
 		else:    
-			node_dict = {}
-			for i in list(self.friend_db.columns.values):
-				val  = self.friend_db[int(i)][attribute]
-				try:
-					node_dict[val].append(int(i))
-				except:
-					node_dict[val] = [int(i)]
-
-			cluster_dict = {}
-			for i in node_dict:
-				nodes = node_dict[i]
-				cluster_coef = nx.clustering(self.mynet, nodes)
-				rewrite = {}
-				for r in cluster_coef:
-					rewrite[self.id_to_name(r)] = cluster_coef[r]
-				cluster_dict[i] = cluster_coef
-				if attribute == "race":
-					if i == 1:
-						val = "white"
-					elif i== 2:
-						val = "nonwhite"
-					else:
-						val = "unknown"
-				elif attribute=="gender":
-					if i=="female":
-						val = "female"
-					elif i=="male":
-						val = "male"
-					else:
-						val = "unknown"
-				elif attribute=="strong tie":
-					if i == 0:
-						val = "weak"
-					elif i==1:
-						val = "strong"
-					elif i == "0":
-						val = "weak"
-					elif i == "1":
-						was = "strong"
-					else:
-						val = "unknown"
-				elif attribute=="known from":
-					val = self.contexts_list[i]
-				tot = sum(rewrite.values())/float(len(rewrite.values()))
+			nodes, values, position = self._clustering()
+			found, members, which = self._clustering_groups(attribute)
+			averages = cl.group_averages(values, which, len(found))
+			for value, tot in zip(found, averages.tolist()):
 				print ("Average clustering coef. for friends with " +attribute+ " value "
-					+val+" is: "+ str(round(tot,4)))
+					+self._value_name(attribute, value)+" is: "+ str(round(tot,4)))
 
 
 
@@ -723,50 +974,17 @@ class Graph(object):
 		if attribute == "mutuals" or attribute == "id":
 			print "Sorry, "+attribute+ " is not a sortable attribute"
 		else:    
-			node_dict = {}
-			for i in list(self.friend_db.columns.values):
-				val  = self.friend_db[int(i)][attribute]
-				try:
-					node_dict[val].append(int(i))
-				except:
-					node_dict[val] = [int(i)]
-
-			cluster_dict = {}
-			for i in node_dict:
-				nodes = node_dict[i]
-				cluster_coef = nx.clustering(self.mynet, nodes)
+			nodes, values, position = self._clustering()
+			found, members, which = self._clustering_groups(attribute)
+			for value, ids in zip(found, members):
+				cluster_coef = {}
+				for i in ids:
+					cluster_coef[i] = values[position[i]]
 				rewrite = {}
 				for r in cluster_coef:
 					rewrite[self.id_to_name(r)] = round(cluster_coef[r],4)
-				if attribute == "race":
-					if i == 1:
-						val = "white"
-					elif i== 2:
-						val = "nonwhite"
-					else:
-						val = "unknown"
-				elif attribute=="gender":
-					if i=="female":
-						val = "female"
-					elif i=="male":
-						val = "male"
-					else:
-						val = "unknown"
-				elif attribute=="strong tie":
-					if i == 0:
-						val = "weak"
-					elif i==1:
-						val = "strong"
-					elif i == "0":
-						val = "weak"
-					elif i == "1":
-						was = "strong"
-					else:
-						val = "unknown"
-				elif attribute=="known from":
-					val = self.contexts_list[i]
 				print ("Clustering coef. for friends with "+ attribute+ " value "
-					+val+" is: "+ str(rewrite))
+					+self._value_name(attribute, value)+" is: "+ str(rewrite))
 				print ""
 
 
@@ -780,205 +998,125 @@ class Graph(object):
 			print "Sorry, "+ attribute+ " is not a sortable attribute."
 
 		else:
-			trans_dict = {}
-			for i in list(self.friend_db.columns.values):
-				val = self.friend_db[i][attribute]
-				mutuals = list(self.friend_db[i]["mutuals"])
-				hit = 0
-				total = 0
-				for j in mutuals:
-					if self.friend_db[int(j)][attribute] == val:
-						hit +=1
-					total +=1
-				if (i != self.my_ID):
-					if (self.friend_db[self.my_ID][attribute] == val):
-						hit +=1
-					total += 1
-
-				if total != 0:
-					coef = hit/float(total)
-				else:
-					coef = 0
+			table = hm.edges(self.friend_db)
+			averages = hm.associativity(self.friend_db, table, attribute,
+				self.my_ID)
+			for value, avg in averages.iteritems():
+				print ("Associativity avg for people with " +attribute+ " value "
+					+self._value_name(attribute, value) + " is: " +str(round(avg,4)))
+
+
+	def mixing_matrix(self, attribute, withme=False):
+		""" Counts the ties between your friends with each pair of values
+		of attribute, for example network.mixing_matrix("gender"). A tie
+		between two friends with the same value is counted twice, once for
+		each of them. With withme=True your own ties are counted too.
+		"""
+		pairs = hm.ties(self.friend_db, hm.edges(self.friend_db),
+			self.my_ID if withme else None)
+		return hm.mixing(self.friend_db, pairs, attribute)
+
+
+	def homophily(self, attributes=None, withme=False):
+		""" How much your friends are tied to friends like themselves,
+		for each of attributes (by default all the categorical ones).
+		Assortativity goes from 1 when friends are only tied to friends
+		with the same value, through 0 when the attribute makes no
+		difference, down to negative values when unlike friends are tied
+		more often. The E-I index goes from -1 (all ties inside groups)
+		to 1 (all ties between groups). Friends with no value are left
+		out.
+		"""
+		return hm.summary(self.friend_db, attributes,
+			self.my_ID if withme else None)
 
-				try:
-					trans_dict[val].append(coef)
-				except:
-					trans_dict[val] = [coef]
-
-			avg_dict = {}
-			for i in trans_dict:
-				val = trans_dict[i]
-				avg = sum(val)/float(len(val))
-				avg_dict[i] = avg
-				if attribute == "race":
-					if i == 1:
-						val = "white"
-					elif i== 2:
-						val = "nonwhite"
-					else:
-						val = "unknown"
-				elif attribute=="gender":
-					if i=="female":
-						val = "female"
-					elif i=="male":
-						val = "male"
-					else:
-						val = "unknown"
-				elif attribute=="strong tie":
-					if i == 0:
-						val = "weak"
-					elif i==1:
-						val = "strong"
-					elif i == "0":
-						val = "weak"
-					elif i == "1":
-						was = "strong"
-					else:
-						val = "unknown"
-				elif attribute=="known from":
-					val = self.contexts_list[i]
-				print "Associativity avg for people with " +attribute+ " value "+val + " is: " +str(round(avg,4))
 
-                
- 
-	def attribute_by_attribute(self, group_number, attribute_two):
+	def crosstab(self, attributes, share=False, within=None):
+		""" Counts your friends by one or more attributes at once, for
+		example network.crosstab(["known from", "gender"]). With share=True
+		you get the share of your friends instead, and with within set to
+		some of the attributes, the share of the friends with the same
+		values of those (so within="known from" breaks each group down
+		separately). Friends with no value are counted as "missing".
+		"""
+		return ct.crosstab(self.friend_db, attributes, share, within)
+
+
+	def attribute_by_attribute(self, group_number, attribute_two,
+		attribute_one="known from"):
 		""" This method allows the user to see the prevalences of a 
-		particular attribute within a group. This is no doubt a way to do
-		this using Pandas functionality, but that is for a later iteration.
+		particular attribute within a group, the group being the friends
+		with the value group_number for attribute_one (by default, the
+		context they are known from).
 		"""
-		attribute_one = 'known from'
-		indices = list(self.friend_db.index.values)
+		indices = list(self.friend_db.attributes)
 		if (attribute_one not in indices or attribute_two not in indices):
 			print "Invalid inputs. Make sure the dictionary and spelling are correct."
 
 		else:
-			vals = {}
-			count = 0
-			for i in list(self.friend_db.columns.values):
-				if (self.friend_db[i][str(attribute_one)] == group_number):
-					which = self.friend_db[i][str(attribute_two)]
-					try:
-						vals[which] += 1
-						count +=1
-					except:
-						vals[which] = 1
-						count +=1
+			table = ct.crosstab(self.friend_db, [attribute_one, attribute_two])
+			vals = [(j, n) for (i, j), n in table.iteritems() if i == group_number]
+			count = sum(n for j, n in vals)
 
 			print "For friends in group "+str(group_number)+" breakdown into the following percentages for attribute "+str(attribute_two)
 			print "(Sample size = "+str(count)+")"
 
-			for j in vals:
-				if attribute_two == "race":
-					if j == 1:
-						val = "white"
-					elif j== 2:
-						val = "nonwhite"
-					else:
-						val = "unknown"
-				elif attribute_two=="gender":
-					if j=="female":
-						val = "female"
-					elif j=="male":
-						val = "male"
-					else:
-						val = "unknown"
-				elif attribute_two=="strong tie":
-					if j == 0:
-						val = "weak"
-					elif j==1:
-						val = "strong"
-					elif j == "0":
-						val = "weak"
-					elif j == "1":
-						val = "strong"
-					else:
-						val = "unknown"
-				try:
-					number = round(vals[j]/float(count),4)    
-				except:
-					number = 0
-
-				print val+" : "+str(number)
+			for j, n in vals:
+				print self._value_name(attribute_two, j)+" : "+str(round(n/float(count),4))
 
 
 	def attribute_breakdown(self, attribute):
 		""" This method finds the percentage within categories of an attribute"""
 
-		if attribute not in list(self.friend_db.index.values):
+		if attribute not in list(self.friend_db.attributes):
 			print "Not a valid attribute"
+			return
 
-		vals = {}
-		count = 0
-		for i in list(self.friend_db.columns.values):
-			which = self.friend_db[i][str(attribute)]
-			try:
-				vals[which] += 1
-				count +=1
-			except:
-				vals[which] = 1
-				count +=1
+		table = ct.crosstab(self.friend_db, attribute)
+		count = table.sum()
 
 		print "Your friends breakdown into the following percentages for attribute "+str(attribute)
 		print "(Sample size = "+str(count)+")"
             
-		for j in vals:
-			if attribute == "race":
-				if j == 1:
-					val = "white"
-				elif j== 2:
-					val = "nonwhite"
-				else:
-					val = "unknown"
-			elif attribute=="gender":
-				if j=="female":
-					val = "female"
-				elif j=="male":
-					val = "male"
-				else:
-					val = "unknown"
-			elif attribute=="strong tie":
-				if j == 0:
-					val = "weak"
-				elif j==1:
-					val = "strong"
-				elif j == "0":
-					val = "weak"
-				elif j == "1":
-					val = "strong"
-				else:
-					val = "unknown"
-			elif attribute=="known from":
-				val = self.contexts_list[i]
-			try:
-				number = vals[j]/float(count)    
-			except:
-				number = 0
-
-			print val+" : "+ str(round(number,4))
+		for j, n in table.iteritems():
+			print self._value_name(attribute, j)+" : "+ str(round(n/float(count),4))
 			
 	def ids_to_names(self):
 		""" Returns a dictionary links IDs to names. """
 		my_dict = {}
-		for i in list(self.friend_db.columns.values):
+		for i in list(self.friend_db):
 			my_dict[int(i)] = self.friend_db[int(i)]["name"]
 		return my_dict
         
      
-     	def name_to_id(self, name):
-     		"""Returns the ID number associated with the name ."""
-
-		for id in self.friend_db:
-			name1 = str(self.friend_db[int(id)]["name"])
-			if name1 == name:
-				return id
-				
+	def name_to_id(self, name):
+		"""Returns the ID number associated with the name. Case doesn't
+		matter and the start of a name will do. If more than one friend
+		fits, you get the first and a list of the others.
+		"""
+
+		ids = self._find_friends(name)
+		if ids:
+			if len(ids) > 1:
+				print (str(len(ids))+" friends match "+str(name)+": "
+					+", ".join(self.id_to_name(i)+" ("+str(i)+")" for i in ids)
+					+". Using the first.")
+			return ids[0]
 		print "Not a valid name"
 
 
+	def _find_friends(self, name):
+		""" The IDs of the friends called name or, failing that, with a
+		name like it (see FriendStore.find).
+		"""
+		return (self.friend_db.find(str(name))
+			or self.friend_db.find(str(name), exact=False))
+
+
 	def id_to_name(self, id):
 		"""Returns the name associated with the ID number."""
 		try:
-			name = str(self.friend_db[int(id)]["name"])
+			name = str(self.friend_db.get_value(id, "name"))
 			return name
 		except:
 			print "Not a valid ID"
@@ -988,7 +1126,7 @@ class Graph(object):
 	def ids_to_names(self):
 		""" Returns a dictionary links IDs to names. """
 		my_dict = {}
-		for i in list(self.friend_db.columns.values):
+		for i in list(self.friend_db):
 			my_dict[int(i)] = self.friend_db[int(i)]["name"]
         
 		return my_dict
@@ -996,31 +1134,30 @@ class Graph(object):
 
 	def view_mutual_friends(self, name):
 		""" This allows the user to see mutual friends of the specified friend """
-		id_ = 0
-		for i in list(self.friend_db.columns.values):
-			if self.friend_db[i]["name"] == str(name):
-				id_ = i
-		if id_ == 0:
+		ids = self.friend_db.find(str(name))
+		if ids == []:
 			print "Name not found. Please try again."
-		else:
+		for id_ in ids:
+			if len(ids) > 1:
+				print "ID#: "+str(id_)
 			print "You have the follow mutual friends:"
-			mutuals = self.friend_db[id]["mutuals"]
+			mutuals = self.friend_db[id_]["mutuals"]
 			for i in mutuals:
-				print self.friend_db[i]["name"]
+				if i in self.friend_db:
+					print self.friend_db[i]["name"]
 
   
 	def view_friend_info(self, name):
-		""" This allows the user to see a friend's attributes """
-		id_ = 0
-		for i in list(self.friend_db.columns.values):
-			if self.friend_db[i]["name"] == str(name):
-				id_ = i
-		if id_ == 0:
+		""" This allows the user to see a friend's attributes. If there
+		are several friends with the name, you see them all.
+		"""
+		ids = self.friend_db.find(str(name))
+		if ids == []:
 			print "Name not found. Please try again."
-		else:
-			print "ID#: "+str(id)
-			for attr in list(self.friend_db.index.values):
-				print str(attr) + ": "+ str(self.friend_db[id][attr])
+		for id_ in ids:
+			print "ID#: "+str(id_)
+			for attr in list(self.friend_db.attributes):
+				print str(attr) + ": "+ str(self.friend_db[id_][attr])
 
 
 		def view_people_from(self, group):
@@ -1032,7 +1169,7 @@ class Graph(object):
 				print "Incorrect group name"
 			else:
 				my_list = []
-				for i in self.friend_db.columns.values:
+				for i in self.friend_db:
 					if self.friend_db[i]["known from"] == group:
 						my_list.append(self.friend_db[i]["name"])
 				print ("You have included the following people in the" 
@@ -1048,33 +1185,14 @@ class Graph(object):
 		algorithm will not work if the user hasn't already defined
 		which ties are strong.
 		"""
-		comps = []
-		edges = nx.get_edge_attributes(self.mynet, "strong")
-		if edges != {}:
-			for e in edges:
-				if edges[e] == 1:
-					comps.append(e)
-			hit = []
-			for i in comps:
-				for j in comps:
-					if i!=j:
-						for k in i:
-							if k != self.my_ID:
-								notme1 = k
-						for l in j:
-							if l != self.my_ID:
-								notme2 = l
-						try:    
-							self.mynet[notme1][notme2]
-							hit.append(1)
-						except:
-							hit.append(0)
-
+		found = self._strong_closure()
+		if found is not None:
+			pairs, closed = found[0]
 			try:
-				val = sum(hit)/float(len(hit))
+				val = closed/float(pairs)
 			except:
 				val = 0
-			print "Count of triads inspected: "+str(len(hit))
+			print "Count of triads inspected: "+str(pairs)
 			print round(val,4)
 		else:
 			print ("ERROR: You must first enter information about"
@@ -1089,43 +1207,215 @@ class Graph(object):
 		hasn't already defined which ties are strong. The group
 		value is the one associated with social contexts.
 		"""
-
-		comps = []
-		edges = nx.get_edge_attributes(self.mynet, "strong")
-		if edges != {}:
-			for e in edges:
-				if edges[e] == 1 and (self.friend_db[e[0]]["known from"]
-					==group or self.friend_db[e[1]]["known from"]==group):
-					# check above makes sure they're in the right group
-					comps.append(e)
-
-			hit = []
-			for i in comps:
-				for j in comps:
-					if i!=j:
-						for k in i:
-							if k != self.my_ID:
-								notme1 = k
-						for l in j:
-							if l != self.my_ID:
-								notme2 = l
-						try:    
-							self.mynet[notme1][notme2]
-							hit.append(1)
-						except:
-							hit.append(0)
-
- 			try:
-				val = sum(hit)/float(len(hit))
+		found = self._strong_closure()
+		if found is not None:
+			# the ego's ties all count as being in the ego's own group
+			if (self.my_ID in self.friend_db and
+				self.friend_db.get_value(self.my_ID, "known from") == group):
+				pairs, closed = found[0]
+			else:
+				pairs, closed = 0, 0
+				for value, p, c in found[1]:
+					if value == group:
+						pairs, closed = p, c
+			try:
+				val = closed/float(pairs)
 			except:
 				val = 0
-			print "Count of triads inspected: "+str(len(hit))
+			print "Count of triads inspected: "+str(pairs)
 			print round(val,4)
 		else:
 			print ("ERROR: You must first enter information"
 				+ " about your tie strengths.")
 
 
+	def strong_triadic_closure_by_group(self):
+		""" Tests strong triadic closure within every group (social
+		context) at once, printing the number of triads inspected and
+		the share of them that are closed for each group. Returns the
+		shares by group number.
+		"""
+		found = self._strong_closure()
+		if found is None:
+			print ("ERROR: You must first enter information"
+				+ " about your tie strengths.")
+			return
+		if self.my_ID in self.friend_db:
+			ego = self.friend_db.get_value(self.my_ID, "known from")
+		else:
+			ego = None
+		shares = {}
+		for group, pairs, closed in found[1]:
+			if group == ego or (group is ct.MISSING and not pairs):
+				continue
+			shares[group] = closed/float(pairs) if pairs else 0
+			print ("Strong triadic closure in the group "
+				+self._value_name("known from", group)+": "+str(round(shares[group],4))
+				+" ("+str(pairs)+" triads inspected)")
+		return shares
+
+
+	def _strong_closure(self):
+		""" Counts the pairs of friends you have strong ties with and how
+		many of those pairs are friends themselves, for the whole network
+		and for each group of friends (by "known from") in one pass.
+		Returns ((pairs, closed), [(group, pairs, closed), ...]), the
+		groups in the order they were first seen, or None if no tie
+		strengths have been entered. Pairs are counted both ways round,
+		as the tests always have.
+		"""
+		strong = self._strong_nodes()
+		if strong is None:
+			return None
+		adj = self._adjacency(True)
+		groups, values = self._node_codes("known from")
+		pairs, closed = cl.strong_closure(adj, strong)
+		overall = (int(pairs[0]), int(closed[0]))
+		pairs, closed = cl.strong_closure(adj, strong, groups, len(values))
+		return overall, zip(values, pairs.tolist(), closed.tolist())
+
+
+	def _strong_nodes(self):
+		""" Which of the nodes of _adjacency(True) you have strong ties
+		with, as a list of True and False, or None if no tie strengths
+		have been entered.
+		"""
+		if self.my_ID in self.mynet:
+			ties = self.mynet[self.my_ID]
+		else:
+			ties = {}
+		# strengths are only ever entered for the ego's ties, so the rest
+		# of the network is only looked at if none of those have one
+		if not any("strong" in data for data in ties.itervalues()) and not any(
+			"strong" in data for u, v, data in self.mynet.edges_iter(data=True)):
+			return None
+		nodes = self._adjacency(True)[0]
+		position = dict((n, i) for i, n in enumerate(nodes))
+		strong = [False]*len(nodes)
+		for friend, data in ties.iteritems():
+			if data.get("strong") == 1 and friend != self.my_ID:
+				strong[position[friend]] = True
+		return strong
+
+
+	def _node_codes(self, attribute):
+		""" The codes of attribute (see the crosstab module) lined up with
+		the nodes of _adjacency(True), -1 for nodes not in friend_db, and
+		the values they stand for.
+		"""
+		nodes = self._adjacency(True)[0]
+		position = dict((n, i) for i, n in enumerate(nodes))
+		found, values = ct.codes(self.friend_db, attribute)
+		codes = [-1]*len(nodes)
+		for i, code in zip(self.friend_db.ids.tolist(), found.tolist()):
+			if i in position:
+				codes[position[i]] = code
+		return codes, values
+
+
+	def associativity_significance(self, attribute, samples=10000,
+		within=None, seed=None, workers=None):
+		""" Tests whether your friends are more alike in attribute than
+		chance would make them: the associativity of each value (see
+		associativity_by_attribute) and the assortativity and E-I index
+		(see homophily) are compared with the same figures for samples
+		shuffles of the values between your friends. With
+		within="known from" the values are only shuffled between friends
+		known from the same context. A small p (say under 0.05) means
+		chance is unlikely to have given a figure that far from what it
+		usually gives; z says how far, and in which direction. The work
+		is shared out between workers processes (by default the number
+		load_data was given).
+		"""
+		if attribute =="id" or attribute =="mutuals":
+			print "Sorry, "+ attribute+ " is not a sortable attribute."
+			return
+		model = sg.Homophily(self.friend_db, attribute, self.my_ID, within)
+		return self._significance(model, attribute, samples, seed, workers)
+
+
+	def clustering_significance(self, attribute, samples=10000, within=None,
+		rewire=False, seed=None, workers=None):
+		""" Tests whether the friends with each value of attribute are
+		more (or less) clustered than chance: the average clustering
+		coefficient of each group (see clustering_by_attribute_summary)
+		is compared with samples shuffles of the values between everyone
+		(only within the same context with within="known from"). With
+		rewire=True the comparison is with networks whose ties between
+		friends have been rewired at random, everyone keeping the same
+		number of ties, instead. Rewiring is much slower, so use a few
+		hundred samples. See associativity_significance for what the
+		results mean.
+		"""
+		if attribute == "mutuals" or attribute == "id":
+			print "Sorry, "+attribute+ " is not a sortable attribute"
+			return
+		nodes, values, position = self._clustering()
+		found, members, which = self._clustering_groups(attribute)
+		names = [ct.MISSING if value is None else value for value in found]
+		if rewire:
+			model = sg.Rewired(self._adjacency(True), position.get(self.my_ID),
+				which, names)
+		else:
+			strata = None
+			if within is not None:
+				strata = self._node_codes(within)[0]
+			model = sg.GroupClustering(values, which, names,
+				position.get(self.my_ID), strata)
+		return self._significance(model, attribute, samples, seed, workers)
+
+
+	def strong_closure_significance(self, samples=10000, within=None,
+		rewire=False, seed=None, workers=None):
+		""" Tests whether the friends you have strong ties with are more
+		likely to be friends with each other than chance (see
+		test_Strong_Triadic_Closure): the share of them who are is
+		compared with samples shuffles of which friends your strong ties
+		are with (only within the same context with within="known
+		from"), or with rewire=True, with networks whose ties between
+		friends have been rewired at random. See associativity_significance
+		and clustering_significance for more.
+		"""
+		strong = self._strong_nodes()
+		if strong is None:
+			print ("ERROR: You must first enter information"
+				+ " about your tie strengths.")
+			return
+		if sum(strong) < 2:
+			print ("You have fewer than two strong ties, so there are no"
+				+ " triads to test.")
+			return
+		adj = self._adjacency(True)
+		ego = adj[0].index(self.my_ID) if self.my_ID in self.mynet else None
+		if rewire:
+			model = sg.Rewired(adj, ego, strong=strong)
+		else:
+			strata = None
+			if within is not None:
+				strata = self._node_codes(within)[0]
+			model = sg.StrongClosure(adj, strong, ego, strata)
+		return self._significance(model, None, samples, seed, workers)
+
+
+	def _significance(self, model, attribute, samples, seed, workers):
+		""" Runs the test for model and prints the results. """
+		table = sg.test(model, samples, seed, workers or self.workers)
+		print "Compared with "+str(samples)+" randomized versions of the network:"
+		for row in table.itertuples(index=False):
+			name = row.statistic[0].upper() + row.statistic[1:]
+			if row.value is not None:
+				name += (" for friends with "+str(attribute)+" value "
+					+self._value_name(attribute, row.value))
+			if row.std == 0:
+				print (name+": "+str(round(row.observed,4))
+					+" (chance can't change it, so there is nothing to test)")
+				continue
+			print (name+": "+str(round(row.observed,4))+" (chance gives "
+				+str(round(row.expected,4))+" +/- "+str(round(row.std,4))
+				+", z = "+str(round(row.z,2))+", p = "+str(round(row.p,4))+")")
+		return table
+
+
 def update_files(new=None):
 	"""A utility function to make it easier to get all the files 
 	for the lab into the Wakari file system. There might be
@@ -1149,7 +1439,10 @@ def update_files(new=None):
 	except:
 		pass
 
-	names = ["networks_lab.py", "D3JS.html","Population_data.txt"]
+	names = ["networks_lab.py", "friend_store.py", "centrality.py",
+		"snapshot.py", "d3.py", "layout.py", "groups.py", "clustering.py",
+		"crosstab.py", "homophily.py", "significance.py",
+		"D3JS.html", "Population_data.txt"]
 	for f in names:
 		fi = open(f,"wb")
 		for line in urllib2.urlopen(stem+f):
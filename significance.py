@@ -0,0 +1,433 @@
+""" Are the patterns in a network more than chance?
+
+The labs print how alike tied friends are, how clustered each group is and how
+often friends with strong ties to the ego know each other, but a number on its
+own doesn't say whether it is any different from what chance would give. Here
+each is compared with the same figure worked out on many randomized versions of
+the network, the null model:
+
+- shuffling the labels (the values of an attribute, which friends the ego has
+  strong ties with) between friends, keeping the ties as they are. With within
+  set, labels are only swapped between friends in the same group (for example
+  the same context they are known from), which asks whether friends are more
+  alike than chance *given* the groups.
+- rewiring the ties between friends by swapping the ends of random pairs of
+  ties, which keeps how many ties everyone has (the ego keeps theirs). This
+  asks whether there is more clustering than the numbers of ties alone give.
+
+A shuffle is only a new ordering of an array, so a whole batch of them is
+worked out at once with NumPy, the statistic of every shuffle in the batch
+coming out of one bincount over the ties. Rewired networks have to have their
+triangles counted one at a time (see the clustering module) and are much slower,
+so a few hundred of them is plenty.
+
+The batches don't depend on each other, so with workers set they are shared
+out between that many processes. Each batch gets its own random seed, drawn in
+order from the seed given, so the same seed gives the same answer however many
+processes there are.
+
+Each test gives the observed value, the mean and standard deviation of the
+null values, the z-score (how many standard deviations the observed value is
+from the mean) and a two-sided p-value: the share of null values at least as
+far from the mean as the observed one, counting the observed value itself so
+that it is never 0. A statistic the null model can't move (every friend in one
+group, say) has no z-score or p-value: its null values only differ by rounding.
+
+"""
+
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+import clustering as cl
+import crosstab as ct
+import homophily as hm
+
+
+# About how many numbers a batch of shuffles works on at once
+BLOCK = 4000000
+
+COLUMNS = ["statistic", "value", "observed", "expected", "std", "z", "p"]
+
+# Differences smaller than this (relative to the size of the mean, or
+# absolute below 1) are taken to be rounding
+TOLERANCE = 1e-12
+
+
+class _Shuffle(object):
+	""" Shuffles labels (an array lined up with the nodes) between the
+	nodes in rows, only between nodes with the same value of strata.
+	"""
+
+	def __init__(self, labels, rows, strata=None):
+		self.labels = np.asarray(labels)
+		rows = np.asarray(rows, dtype=np.int64)
+		if strata is None:
+			strata = np.zeros(len(self.labels), dtype=np.int64)
+		strata = np.asarray(strata, dtype=np.int64)[rows]
+		order = np.argsort(strata, kind="mergesort")
+		self._rows = rows[order]
+		bounds = np.flatnonzero(np.diff(strata[order])) + 1
+		self._segments = zip([0] + bounds.tolist(),
+			bounds.tolist() + [len(rows)])
+
+	def shuffled(self, rng, size):
+		""" size shuffles of the labels, as a (size, nodes) array."""
+
+		out = np.repeat(self.labels[np.newaxis, :], size, axis=0)
+		picks = np.empty((size, len(self._rows)), dtype=np.int64)
+		for i in range(size):
+			for start, stop in self._segments:
+				picks[i, start:stop] = start + rng.permutation(stop - start)
+		out[:, self._rows] = self.labels[self._rows[picks]]
+		return out
+
+
+class Homophily(_Shuffle):
+	""" How alike tied friends are in attribute (see the homophily
+	module): the assortativity and E-I index of the ties between friends
+	and the associativity of each value, against the values of attribute
+	shuffled between friends (the ego, an ID, keeps theirs). within is
+	the attribute whose groups the values are shuffled inside.
+	"""
+
+	def __init__(self, store, attribute, ego=None, within=None):
+		found, self.values = ct.codes(store, attribute)
+		n = len(found)
+		k = len(self.values)
+		self.source, self.target = hm.edges(store)
+		self.first, self.second = hm.ties(store, (self.source, self.target))
+		self.total = np.bincount(self.source, minlength=n).astype(float)
+		self.ego = None
+		if ego is not None and (store.ids == int(ego)).any():
+			self.ego = int(np.flatnonzero(store.ids == int(ego))[0])
+			self.total[np.arange(n) != self.ego] += 1
+		rows = np.flatnonzero(np.arange(n) != self.ego)
+		strata = None if within is None else ct.codes(store, within)[0]
+		_Shuffle.__init__(self, found, rows, strata)
+
+		# when the mutual friend lists hold each tie both ways round and
+		# nothing else (as they usually do), the mixing matrix comes out
+		# of the same counts as the associativity
+		listed = np.sort(self.source*n + self.target)
+		both = np.sort(np.concatenate([self.first*n + self.second,
+			self.second*n + self.first]))
+		self._symmetric = (len(listed) == len(both) and (listed == both).all())
+		self._keys = self.source*k
+
+		# friends with no value never match anyone, and values nobody but
+		# the ego has can't change, so they are left out
+		self.size = np.bincount(found, minlength=k)
+		self.seen = np.flatnonzero(np.bincount(found[rows], minlength=k)[:-1])
+		self.names = [("assortativity", None), ("E-I index", None)] + [
+			("associativity", self.values[v]) for v in self.seen]
+		self.batch = max(1, BLOCK // (len(self.source) + len(self.first) + n*k))
+
+	def statistics(self, codes):
+		""" The statistics for each row of codes, as a (rows, names)
+		array.
+		"""
+
+		size, n = codes.shape
+		k = len(self.values)
+		missing = k - 1
+		batch = np.arange(size)[:, np.newaxis]
+
+		# how many of each friend's mutual friends have each value, a
+		# row at a time (quicker than one bincount over the whole batch)
+		counts = np.empty((size, n*k), dtype=np.int64)
+		for i in range(size):
+			counts[i] = np.bincount(self._keys + codes[i].take(self.target),
+				minlength=n*k)
+		own = (batch*n + np.arange(n))*k + codes
+		hits = np.where(codes != missing, counts.ravel()[own], 0).astype(float)
+		if self._symmetric:
+			key = (batch*k + codes)[:, :, np.newaxis]*k + np.arange(k)
+			mixing = np.bincount(key.ravel(), weights=counts.ravel(),
+				minlength=size*k*k).reshape(size, k, k)
+		else:
+			key = (batch*k + codes[:, self.first])*k + codes[:, self.second]
+			mixing = np.bincount(key.ravel(), minlength=size*k*k).reshape(size,
+				k, k)
+			mixing = mixing + mixing.transpose(0, 2, 1)
+		known = mixing[:, :-1, :-1].astype(float)
+		total = known.sum(axis=2).sum(axis=1)
+		inside = np.trace(known, axis1=1, axis2=2)
+
+		with np.errstate(divide="ignore", invalid="ignore"):
+			share = known.sum(axis=2) / total[:, np.newaxis]
+			expected = (share*share).sum(axis=1)
+			assortativity = (inside/total - expected)/(1 - expected)
+			assortativity[expected >= 1] = np.nan
+			ei = (total - 2*inside)/total
+
+			if self.ego is not None:
+				others = np.arange(n) != self.ego
+				ego = codes[:, self.ego:self.ego+1]
+				hits[:, others] += (codes[:, others] == ego) & (ego != missing)
+			alike = np.where(self.total > 0, hits/self.total, 0.)
+		sums = np.bincount((batch*k + codes).ravel(), weights=alike.ravel(),
+			minlength=size*k).reshape(size, k)
+		averages = sums[:, self.seen]/self.size[self.seen]
+		return np.column_stack([assortativity, ei, averages])
+
+	def observed(self):
+		return self.statistics(self.labels[np.newaxis, :])[0]
+
+	def sample(self, rng, size):
+		return self.statistics(self.shuffled(rng, size))
+
+
+class GroupClustering(_Shuffle):
+	""" The average clustering coefficient of each group, against the
+	groups shuffled between the nodes. values are the coefficients and
+	groups the group of each node (-1 for nodes in none, which stay out
+	of the shuffle), with names the names of the groups. The ego (their
+	place in the nodes) keeps their group.
+	"""
+
+	def __init__(self, values, groups, names, ego=None, strata=None):
+		self.values = np.asarray(values, dtype=float)
+		groups = np.asarray(groups, dtype=np.int64)
+		rows = np.flatnonzero((groups >= 0) & (np.arange(len(groups)) != ego))
+		_Shuffle.__init__(self, groups, rows, strata)
+		self.count = len(names)
+		self.size = np.bincount(groups[groups >= 0], minlength=self.count)
+		self.seen = np.flatnonzero(np.bincount(groups[rows],
+			minlength=self.count))
+		self.names = [("clustering", names[g]) for g in self.seen]
+		self.batch = max(1, BLOCK // max(len(groups), 1))
+
+	def statistics(self, groups):
+		size, n = groups.shape
+		keep = groups >= 0
+		key = (np.arange(size)[:, np.newaxis]*self.count + groups)[keep]
+		sums = np.bincount(key, weights=np.repeat(self.values[np.newaxis, :],
+			size, axis=0)[keep], minlength=size*self.count).reshape(size,
+			self.count)
+		return sums[:, self.seen]/self.size[self.seen]
+
+	def observed(self):
+		return self.statistics(self.labels[np.newaxis, :])[0]
+
+	def sample(self, rng, size):
+		return self.statistics(self.shuffled(rng, size))
+
+
+class StrongClosure(_Shuffle):
+	""" The share of pairs of friends with strong ties to the ego who are
+	friends themselves (see clustering.strong_closure), against the
+	strong ties shuffled between the friends. adj are the network's
+	arrays, strong marks the nodes the ego has strong ties with and ego
+	is the ego's place in the nodes (left out of the shuffle).
+	"""
+
+	def __init__(self, adj, strong, ego=None, strata=None):
+		n = len(adj[0])
+		if ego is None:
+			ego = -1
+		rows, cols, ptr = cl._simple(adj)
+		# each tie once, and doubled at the end to count the pairs both
+		# ways round
+		among = (rows < cols) & (rows != ego) & (cols != ego)
+		self.rows, self.cols = rows[among], cols[among]
+		strong = np.asarray(strong, dtype=bool)
+		_Shuffle.__init__(self, strong, np.flatnonzero(np.arange(n) != ego),
+			strata)
+		k = strong.sum()
+		self.pairs = float(k*(k-1))
+		self.names = [("strong closure", None)]
+		self.batch = max(1, BLOCK // (len(self.rows) + n))
+
+	def statistics(self, strong):
+		if not self.pairs:
+			return np.zeros((len(strong), 1))
+		closed = np.empty(len(strong))
+		for i in range(len(strong)):
+			closed[i] = 2*np.count_nonzero(strong[i].take(self.rows)
+				& strong[i].take(self.cols))
+		return (closed/self.pairs)[:, np.newaxis]
+
+	def observed(self):
+		return self.statistics(self.labels[np.newaxis, :])[0]
+
+	def sample(self, rng, size):
+		return self.statistics(self.shuffled(rng, size))
+
+
+def rewire(first, second, n, rng, rounds=10):
+	""" Degree preserving rewiring of the ties (first[i], second[i]) between
+	n nodes. Each round pairs every tie up with another at random and swaps
+	their ends, a-b and c-d becoming a-d and c-b (or a-c and b-d), unless that
+	would make a self-loop or a tie that is already there. Returns the new
+	(first, second).
+	"""
+
+	first = np.asarray(first, dtype=np.int64)
+	second = np.asarray(second, dtype=np.int64)
+	half = len(first) // 2
+	for turn in range(rounds):
+		order = rng.permutation(len(first))
+		i, j = order[:half], order[half:2*half]
+		flip = rng.rand(half) < .5
+		a, b = first[i], second[i]
+		c = np.where(flip, second[j], first[j])
+		d = np.where(flip, first[j], second[j])
+		swap = (a != d) & (c != b)
+		while True:
+			new_first, new_second = first.copy(), second.copy()
+			new_second[i[swap]] = d[swap]
+			new_first[j[swap]] = c[swap]
+			new_second[j[swap]] = b[swap]
+			key = (np.minimum(new_first, new_second)*n
+				+ np.maximum(new_first, new_second))
+			found, where, counts = np.unique(key, return_inverse=True,
+				return_counts=True)
+			twice = counts[where] > 1
+			undo = swap & (twice[i] | twice[j])
+			if not undo.any():
+				break
+			swap &= ~undo
+		first, second = new_first, new_second
+	return first, second
+
+
+class Rewired(object):
+	""" The clustering of the network (the average over every node and,
+	with groups, over each group as in GroupClustering) and, with strong,
+	the strong closure (as in StrongClosure), against networks with the
+	ties between friends rewired (see rewire). ego is the ego's place in
+	the nodes of adj; the ego's ties are kept as they are.
+	"""
+
+	def __init__(self, adj, ego=None, groups=None, names=None, strong=None,
+		rounds=10):
+		self.nodes = adj[0]
+		n = len(self.nodes)
+		if ego is None:
+			ego = -1
+		rows, cols, ptr = cl._simple(adj)
+		once = rows < cols
+		among = once & (rows != ego) & (cols != ego)
+		self.first, self.second = rows[among], cols[among]
+		self.kept = (rows[once & ~among], cols[once & ~among])
+		self.rounds = rounds
+		self.groups = None if groups is None else np.asarray(groups, dtype=np.int64)
+		self.strong = None if strong is None else np.asarray(strong, dtype=bool)
+		self.names = [("average clustering", None)]
+		if self.groups is not None:
+			self.size = np.bincount(self.groups[self.groups >= 0],
+				minlength=len(names))
+			self.seen = np.flatnonzero(self.size)
+			self.names += [("clustering", names[g]) for g in self.seen]
+		if self.strong is not None:
+			self.names.append(("strong closure", None))
+		self.batch = 1
+		self._adj = adj
+
+	def statistics(self, adj):
+		values = cl.coefficients(adj)
+		out = [values.mean() if len(values) else np.nan]
+		if self.groups is not None:
+			averages = cl.group_averages(values, self.groups, len(self.size))
+			out.extend(averages[self.seen].tolist())
+		if self.strong is not None:
+			pairs, closed = cl.strong_closure(adj, self.strong)
+			out.append(closed[0]/float(pairs[0]) if pairs[0] else 0.)
+		return np.array(out)
+
+	def observed(self):
+		return self.statistics(self._adj)
+
+	def sample(self, rng, size):
+		n = len(self.nodes)
+		out = []
+		for i in range(size):
+			first, second = rewire(self.first, self.second, n, rng, self.rounds)
+			first = np.concatenate([first, self.kept[0]])
+			second = np.concatenate([second, self.kept[1]])
+			rows = np.concatenate([first, second])
+			cols = np.concatenate([second, first])
+			order = np.lexsort((cols, rows))
+			indptr = np.zeros(n+1, dtype=np.int64)
+			np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+			out.append(self.statistics((self.nodes, indptr, cols[order])))
+		return np.array(out).reshape(size, len(self.names))
+
+
+# The null model as seen from inside a worker process, set up by
+# _start_worker
+_worker_model = None
+
+
+def _start_worker(model):
+	global _worker_model
+	_worker_model = model
+
+
+def _worker_sample(job):
+	seed, size = job
+	return _worker_model.sample(np.random.RandomState(seed), size)
+
+
+def null_values(model, samples=1000, seed=None, workers=None):
+	""" samples values of each of the model's statistics under its null
+	model, as a (samples, statistics) array. With workers, the batches
+	are shared out between that many processes.
+	"""
+
+	sizes = [model.batch]*(samples // model.batch)
+	if samples % model.batch:
+		sizes.append(samples % model.batch)
+	seeds = np.random.RandomState(seed).randint(0, 2**31-1, len(sizes))
+	jobs = zip(seeds.tolist(), sizes)
+	if workers > 1 and len(jobs) > 1:
+		pool = multiprocessing.Pool(workers, _start_worker, (model,))
+		try:
+			parts = pool.map(_worker_sample, jobs)
+			pool.close()
+		except:
+			pool.terminate()
+			raise
+		finally:
+			pool.join()
+	else:
+		parts = [model.sample(np.random.RandomState(s), size)
+			for s, size in jobs]
+	if not parts:
+		return np.zeros((0, len(model.names)))
+	return np.vstack(parts)
+
+
+def test(model, samples=1000, seed=None, workers=None):
+	""" Compares the model's statistics with samples values of each under
+	its null model (see null_values). Returns a pandas DataFrame with a row
+	for each statistic: its name and the value it is for (None for the
+	whole network), the observed value, the mean (expected) and standard
+	deviation of the null values, the z-score and the two-sided p-value
+	(NaN if the null values don't vary).
+	"""
+
+	observed = np.asarray(model.observed(), dtype=float)
+	null = null_values(model, samples, seed, workers)
+	valid = ~np.isnan(null)
+	count = valid.sum(axis=0)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		expected = np.where(valid, null, 0.).sum(axis=0)/count
+		spread = np.where(valid, (null - expected)**2, 0.).sum(axis=0)
+		std = np.where(count > 1, np.sqrt(spread/(count - 1)), np.nan)
+		rounding = TOLERANCE*np.maximum(1., np.abs(expected))
+		flat = std <= rounding
+		std[flat] = 0.
+		z = np.where(flat | np.isnan(std), np.nan, (observed - expected)/std)
+		far = np.abs(observed - expected) - rounding
+		extreme = (valid & (np.abs(null - expected) >= far)).sum(axis=0)
+		p = (extreme + 1.)/(count + 1.)
+	p[np.isnan(observed) | flat] = np.nan
+	table = pd.DataFrame({"observed": observed, "expected": expected,
+		"std": std, "z": z, "p": p})
+	table["statistic"] = [name for name, value in model.names]
+	table["value"] = pd.Series([value for name, value in model.names],
+		dtype=object)
+	return table[COLUMNS]
@@ -0,0 +1,133 @@
+""" Binary snapshots of a loaded ego network
+
+Saving a dataset as CSV means writing every friend's mutual friend list out as
+text and parsing it all back in again on loading. A snapshot keeps the same
+information as NumPy arrays in a single .npz file instead: the friend IDs, the
+mutual friend lists in compressed sparse row form, each attribute as a typed
+column and every tie in the network with its attributes. A small JSON header in
+the same file holds my_ID, the contexts list, the colors and anything that
+isn't a number.
+
+Loading a snapshot gives back exactly what was saved, including changes made
+since the data were first loaded (like random_sample or new attributes).
+
+"""
+
+import json
+
+import networkx as nx
+import numpy as np
+
+import friend_store as fs
+
+
+SUFFIX = "_snapshot.npz"
+VERSION = 1
+
+
+def _plain(value):
+	""" Lets json write the NumPy numbers that end up in the header."""
+
+	if isinstance(value, np.generic):
+		return value.item()
+	if isinstance(value, np.ndarray):
+		return value.tolist()
+	raise TypeError(repr(value)+" can't be saved in a snapshot")
+
+
+def save(path, friend_db, net, my_ID, contexts_list, defined_colors):
+	""" Writes a snapshot of the friend database and network to path."""
+
+	arrays, header = friend_db.to_arrays()
+	arrays = dict(("friends_"+key, value) for key, value in arrays.items())
+
+	nodes = list(net.nodes())
+	edges = net.edges(data=True)
+	arrays["nodes"] = np.array(nodes, dtype=np.int64)
+	arrays["edge_sources"] = np.array([e[0] for e in edges], dtype=np.int64)
+	arrays["edge_targets"] = np.array([e[1] for e in edges], dtype=np.int64)
+
+	# Tie attributes that are whole numbers on every tie (or decimals on
+	# every tie) become arrays; anything else goes in the header
+	header["edge_attributes"] = {}
+	names = set()
+	for e in edges:
+		names.update(e[2].keys())
+	for number, name in enumerate(sorted(names)):
+		values = [e[2].get(name) for e in edges]
+		if all(isinstance(v, (int, long)) and not isinstance(v, bool)
+			for v in values):
+			arrays["edge_attribute"+str(number)] = np.array(values, dtype=np.int64)
+		elif all(isinstance(v, float) for v in values):
+			arrays["edge_attribute"+str(number)] = np.array(values, dtype=float)
+		else:
+			header["edge_attributes"][str(number)] = fs.to_json(values)
+	header["edge_attribute_names"] = fs.to_json(sorted(names))
+
+	header["version"] = VERSION
+	header["my_ID"] = my_ID
+	header["contexts_list"] = [[k, fs.to_json(v)] for k, v in sorted(contexts_list.items())]
+	header["defined_colors"] = fs.to_json(list(defined_colors))
+
+	arrays["header"] = np.array(json.dumps(header, default=_plain))
+	out = open(path, "wb")
+	try:
+		np.savez(out, **arrays)
+	finally:
+		out.close()
+
+
+def load(path):
+	""" Reads a snapshot. Returns (friend_db, net, my_ID, contexts_list,
+	defined_colors).
+	"""
+
+	data = np.load(path)
+	try:
+		arrays = dict((key, data[key]) for key in data.files)
+	finally:
+		data.close()
+
+	header = json.loads(str(arrays.pop("header")))
+	if header.get("version") != VERSION:
+		raise ValueError(str(path)+" is not a snapshot this version can read")
+
+	friends = dict((key[len("friends_"):], value) for key, value in arrays.items()
+		if key.startswith("friends_"))
+	friend_db = fs.FriendStore.from_arrays(friends, header)
+
+	sources = arrays["edge_sources"].tolist()
+	targets = arrays["edge_targets"].tolist()
+	columns = []
+	for number, name in enumerate(header["edge_attribute_names"]):
+		key = "edge_attribute"+str(number)
+		if key in arrays:
+			values = arrays[key].tolist()
+		else:
+			values = fs.from_json(header["edge_attributes"][str(number)])
+		columns.append((fs.from_json(name), values))
+	# Most ties share their attributes (strong=0 for every tie between
+	# friends), so the ties go in a group at a time rather than each
+	# with its own dictionary
+	groups = {}
+	names = [name for name, values in columns]
+	keys = zip(*[values for name, values in columns]) if columns else [()]*len(sources)
+	for key, u, v in zip(keys, sources, targets):
+		groups.setdefault(key, []).append((u, v))
+
+	nodes = arrays["nodes"].tolist()
+	net = nx.Graph()
+	net.add_nodes_from(nodes)
+	for key, ties in groups.items():
+		attributes = dict((name, value) for name, value in zip(names, key)
+			if value is not None)
+		net.add_edges_from(ties, **attributes)
+
+	contexts_list = dict((k, fs.from_json(v)) for k, v in header["contexts_list"])
+	defined_colors = fs.from_json(header["defined_colors"])
+	# The colors go with the order of the nodes in the network, which
+	# can come out differently when it is rebuilt
+	if len(defined_colors) == len(nodes) and net.nodes() != nodes:
+		color = dict(zip(nodes, defined_colors))
+		defined_colors = [color[n] for n in net.nodes()]
+	return friend_db, net, header["my_ID"], contexts_list, defined_colors